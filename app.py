@@ -1,17 +1,65 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 import logging
-import sqlite3
 import os
 import sys
+import time
 sys.path.append("./controller")
-from RequirementProcessor import RequirementProcessor
-from DataReader import DataReader
-from DataWriter import DataWriter
-from CustomRequirementComparer import CustomRequirementComparer
+from Metrics import metrics
+from QueryCache import QueryCache, SharedQueryCache
+from RequirementService import RequirementService
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+db_directory = "./public/db"
+db_file = "requirements.db"
+# Texts or workbook rows compared by one /find_similar_requirements_batch request
+max_batch_texts = 10000
+words_to_replace = ["ePA-Frontend", "ePA Frontend",  "E-Rezept-FdV","TI-ITSM-Teilnehmer", "Hersteller", "Produkttyp"]
+
+# Stage timings and counters for /metrics; the Server-Timing header shows a
+# request's stages to its client and is only sent when enabled
+metrics.enabled = os.environ.get("SPEC_EXPLORER_METRICS", "1") != "0"
+server_timing = metrics.enabled and os.environ.get("SPEC_EXPLORER_SERVER_TIMING", "0") != "0"
+
+# Result cache per worker, optionally backed by a SQLite file shared by all workers
+cache_megabytes = float(os.environ.get("SPEC_EXPLORER_CACHE_MB", "64"))
+shared_cache_path = os.environ.get("SPEC_EXPLORER_SHARED_CACHE")
+query_cache = QueryCache(
+    max_bytes=int(cache_megabytes * 2**20),
+    ttl_seconds=int(os.environ.get("SPEC_EXPLORER_CACHE_TTL", "3600")),
+    shared=SharedQueryCache(shared_cache_path) if shared_cache_path else None,
+) if cache_megabytes > 0 else None
+
+# Loaded once per process (once in the gunicorn master with preload_app)
+service = RequirementService(
+    os.path.join(db_directory, db_file),
+    words_to_replace,
+    0.2,
+    use_index=os.environ.get("SPEC_EXPLORER_INDEX", "1") != "0",
+    cache=query_cache,
+    # Written by scripts/build_index.py, the corpus is loaded from the database without it
+    index_path=os.environ.get("SPEC_EXPLORER_INDEX_ARTIFACT", os.path.join(db_directory, "requirements.index")),
+)
+
 app = Flask(__name__)
 
+@app.before_request
+def start_request_timing():
+    if metrics.enabled:
+        g.start_time = time.perf_counter()
+        if server_timing:
+            metrics.start_request()
+
+@app.after_request
+def finish_request_timing(response):
+    if metrics.enabled:
+        # Streamed responses are timed until they start, not until the last chunk is sent
+        seconds = time.perf_counter() - g.start_time
+        metrics.observe("request_seconds", seconds, (("endpoint", request.endpoint or "none"),))
+        if server_timing:
+            timings = {**metrics.finish_request(), "total": seconds}
+            response.headers["Server-Timing"] = metrics.format_server_timing(timings)
+    return response
+
 @app.route('/')
 def index():
     return send_from_directory('public', 'index.html')
@@ -27,29 +75,135 @@ def find_similar_requirements():
         if not input_text:
             return jsonify({"error": "Missing input text"}), 400
 
-        db_directory = "./public/db"
-        db_file = "requirements.db"
-        db_path = os.path.join(db_directory, db_file)
-        conn = sqlite3.connect(db_path)
-        db_writer = DataWriter(conn, False)
-        db_reader = DataReader(conn)
-
-        custom_comparer = CustomRequirementComparer(db_reader, db_writer, 0.2)
-        words_to_replace = ["ePA-Frontend", "ePA Frontend",  "E-Rezept-FdV","TI-ITSM-Teilnehmer", "Hersteller", "Produkttyp"]
-        processor = RequirementProcessor(db_writer, words_to_replace)
-
-        processed_input_text = processor.preprocess_text(input_text)
-        similar_requirements = custom_comparer.find_similar_requirements(processed_input_text)
-        print(similar_requirements)
-        enriched_similar_requirements = db_reader.enrich_requirements(similar_requirements)
+        top_k = request.form.get('top_k', type=int)
+        min_score = request.form.get('min_score', type=float)
+        if top_k is not None and top_k < 1:
+            return jsonify({"error": "top_k must be positive"}), 400
+
+        enriched_similar_requirements = service.find_similar_requirements(input_text, top_k, min_score)
         res = jsonify(enriched_similar_requirements)
         return res
 
     except Exception as e:
         logging.error("An error occurred", exc_info=True)
         return jsonify({"error": "An error occurred"}), 500
-    finally:
-        conn.close()
+
+@app.route('/find_similar_requirements_batch', methods=['POST'])
+def find_similar_requirements_batch():
+    try:
+        top_k = request.args.get('top_k', type=int)
+        min_score = request.args.get('min_score', type=float)
+        if top_k is not None and top_k < 1:
+            return jsonify({"error": "top_k must be positive"}), 400
+
+        # Either an uploaded workbook in the import layout or a JSON list of texts
+        labels = None
+        upload = request.files.get('file')
+        if upload is not None:
+            try:
+                rows = service.read_query_rows(upload.stream, max_rows=max_batch_texts)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            input_texts = [str(row["description"]) if row["description"] is not None else None for row in rows]
+            labels = [{"requirement_number": row["requirement_number"], "title": row["title"]} for row in rows]
+        else:
+            input_texts = (request.get_json(silent=True) or {}).get('texts')
+            if not isinstance(input_texts, list) or not all(isinstance(text, str) for text in input_texts):
+                return jsonify({"error": "Missing file or list of texts"}), 400
+
+        if not 1 <= len(input_texts) <= max_batch_texts:
+            return jsonify({"error": f"Between 1 and {max_batch_texts} texts can be compared at once"}), 400
+
+        lines = service.export_similar_requirements_batch(input_texts, labels, top_k=top_k, min_score=min_score)
+        return Response(lines, mimetype="application/x-ndjson")
+
+    except Exception as e:
+        logging.error("An error occurred", exc_info=True)
+        return jsonify({"error": "An error occurred"}), 500
+
+@app.route('/search')
+def search():
+    try:
+        search_text = request.args.get('q')
+        if not search_text:
+            return jsonify({"error": "Missing search text"}), 400
+
+        page = request.args.get('page', 1, type=int)
+        page_size = request.args.get('page_size', 20, type=int)
+        if page < 1 or not 1 <= page_size <= 100:
+            return jsonify({"error": "page must be positive and page_size between 1 and 100"}), 400
+
+        return jsonify(service.search(
+            search_text,
+            specification_id=request.args.get('specification_id', type=int),
+            obligation=request.args.get('obligation'),
+            page=page,
+            page_size=page_size,
+        ))
+
+    except Exception as e:
+        logging.error("An error occurred", exc_info=True)
+        return jsonify({"error": "An error occurred"}), 500
+
+@app.route('/specification_pair_similarities')
+def specification_pair_similarities():
+    try:
+        spec1_id = request.args.get('spec1_id', type=int)
+        spec2_id = request.args.get('spec2_id', type=int)
+        if spec1_id is None or spec2_id is None or spec1_id == spec2_id:
+            return jsonify({"error": "spec1_id and spec2_id must be two different specification ids"}), 400
+
+        output_format = request.args.get('format', 'ndjson')
+        if output_format not in ("ndjson", "csv"):
+            return jsonify({"error": "format must be ndjson or csv"}), 400
+
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+
+        # Keyset cursor: the combined_identifier of the last row already received
+        after = request.args.get('after')
+        if after:
+            try:
+                after = tuple(int(requirement_id) for requirement_id in after.split('_'))
+            except ValueError:
+                after = None
+            if after is None or len(after) != 2:
+                return jsonify({"error": "after must be a combined_identifier like 12_345"}), 400
+
+        chunks = service.export_specification_pair_similarities(
+            spec1_id,
+            spec2_id,
+            request.args.get('comparison_method', 'custom_similarity'),
+            output_format=output_format,
+            after=after,
+            limit=limit,
+        )
+        mimetype = "text/csv" if output_format == "csv" else "application/x-ndjson"
+        return Response(chunks, mimetype=mimetype)
+
+    except Exception as e:
+        logging.error("An error occurred", exc_info=True)
+        return jsonify({"error": "An error occurred"}), 500
+
+@app.route('/similarity_matrix')
+def similarity_matrix():
+    try:
+        comparison_method = request.args.get('comparison_method', 'custom_similarity')
+        return jsonify(service.get_similarity_matrix(comparison_method))
+
+    except Exception as e:
+        logging.error("An error occurred", exc_info=True)
+        return jsonify({"error": "An error occurred"}), 500
+
+@app.route('/status')
+def status():
+    return jsonify(service.get_status())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Values of the worker process that handles the scrape
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     app.run(debug=True)  # Running on http://127.0.0.1:5000/
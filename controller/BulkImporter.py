@@ -0,0 +1,162 @@
+import contextlib
+import glob
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from RequirementProcessor import RequirementProcessor
+from SpecificationFile import SpecificationFile
+
+# State of a pool worker, set up once per process by init_worker
+worker_state = {}
+
+# Sent by read_specification after the last batch, or instead of it if reading failed
+READ_FINISHED = "finished"
+READ_FAILED = "failed"
+
+
+def init_worker(words_to_replace):
+    # spaCy and the NLTK resources are loaded once per worker, not per file
+    worker_state["processor"] = RequirementProcessor(None, words_to_replace)
+
+
+def read_specification(specification, batch_size, batch_queue):
+    """
+    Put the batches of preprocessed requirements of a specification into the
+    queue as they are read. The queue is bounded, so a worker waits while the
+    parent writes other specifications instead of keeping all rows.
+    """
+    try:
+        for batch in worker_state["processor"].read_requirements(specification, batch_size):
+            batch_queue.put(batch)
+    except BaseException:
+        batch_queue.put(READ_FAILED)
+        raise
+    batch_queue.put(READ_FINISHED)
+
+
+def receive_batches(batch_queue, future):
+    """
+    Yield the batches read_specification puts into the queue. Errors of the
+    worker are raised here, inside the transaction of the import.
+    """
+    while True:
+        try:
+            batch = batch_queue.get(timeout=1)
+        except queue.Empty:
+            # A worker process that died never sends READ_FAILED
+            if future.done() and future.exception() is not None:
+                future.result()
+            continue
+        if batch == READ_FINISHED:
+            return
+        if batch == READ_FAILED:
+            future.result()  # Raises the error of the worker
+        yield batch
+
+
+def discard_batches(batch_queue, future):
+    """
+    Receive the remaining batches of a failed import, so the worker does not
+    wait on a full queue. Its error was already reported.
+    """
+    with contextlib.suppress(Exception):
+        for _ in receive_batches(batch_queue, future):
+            pass
+
+
+class BulkImporter:
+    """
+    Imports a directory of specification workbooks.
+
+    The workbooks are parsed and preprocessed in a process pool; all writes
+    go through the single DataWriter of this process. The workers send their
+    rows in batches over bounded queues, which are written in the order the
+    files were submitted, so at most max_queued_batches batches per worker
+    are held in memory. Files whose content was already imported for the
+    same (name, version) are skipped.
+    """
+
+    def __init__(
+        self, data_reader, data_writer, words_to_replace, max_workers=None, batch_size=1000, max_queued_batches=4
+    ):
+        self.data_reader = data_reader
+        self.data_writer = data_writer
+        self.words_to_replace = words_to_replace
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.max_queued_batches = max_queued_batches
+
+    def is_unchanged(self, spec_file):
+        existing = self.data_reader.get_specification(spec_file.spec_name, spec_file.spec_version)
+        if existing is None or existing["status"] in ("pending", "import_failed"):
+            return False
+        if existing["file_mtime"] == spec_file.file_mtime:
+            return True
+        # Touched but possibly not modified, compare the content
+        if existing["file_hash"] == spec_file.get_file_hash():
+            self.data_writer.set_specification_file_state(
+                existing["id"], existing["file_hash"], spec_file.file_mtime
+            )
+            return True
+        return False
+
+    def get_changed_files(self, directory):
+        spec_files = []
+        for file_path in sorted(glob.glob(os.path.join(directory, "*.xlsx"))):
+            if os.path.basename(file_path).startswith("~$"):
+                continue  # Lock file of an open workbook
+            spec_file = SpecificationFile(file_path)
+            if self.is_unchanged(spec_file):
+                logging.info(f"Skipping unchanged {spec_file.filename}")
+                continue
+            spec_files.append(spec_file)
+        return spec_files
+
+    def run(self, directory):
+        spec_files = self.get_changed_files(directory)
+        logging.info(f"{len(spec_files)} specification files to import from {directory}")
+        if not spec_files:
+            return
+
+        start_time = time.perf_counter()
+        total_entries = 0
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=init_worker,
+            initargs=(self.words_to_replace,),
+        ) as executor:
+            imports = []
+            for spec_file in spec_files:
+                spec_file.get_file_hash()  # Hash the content that is about to be imported
+                specification = self.data_writer.get_or_create_specification(spec_file)
+                batch_queue = manager.Queue(self.max_queued_batches)
+                future = executor.submit(read_specification, specification, self.batch_size, batch_queue)
+                imports.append((specification, spec_file, batch_queue, future))
+
+            # Workers start the files in submission order, so the queue written
+            # next always belongs to a file that is already being read
+            for specification, spec_file, batch_queue, future in imports:
+                try:
+                    entries = self.data_writer.write_specification_requirements(
+                        specification, receive_batches(batch_queue, future)
+                    )
+                except Exception:
+                    logging.error(f"Could not import {spec_file.filename}", exc_info=True)
+                    self.data_writer.set_specification_status(specification.id, "import_failed")
+                    discard_batches(batch_queue, future)
+                    continue
+
+                self.data_writer.set_specification_file_state(
+                    specification.id, spec_file.get_file_hash(), spec_file.file_mtime
+                )
+                total_entries += entries
+                logging.info(f"Imported {entries} requirements from {spec_file.filename}")
+
+        elapsed_seconds = time.perf_counter() - start_time
+        logging.info(
+            f"Imported {total_entries} requirements from {len(spec_files)} files in {elapsed_seconds:.1f}s ({total_entries / elapsed_seconds:.0f} rows/s)"
+        )
@@ -0,0 +1,172 @@
+import itertools
+import logging
+import os
+import pathlib
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from CosineRequirementComparer import CosineRequirementComparer
+from CustomRequirementComparer import CustomRequirementComparer
+from DataReader import DataReader
+from EmbeddingRequirementComparer import EmbeddingRequirementComparer
+from SchemaMigrator import configure_connection
+from TfidfRequirementComparer import TfidfRequirementComparer
+
+comparers = {
+    "custom_similarity": CustomRequirementComparer,
+    "cosine_similarity": CosineRequirementComparer,
+    "tfidf_cosine_similarity": TfidfRequirementComparer,
+    "embedding_cosine_similarity": EmbeddingRequirementComparer,
+}
+
+# State of a pool worker, set up once per process by init_worker
+worker_state = {}
+
+
+class SimilarityCollector:
+    """
+    Stands in for the DataWriter inside a pool worker and collects the
+    similarities and memoized scores, which are written by the scheduler
+    process.
+    """
+
+    def __init__(self):
+        self.requirement_similarities = []
+        self.memoized_scores = []
+
+    def add_requirement_similarities(self, *args):
+        self.requirement_similarities.append(args)
+
+    def add_memoized_score(self, *args):
+        self.memoized_scores.append(args)
+
+
+def init_worker(db_path, comparison_method, threshold):
+    uri = pathlib.Path(db_path).resolve().as_uri() + "?mode=ro"
+    data_reader = DataReader(configure_connection(sqlite3.connect(uri, uri=True), read_only=True))
+    collector = SimilarityCollector()
+    worker_state["collector"] = collector
+    worker_state["comparer"] = comparers[comparison_method](data_reader, collector, threshold)
+
+
+def compare_specification_pair(specification1, specification2):
+    collector = worker_state["collector"]
+    collector.requirement_similarities = []
+    collector.memoized_scores = []
+    worker_state["comparer"].compare_requirements(specification1, specification2)
+    return specification1, specification2, collector.requirement_similarities, collector.memoized_scores
+
+
+class ComparisonScheduler:
+    """
+    Compares every pair of specifications with one comparison method.
+
+    The pairs are scored in a process pool; this process is the only writer
+    and commits the results of each pair together with its entry in
+    specification_comparisons. Pairs that are already done are skipped, so an
+    interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, data_reader, data_writer, db_path, comparison_method, threshold, max_workers=None):
+        self.data_reader = data_reader
+        self.data_writer = data_writer
+        self.db_path = db_path
+        self.comparison_method = comparison_method
+        self.threshold = threshold
+        self.max_workers = max_workers
+
+    def get_pending_pairs(self):
+        specifications = sorted(self.data_reader.get_all_specifications(), key=lambda spec: spec["id"])
+        finished_pairs = {
+            (row["specification1_id"], row["specification2_id"])
+            for row in self.data_reader.get_finished_specification_comparisons(self.comparison_method)
+        }
+        return [
+            (specification1, specification2)
+            for specification1, specification2 in itertools.combinations(specifications, 2)
+            if (specification1["id"], specification2["id"]) not in finished_pairs
+        ]
+
+    def run(self):
+        pending_pairs = self.get_pending_pairs()
+        logging.info(f"{len(pending_pairs)} specification pairs to compare by using {self.comparison_method}")
+        if not pending_pairs:
+            return
+
+        # A specification is compared once all of its pending pairs are written
+        open_pair_counts = {}
+        for specification1, specification2 in pending_pairs:
+            for specification in (specification1, specification2):
+                open_pair_counts[specification["id"]] = open_pair_counts.get(specification["id"], 0) + 1
+        for spec_id in open_pair_counts:
+            self.data_writer.set_specification_status(spec_id, "comparing")
+
+        # Comparers over the whole corpus (TF-IDF, embeddings) fit it here and cache it
+        # on disk, so the workers only load the cache instead of each fitting it again
+        comparers[self.comparison_method](self.data_reader, None, self.threshold)
+
+        failed_spec_ids = set()
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=init_worker,
+            initargs=(self.db_path, self.comparison_method, self.threshold),
+        ) as executor:
+            # A finished future holds all similarities of its pair until it is written, so only
+            # a few pairs per worker are submitted at a time and each is dropped once written
+            max_submitted_pairs = 2 * (self.max_workers or os.cpu_count() or 1)
+            unsubmitted_pairs = iter(pending_pairs)
+            pairs_by_future = {}
+            done_count = 0
+            while True:
+                for specification1, specification2 in itertools.islice(
+                    unsubmitted_pairs, max_submitted_pairs - len(pairs_by_future)
+                ):
+                    future = executor.submit(compare_specification_pair, specification1, specification2)
+                    pairs_by_future[future] = (specification1, specification2)
+                if not pairs_by_future:
+                    break
+
+                future = next(iter(wait(pairs_by_future, return_when=FIRST_COMPLETED).done))
+                specification1, specification2 = pairs_by_future.pop(future)
+                done_count += 1
+                requirement_similarities = []
+                try:
+                    _, _, requirement_similarities, memoized_scores = future.result()
+                except Exception as e:
+                    # Only this pair failed, the others are still written
+                    logging.error(
+                        f"Could not compare {specification1['fullname']} and {specification2['fullname']}: {e!r}"
+                    )
+                    failed_spec_ids.update((specification1["id"], specification2["id"]))
+                else:
+                    try:
+                        self.data_writer.begin_specification_comparison(
+                            specification1["id"], specification2["id"], self.comparison_method
+                        )
+                        for requirement_similarity in requirement_similarities:
+                            self.data_writer.add_requirement_similarities(*requirement_similarity)
+                        for memoized_score in memoized_scores:
+                            self.data_writer.add_memoized_score(*memoized_score)
+                        self.data_writer.commit_specification_comparison(
+                            specification1["id"], specification2["id"], self.comparison_method
+                        )
+                    except sqlite3.Error as e:
+                        # Raised by the writer thread, e.g. a locked database. The pair stays
+                        # pending and the next run replaces the rows that were written.
+                        logging.error(
+                            f"Could not write similarities of {specification1['fullname']} and {specification2['fullname']}: {e}"
+                        )
+                        self.data_writer.discard_similarities()
+                        failed_spec_ids.update((specification1["id"], specification2["id"]))
+
+                for specification in (specification1, specification2):
+                    open_pair_counts[specification["id"]] -= 1
+                    if open_pair_counts[specification["id"]] == 0:
+                        status = "comparison_failed" if specification["id"] in failed_spec_ids else "compared"
+                        self.data_writer.set_specification_status(specification["id"], status)
+
+                logging.info(
+                    f"Progress: {done_count}/{len(pending_pairs)} pairs, {specification1['name']} V{specification1['version']} with {specification2['name']} V{specification2['version']}: {len(requirement_similarities)} similarities ({time.perf_counter() - start_time:.0f}s, {self.data_writer.similarity_writer.get_rows_per_second():.0f} rows/s written)"
+                )
@@ -1,4 +1,4 @@
-from data_importer.controller.RequirementComparer import RequirementComparer
+from RequirementComparer import RequirementComparer
 
 
 from sklearn.feature_extraction.text import TfidfVectorizer
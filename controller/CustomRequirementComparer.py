@@ -1,7 +1,42 @@
-from RequirementComparer import RequirementComparer
+import numpy as np
+import scipy.sparse
 
+from RequirementComparer import BlockedRequirementComparer
+from RequirementCorpus import build_token_matrix
+
+
+class CustomRequirementComparer(BlockedRequirementComparer):
+    def __init__(self, data_reader, data_writer, threshold, index=None):
+        super().__init__(data_reader, data_writer, threshold)
+        self.index = index
+
+    def find_similar_requirements(
+        self, processed_input_text, requirements=None, top_k=None, min_score=None
+    ):
+        # Without an explicit corpus the inverted index only scores requirements sharing a token
+        if self.index is None or requirements is not None:
+            return super().find_similar_requirements(
+                processed_input_text, requirements, top_k, min_score
+            )
+
+        threshold = self.get_query_threshold(min_score)
+        return [
+            self.build_match(requirement_id, similarity, threshold)
+            for requirement_id, similarity in self.index.query(processed_input_text, threshold, top_k)
+        ]
+
+    def find_similar_requirements_many(self, processed_input_texts, top_k=None, min_score=None):
+        """
+        Yield the matches of every input text, like find_similar_requirements
+        with the inverted index, scoring blocks of inputs at once.
+        """
+        threshold = self.get_query_threshold(min_score)
+        for results in self.index.query_many(processed_input_texts, threshold, top_k):
+            yield [
+                self.build_match(requirement_id, similarity, threshold)
+                for requirement_id, similarity in results
+            ]
 
-class CustomRequirementComparer(RequirementComparer):
     def calculate_similarity(self, text1: str, text2: str) -> float:
         words_text1 = set(text1.split())
         words_text2 = set(text2.split())
@@ -9,5 +44,51 @@ class CustomRequirementComparer(RequirementComparer):
         total_words = words_text1.union(words_text2)
         return float(len(common_words)) / len(total_words)
 
+    def build_matrices(self, requirements1, requirements2, field):
+        # Packed token ids share the columns of the tokens table, nothing has to be split
+        token_field = f"{field}_tokens"
+        if all(req.get(token_field) is not None for req in requirements1 + requirements2):
+            matrices = [
+                build_token_matrix([req[token_field] for req in requirements], binary=True)
+                for requirements in (requirements1, requirements2)
+            ]
+            column_count = max(matrix.shape[1] for matrix in matrices)
+            for matrix in matrices:
+                matrix.resize((matrix.shape[0], column_count))
+            return tuple(matrices)
+
+        # Binary token matrices over a vocabulary shared by both lists
+        vocabulary = {}
+        layouts = []
+        for requirements in (requirements1, requirements2):
+            indptr = [0]
+            indices = []
+            for req in requirements:
+                for token in set((req[field] or "").split()):
+                    indices.append(vocabulary.setdefault(token, len(vocabulary)))
+                indptr.append(len(indices))
+            layouts.append((indptr, indices))
+
+        return tuple(
+            scipy.sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.int32), indices, indptr),
+                shape=(len(indptr) - 1, len(vocabulary)),
+            )
+            for indptr, indices in layouts
+        )
+
+    def score_block(self, matrix1, matrix2):
+        # |A n B| for every pair, then |A u B| = |A| + |B| - |A n B|
+        common_counts = (matrix1 @ matrix2.T).tocoo()
+        total_counts = (
+            matrix1.getnnz(axis=1)[common_counts.row]
+            + matrix2.getnnz(axis=1)[common_counts.col]
+            - common_counts.data
+        )
+        return scipy.sparse.coo_matrix(
+            (common_counts.data / total_counts, (common_counts.row, common_counts.col)),
+            shape=common_counts.shape,
+        )
+
     def get_comparison_method(self) -> str:
         return 'custom_similarity'
\ No newline at end of file
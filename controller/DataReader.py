@@ -1,11 +1,18 @@
 from typing import Dict, List
+import hashlib
+import json
+import re
 import sqlite3
 
+# A letter or digit, the characters the unicode61 tokenizer of requirements_fts keeps
+FTS_TOKEN_CHARACTER = re.compile(r"[^\W_]")
+
 class DataReader:
     def __init__(self, conn):
         self.conn = conn
         self.conn.row_factory = self.dict_factory
         self.cursor = self.conn.cursor()
+        self.lookup_names = None
 
     def dict_factory(self, cursor, row):
         """
@@ -21,59 +28,230 @@ class DataReader:
         self.cursor.execute('SELECT * FROM requirements')
         return self.cursor.fetchall()
 
-    def enrich_requirements(self, similar_requirements):
-        # Check if the similar_requirements list is empty
-        if not similar_requirements:
-            print("No similar requirements to process.")
-            return []  # Or handle the empty case as appropriate for your application
+    def get_requirements_after(self, requirement_id):
+        """
+        Retrieve the processed texts of all requirements with a larger id,
+        e.g. the ones imported since an index was built.
+        """
+        self.cursor.execute(
+            '''
+            SELECT id, specification_id, processed_title, processed_description
+            FROM requirements
+            WHERE id > ?
+            ORDER BY id
+            ''',
+            (requirement_id,)
+        )
+        return self.cursor.fetchall()
 
-        # Extract the IDs and similarities into a list of tuples for the WITH clause
-        values_list = ", ".join(f"({req['id']}, {req['similarity']})" for req in similar_requirements)
-        
-        # Prepare the SQL query using a WITH clause to define a temporary table for similarities
-        sql_query = f"""
-            WITH SimilarityTempTable (id, similarity) AS (
-                VALUES {values_list}
-            )
-            SELECT 
-                r.requirement_number as req_requirement_number, 
-                spec.name as spec_name,
-                source.name AS req_source, 
-                r.title AS spec_title, 
-                r.description AS spec_description, 
-                obligation.name AS spec_obligation, 
-                test.name AS spec_test_procedure,
-                s.similarity
-            FROM 
-                requirements r
-                JOIN specifications spec ON r.specification_id = spec.id
-                JOIN req_sources source ON r.source_id = source.id
-                JOIN req_obligations obligation ON r.obligation_id = obligation.id
-                JOIN req_test_procedures test ON r.test_procedure_id = test.id
-                JOIN SimilarityTempTable s ON r.id = s.id
-            WHERE 
-                r.id IN ({','.join('?' for _ in similar_requirements)})
-            GROUP BY 
-                r.requirement_number
-            ORDER BY 
-                s.similarity DESC
+    def get_token_vocabulary(self, token_id=0):
         """
+        Return {token: id} of the interned tokens with a larger id.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute('SELECT token, id FROM tokens WHERE id > ?', (token_id,))
+        return dict(cursor.fetchall())
 
-        # Prepare the list of IDs for the parameter substitution
-        similar_req_ids = [req["id"] for req in similar_requirements]
+    def get_requirement_tokens_after(self, requirement_id):
+        """
+        Retrieve id, specification id and the packed token ids of the processed
+        title and description of all requirements with a larger id, as tuples.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            '''
+            SELECT id, specification_id, processed_title_tokens, processed_description_tokens
+            FROM requirements
+            WHERE id > ?
+            ORDER BY id
+            ''',
+            (requirement_id,)
+        )
+        return cursor.fetchall()
+
+    def get_memoized_scores(self, comparison_method, text_hashes):
+        """
+        Return {(text1_hash, text2_hash): similarity_score} of the memoized
+        scores between any two of the given content hashes.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            '''
+            SELECT memo.text1_hash, memo.text2_hash, memo.similarity_score
+            FROM json_each(?) hashes
+            JOIN similarity_score_memo memo
+              ON memo.comparison_method_id = (SELECT id FROM comparison_methods WHERE name = ?)
+             AND memo.text1_hash = hashes.value
+            ''',
+            (json.dumps(sorted(text_hashes)), comparison_method)
+        )
+        text_hashes = set(text_hashes)
+        return {
+            (text1_hash, text2_hash): similarity_score
+            for text1_hash, text2_hash, similarity_score in cursor.fetchall()
+            if text2_hash in text_hashes
+        }
+
+    def get_exact_duplicates(self):
+        """
+        Return (requirement1_id, requirement2_id) of all requirements with the
+        same processed description, found by a join on its content hash.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            '''
+            SELECT r1.id, r2.id
+            FROM requirements r1
+            JOIN requirements r2
+              ON r2.processed_description_hash = r1.processed_description_hash
+             AND r2.id > r1.id
+            WHERE r1.processed_description_hash IS NOT NULL
+              AND r2.processed_description = r1.processed_description
+            ORDER BY r1.id, r2.id
+            '''
+        )
+        return cursor.fetchall()
 
-        # Execute the query with the list of IDs as the parameter
+    def get_corpus_revision(self):
+        """
+        Return the counter DataWriter increments on every change of the
+        requirements or similarities, 0 for databases without one.
+        """
         try:
-            self.cursor.execute(sql_query, similar_req_ids)
-        except sqlite3.OperationalError as e:
-            print(f"An error occurred: {e}")
-            print("SQL query:", sql_query)
-            print("Parameters:", similar_req_ids)
-            raise
-
-        # Fetch all results
+            self.cursor.execute('SELECT revision FROM corpus_revision WHERE id = 1')
+        except sqlite3.OperationalError:
+            return 0  # Not migrated yet
+        row = self.cursor.fetchone()
+        return row['revision'] if row else 0
+
+    def get_requirements_generation(self):
+        """
+        Return the counter of deletions and token changes of existing
+        requirements, 0 for databases without one.
+        """
+        try:
+            self.cursor.execute('SELECT requirements_generation FROM corpus_revision WHERE id = 1')
+        except sqlite3.OperationalError:
+            return 0  # Not migrated yet
+        row = self.cursor.fetchone()
+        return row['requirements_generation'] if row else 0
+
+    def get_requirement_texts(self):
+        """
+        Retrieve the original title and description of all requirements.
+        """
+        self.cursor.execute('SELECT id, title, description FROM requirements ORDER BY id')
+        return self.cursor.fetchall()
+
+    def get_minhash_signatures(self, num_perm, seed):
+        """
+        Retrieve the processed description of every requirement with its stored
+        MinHash signature, or None if there is none for these parameters.
+        """
+        self.cursor.execute(
+            '''
+            SELECT r.id, r.processed_description, m.signature
+            FROM requirements r
+            LEFT JOIN requirement_minhashes m
+              ON m.requirement_id = r.id AND m.num_perm = ? AND m.seed = ?
+            ORDER BY r.id
+            ''',
+            (num_perm, seed)
+        )
         return self.cursor.fetchall()
 
+    def get_corpus_version(self, columns=("processed_title_hash", "processed_description_hash")):
+        """
+        Return a hash of the ids and the given columns of all requirements,
+        by default the content hashes of the processed texts. It changes
+        whenever requirements are added, removed or re-processed, also when a
+        re-import hands out the ids of deleted requirements again.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f'SELECT id, {", ".join(columns)} FROM requirements ORDER BY id')
+        digest = hashlib.blake2b(digest_size=8)
+        for row in cursor:
+            digest.update(repr(row).encode("utf-8"))
+        return digest.hexdigest()
+
+    def enrich_requirements(self, similar_requirements):
+        if not similar_requirements:
+            return []
+
+        # One JSON parameter instead of inlined values: the statement text never
+        # changes, so sqlite3's statement cache reuses the prepared statement.
+        # Rows come back as tuples, the result dicts are built only once below.
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            '''
+            SELECT
+                r.requirement_number,
+                spec.name,
+                r.source_id,
+                r.title,
+                r.description,
+                r.obligation_id,
+                r.test_procedure_id,
+                matches.value
+            FROM json_each(?) matches
+            JOIN requirements r ON r.id = CAST(matches.key AS INTEGER)
+            JOIN specifications spec ON r.specification_id = spec.id
+            ORDER BY matches.value DESC, matches.id
+            ''',
+            (json.dumps({req["id"]: req["similarity"] for req in similar_requirements}),)
+        )
+        rows = cursor.fetchall()
+
+        lookup_names = self.get_lookup_names()
+        for position, table in ((2, "req_sources"), (5, "req_obligations"), (6, "req_test_procedures")):
+            if not {row[position] for row in rows if row[position] is not None} <= lookup_names[table].keys():
+                lookup_names = self.get_lookup_names(reload=True)  # Added by an import since the last load
+                break
+        sources = lookup_names["req_sources"]
+        obligations = lookup_names["req_obligations"]
+        test_procedures = lookup_names["req_test_procedures"]
+
+        return [
+            {
+                "req_requirement_number": requirement_number,
+                "spec_name": spec_name,
+                "req_source": sources.get(source_id),
+                "spec_title": title,
+                "spec_description": description,
+                "spec_obligation": obligations.get(obligation_id),
+                "spec_test_procedure": test_procedures.get(test_procedure_id),
+                "similarity": similarity,
+            }
+            for (
+                requirement_number, spec_name, source_id, title, description,
+                obligation_id, test_procedure_id, similarity
+            ) in rows
+        ]
+
+    def get_lookup_names(self, reload=False):
+        """
+        Return the id to name mappings of the small lookup tables, read once
+        per DataReader.
+        """
+        if reload or self.lookup_names is None:
+            self.lookup_names = {}
+            for table in ("req_sources", "req_obligations", "req_test_procedures"):
+                self.cursor.execute(f'SELECT id, name FROM {table}')
+                self.lookup_names[table] = {row['id']: row['name'] for row in self.cursor.fetchall()}
+        return self.lookup_names
+
+    def get_lookup_name(self, table, lookup_id):
+        names = self.get_lookup_names()[table]
+        if lookup_id is not None and lookup_id not in names:
+            names = self.get_lookup_names(reload=True)[table]  # Added by an import since the last load
+        return names.get(lookup_id)
+
 
         
     
@@ -95,6 +273,18 @@ class DataReader:
     def get_similarities_by_specifiaction(self, specification) -> List[Dict]:
         self.cursor.execute(
             '''		
+      WITH pairs AS (
+        -- Key lookups on either side of requirement_similarity_scores
+        SELECT comparison_method_id, requirement1_id, requirement2_id
+        FROM requirement_similarity_scores
+        WHERE comparison_method_id IN (SELECT id FROM comparison_methods)
+          AND requirement1_id IN (SELECT id FROM requirements WHERE specification_id = ?)
+        UNION
+        SELECT comparison_method_id, requirement1_id, requirement2_id
+        FROM requirement_similarity_scores
+        WHERE comparison_method_id IN (SELECT id FROM comparison_methods)
+          AND requirement2_id IN (SELECT id FROM requirements WHERE specification_id = ?)
+      )
 		SELECT 
         r1.requirement_number as req1_requirement_number,
         source1.name AS req1_source, 
@@ -113,7 +303,11 @@ class DataReader:
         rs.description_similarity_score,
         rs.combined_identifier
       FROM 
-        requirement_similarities rs
+        pairs p
+      JOIN 
+        requirement_similarities rs ON rs.comparison_method_id = p.comparison_method_id
+          AND rs.requirement1_id = p.requirement1_id
+          AND rs.requirement2_id = p.requirement2_id
       JOIN 
         requirements r1 ON rs.requirement1_id = r1.id
       JOIN 
@@ -134,16 +328,90 @@ class DataReader:
         req_test_procedures test1 ON r1.test_procedure_id = test1.id
       JOIN 
         req_test_procedures test2 ON r2.test_procedure_id = test2.id
-      WHERE 
-        r1.specification_id = ?
-		OR
-		  r2.specification_id = ?
-		
             ''', 
-            (specification['id'],)
+            (specification['id'], specification['id'])
         )
         return self.cursor.fetchall()
 
+    def iter_specification_pair_similarities(self, spec1_id, spec2_id, comparison_method, after=None, page_size=1000):
+        """
+        Yield the similarities between the requirements of two specifications
+        ordered by the key (requirement1_id, requirement2_id), starting after
+        the given key. Every page is a keyset query on the primary key of
+        requirement_similarity_scores that is iterated on the cursor, so memory
+        does not grow with the number of rows and no read transaction is held
+        between pages. Lookup names are resolved from memory.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            'SELECT MIN(id), MAX(id) FROM requirements WHERE specification_id = ?',
+            (spec1_id,)
+        )
+        min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return
+
+        # Starting at the first requirement of spec1 keeps the primary key range small
+        key = max(tuple(after) if after else (min_id, -1), (min_id, -1))
+        while True:
+            cursor.execute(
+                '''
+                SELECT
+                    rs.requirement1_id,
+                    rs.requirement2_id,
+                    r1.requirement_number,
+                    r1.source_id,
+                    r1.title,
+                    r1.description,
+                    r1.obligation_id,
+                    r1.test_procedure_id,
+                    r2.requirement_number,
+                    r2.source_id,
+                    r2.title,
+                    r2.description,
+                    r2.obligation_id,
+                    r2.test_procedure_id,
+                    rs.title_score / 1000.0,
+                    rs.description_score / 1000.0
+                FROM requirement_similarity_scores rs
+                JOIN requirements r1 ON rs.requirement1_id = r1.id
+                JOIN requirements r2 ON rs.requirement2_id = r2.id
+                WHERE rs.comparison_method_id = (SELECT id FROM comparison_methods WHERE name = ?)
+                  AND (rs.requirement1_id, rs.requirement2_id) > (?, ?)
+                  AND rs.requirement1_id <= ?
+                  AND rs.requirement1_id IN (SELECT id FROM requirements WHERE specification_id = ?)
+                  AND r2.specification_id = ?
+                ORDER BY rs.requirement1_id, rs.requirement2_id
+                LIMIT ?
+                ''',
+                (comparison_method, key[0], key[1], max_id, spec1_id, spec2_id, page_size)
+            )
+            row_count = 0
+            for row in cursor:
+                row_count += 1
+                key = (row[0], row[1])
+                yield {
+                    "req1_requirement_number": row[2],
+                    "req1_source": self.get_lookup_name("req_sources", row[3]),
+                    "spec1_title": row[4],
+                    "spec1_description": row[5],
+                    "spec1_obligation": self.get_lookup_name("req_obligations", row[6]),
+                    "spec1_test_procedure": self.get_lookup_name("req_test_procedures", row[7]),
+                    "req2_requirement_number": row[8],
+                    "req2_source": self.get_lookup_name("req_sources", row[9]),
+                    "spec2_title": row[10],
+                    "spec2_description": row[11],
+                    "spec2_obligation": self.get_lookup_name("req_obligations", row[12]),
+                    "spec2_test_procedure": self.get_lookup_name("req_test_procedures", row[13]),
+                    "comparison_method": comparison_method,
+                    "title_similarity_score": row[14],
+                    "description_similarity_score": row[15],
+                    "combined_identifier": f"{row[0]}_{row[1]}",
+                }
+            if row_count < page_size:
+                return
+
     def get_requirement_by_number(self, requirement_number):
         """
         Retrieve a specific requirement by its number.
@@ -159,14 +427,162 @@ class DataReader:
         )
         return self.cursor.fetchone()
 
-    def search_requirements(self, search_query):
+    def build_fts_match(self, columns, tokens, operator):
         """
-        Search for requirements that match a search query in their title or description.
+        Build an FTS5 query matching the tokens in the given columns. Every
+        token is quoted as a phrase, so user input is never parsed as FTS5 syntax.
+        """
+        phrases = ['"' + token.replace('"', '""') + '"' for token in tokens]
+        return "{" + " ".join(columns) + "} : (" + f" {operator} ".join(phrases) + ")"
+
+    def get_search_conditions(self, search_text, processed_text, specification_id, obligation):
         """
-        search_query = f'%{search_query}%'
-        self.cursor.execute('SELECT * FROM requirements WHERE title LIKE ? OR description LIKE ?', (search_query, search_query))
+        Return the WHERE clause and parameters of a full-text search. All words
+        of the search text have to occur in the title or description, or all
+        stems of the processed text in the processed columns.
+        """
+        matches = []
+        words = re.findall(r"\w+", search_text)
+        if words:
+            matches.append(self.build_fts_match(["title", "description"], words, "AND"))
+        if processed_text:
+            matches.append(
+                self.build_fts_match(["processed_title", "processed_description"], processed_text.split(), "AND")
+            )
+        if not matches:
+            return None, None
+
+        conditions = ["requirements_fts MATCH ?"]
+        params = [" OR ".join(matches)]
+        if specification_id is not None:
+            conditions.append("r.specification_id = ?")
+            params.append(specification_id)
+        if obligation is not None:
+            conditions.append("o.name = ?")
+            params.append(obligation)
+        return " AND ".join(conditions), params
+
+    def search_requirements(self, search_text, processed_text=None, specification_id=None, obligation=None, limit=20, offset=0):
+        """
+        Search requirements through the requirements_fts index, best BM25
+        match first, with a highlighted snippet of the description.
+        """
+        where, params = self.get_search_conditions(search_text, processed_text, specification_id, obligation)
+        if where is None:
+            return []
+
+        self.cursor.execute(
+            f'''
+            SELECT
+                r.id,
+                r.requirement_number,
+                r.title,
+                snippet(requirements_fts, 1, '<mark>', '</mark>', '…', 24) AS snippet,
+                s.id AS specification_id,
+                s.name AS spec_name,
+                s.version AS spec_version,
+                o.name AS obligation,
+                -bm25(requirements_fts, 4.0, 1.0, 4.0, 1.0) AS score
+            FROM requirements_fts
+            JOIN requirements r ON r.id = requirements_fts.rowid
+            JOIN specifications s ON r.specification_id = s.id
+            LEFT JOIN req_obligations o ON r.obligation_id = o.id
+            WHERE {where}
+            ORDER BY score DESC
+            LIMIT ? OFFSET ?
+            ''',
+            (*params, limit, offset)
+        )
         return self.cursor.fetchall()
-    
+
+    def count_search_results(self, search_text, processed_text=None, specification_id=None, obligation=None):
+        """
+        Count all matches of a full-text search, for pagination.
+        """
+        where, params = self.get_search_conditions(search_text, processed_text, specification_id, obligation)
+        if where is None:
+            return 0
+
+        self.cursor.execute(
+            f'''
+            SELECT COUNT(*) AS total
+            FROM requirements_fts
+            JOIN requirements r ON r.id = requirements_fts.rowid
+            LEFT JOIN req_obligations o ON r.obligation_id = o.id
+            WHERE {where}
+            ''',
+            params
+        )
+        return self.cursor.fetchone()['total']
+
+    def get_fts_candidates(self, processed_text, limit=None):
+        """
+        Return the requirements whose processed description shares at least one
+        stem with the processed text, best BM25 match first. Without a limit
+        these are all requirements with a Jaccard similarity above zero.
+
+        The FTS5 tokenizer keeps only letters and digits, so a stem made of
+        other characters only (e.g. '§' or '–', which preprocessing keeps) has
+        no phrase to match. Requirements sharing such a stem are found by a
+        scan of the processed descriptions and follow the BM25 matches.
+        Candidates are the same as those InvertedIndex scores.
+        """
+        tokens = set(processed_text.split())
+        searchable_tokens = sorted(token for token in tokens if FTS_TOKEN_CHARACTER.search(token))
+        separator_tokens = sorted(tokens.difference(searchable_tokens))
+
+        candidates = []
+        if searchable_tokens:
+            query = '''
+                SELECT r.id, r.processed_description
+                FROM requirements_fts
+                JOIN requirements r ON r.id = requirements_fts.rowid
+                WHERE requirements_fts MATCH ?
+                '''
+            params = [self.build_fts_match(["processed_description"], searchable_tokens, "OR")]
+            if limit is not None:
+                query += " ORDER BY rank LIMIT ?"
+                params.append(limit)
+            self.cursor.execute(query, params)
+            # A stem with separators is matched as a phrase, which also occurs
+            # across stems ('e-mail' in 'e mail'), so only shared stems are kept
+            candidates = [
+                candidate for candidate in self.cursor.fetchall()
+                if not tokens.isdisjoint(candidate["processed_description"].split())
+            ]
+
+        if separator_tokens and (limit is None or len(candidates) < limit):
+            # Processed texts are joined by single spaces, padding them matches whole stems
+            conditions = " OR ".join(
+                ["instr(' ' || processed_description || ' ', ?) > 0"] * len(separator_tokens)
+            )
+            self.cursor.execute(
+                f'''
+                SELECT id, processed_description
+                FROM requirements
+                WHERE {conditions}
+                ORDER BY id
+                ''',
+                [f" {token} " for token in separator_tokens]
+            )
+            found_ids = {candidate["id"] for candidate in candidates}
+            candidates.extend(
+                candidate for candidate in self.cursor.fetchall() if candidate["id"] not in found_ids
+            )
+            if limit is not None:
+                candidates = candidates[:limit]
+        return candidates
+
+    def get_specification(self, name, version):
+        """
+        Retrieve a specification by its unique name and version.
+        """
+        self.cursor.execute(
+            'SELECT * FROM specifications WHERE name = ? AND version = ?',
+            (name, version)
+        )
+        return self.cursor.fetchone()
+
     def get_all_specifications(self):
         """
         Retrieve all specifications from the database along with the count of associated requirements,
@@ -185,6 +601,53 @@ class DataReader:
         return self.cursor.fetchall()
 
     
+    def get_finished_specification_comparisons(self, comparison_method):
+        """
+        Retrieve the specification pairs that were already compared with the
+        given comparison method.
+        """
+        self.cursor.execute(
+            '''
+            SELECT sc.specification1_id, sc.specification2_id
+            FROM specification_comparisons sc
+            JOIN comparison_methods m ON sc.comparison_method_id = m.id
+            WHERE m.name = ? AND sc.status = 'done'
+            ''',
+            (comparison_method,)
+        )
+        return self.cursor.fetchall()
+
+    def get_previous_specification(self, specification):
+        """
+        Retrieve the most recently imported other version of a specification.
+        """
+        self.cursor.execute(
+            '''
+            SELECT * FROM specifications
+            WHERE name = ? AND id <> ? AND status IN ('imported', 'comparing', 'compared')
+            ORDER BY id DESC
+            LIMIT 1
+            ''',
+            (specification['name'], specification['id'])
+        )
+        return self.cursor.fetchone()
+
+    def get_specification_pair_similarities(self, spec1_id, spec2_id, comparison_method):
+        """
+        Retrieve the stored similarities of one specification pair.
+        """
+        self.cursor.execute(
+            '''
+            SELECT rs.*
+            FROM requirement_similarities rs
+            WHERE rs.comparison_method_id = (SELECT id FROM comparison_methods WHERE name = ?)
+              AND rs.requirement1_id IN (SELECT id FROM requirements WHERE specification_id = ?)
+              AND rs.specification2_id = ?
+            ''',
+            (comparison_method, spec1_id, spec2_id)
+        )
+        return self.cursor.fetchall()
+
     def get_similarity_counts(self):
         """
         Retrieve the count of similar requirements between each pair of specifications.
@@ -216,6 +679,39 @@ class DataReader:
         )
         return self.cursor.fetchall()
 
+    def get_similarity_summary(self, comparison_method):
+        """
+        Retrieve the materialized similarity statistics of every specification
+        pair for one comparison method. Reads one row per pair, however many
+        similarities are stored.
+        """
+        self.cursor.execute(
+            '''
+            SELECT
+                summary.specification1_id AS spec1_id,
+                summary.specification2_id AS spec2_id,
+                s1.name AS spec1_name,
+                s1.version AS spec1_version,
+                s2.name AS spec2_name,
+                s2.version AS spec2_version,
+                summary.similarity_count,
+                ROUND(summary.title_score_sum / 1000.0 / summary.similarity_count, 3) AS mean_title_similarity_score,
+                ROUND(summary.description_score_sum / 1000.0 / summary.similarity_count, 3) AS mean_description_similarity_score,
+                summary.max_title_score / 1000.0 AS max_title_similarity_score,
+                summary.max_description_score / 1000.0 AS max_description_similarity_score,
+                summary.description_score_500_count AS description_similarity_at_least_0_5_count,
+                summary.description_score_700_count AS description_similarity_at_least_0_7_count,
+                summary.description_score_900_count AS description_similarity_at_least_0_9_count
+            FROM specification_similarity_summary summary
+            JOIN specifications s1 ON summary.specification1_id = s1.id
+            JOIN specifications s2 ON summary.specification2_id = s2.id
+            WHERE summary.comparison_method_id = (SELECT id FROM comparison_methods WHERE name = ?)
+            ORDER BY summary.specification1_id, summary.specification2_id
+            ''',
+            (comparison_method,)
+        )
+        return self.cursor.fetchall()
+
 
     def close_connection(self):
         """
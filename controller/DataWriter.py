@@ -1,17 +1,32 @@
+import contextlib
+import logging
 import sqlite3
+from SchemaMigrator import SchemaMigrator, configure_connection
+from SimilarityWriter import SimilarityWriter
 from Specification import Specification
+from TokenVocabulary import TokenVocabulary, content_hash
+
+# Similarity scores are stored as integer thousandths, see SchemaMigrator
+SCORE_SCALE = 1000
 
 
 class DataWriter:
     def __init__(self, conn, overwrite) -> None:
-        self.conn = conn
+        self.conn = configure_connection(conn)
         self.cursor = self.conn.cursor()
         self.conn.row_factory = self.dict_factory
         self.local_cache = {}
+        self.token_vocabulary = TokenVocabulary(self.conn)
+        self.in_transaction = False
         self.configure_database(overwrite)
         self.populate_static_data()
         self.requirements_to_insert = []
-        self.requirement_similarities_to_insert = []
+        self.similarity_writer = SimilarityWriter(self.conn, self.get_similarity_writer_connect())
+        self.pair_similarity_count = 0  # Similarities added since the last commit
+        self.memoized_scores_to_insert = []
+        self.similarity_summary_pairs = set()  # (spec1_id, spec2_id, method_id) with new similarities
+        self.comparison_method = None
+        self.comparison_method_id = None
 
     def get_or_create_id(self, table_name, entity_name):
         if (table_name, entity_name) in self.local_cache:
@@ -29,10 +44,58 @@ class DataWriter:
             self.cursor.execute(
                 f"INSERT INTO {table_name} (name) VALUES (?)", (entity_name,)
             )
-            self.conn.commit()
+            self.commit()
             self.local_cache[(table_name, entity_name)] = self.cursor.lastrowid
             return self.cursor.lastrowid
 
+    def get_similarity_writer_connect(self):
+        """
+        Return a function opening a second connection to the database file for
+        the similarity writer thread, or None for in-memory databases.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("PRAGMA database_list")
+        database_path = next((path for _, name, path in cursor.fetchall() if name == "main"), "")
+        if not database_path:
+            return None
+        return lambda: configure_connection(sqlite3.connect(database_path, check_same_thread=False))
+
+    def bump_corpus_revision(self, conn=None):
+        """
+        Mark the requirements or similarities as changed, e.g. to invalidate
+        cached query results. Part of the caller's transaction.
+        """
+        (conn or self.conn).execute("UPDATE corpus_revision SET revision = revision + 1")
+
+    def commit(self):
+        """
+        Commit, unless the writes belong to an open transaction().
+        """
+        if not self.in_transaction:
+            self.conn.commit()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Run the enclosed writes in one transaction that is committed at the end
+        of the block and rolled back completely on an error.
+        """
+        cached_ids = dict(self.local_cache)
+        self.in_transaction = True
+        try:
+            yield
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            # Ids created inside the transaction no longer exist
+            self.local_cache = cached_ids
+            self.token_vocabulary.reset()
+            self.requirements_to_insert = []
+            raise
+        finally:
+            self.in_transaction = False
+
     def dict_factory(self, cursor, row):
         d = {}
         for idx, col in enumerate(cursor.description):
@@ -41,13 +104,25 @@ class DataWriter:
 
     def drop_tables(self, tables):
         for table in tables:
-            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            self.cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,))
+            row = self.cursor.fetchone()
+            if row is not None:
+                self.cursor.execute(f"DROP {row[0].upper()} {table}")
 
     def configure_database(self, overwrite):
         tables = {
             "specifications": "complex",
             "requirements": "complex",
             "requirement_similarities": "complex",
+            "requirement_similarity_scores": "complex",
+            "requirements_fts": "complex",
+            "requirement_minhashes": "complex",
+            "corpus_revision": "complex",
+            "specification_similarity_summary": "complex",
+            "tokens": "complex",
+            "similarity_score_memo": "complex",
+            "specification_comparisons": "complex",
+            "schema_migrations": "complex",
             "spec_categories": "simple",
             "spec_types": "simple",
             "req_sources": "simple",
@@ -66,7 +141,9 @@ class DataWriter:
         self.create_specifications_table()
         self.create_requirements_table()
         self.create_requirement_similarities_table()
+        self.create_specification_comparisons_table()
         self.conn.commit()
+        SchemaMigrator(self.conn).migrate()
 
     def create_specifications_table(self):
         self.cursor.execute(
@@ -81,6 +158,8 @@ class DataWriter:
                 type_id INTEGER,
                 req_count INTEGER,
                 status TEXT DEFAULT 'pending',
+                file_hash TEXT,
+                file_mtime REAL,
                 UNIQUE(name, version),
                 FOREIGN KEY(category_id) REFERENCES spec_categories(id),
                 FOREIGN KEY(type_id) REFERENCES spec_types(id)
@@ -102,6 +181,10 @@ class DataWriter:
                 processed_description TEXT,
                 obligation_id INTEGER,
                 test_procedure_id INTEGER,
+                processed_title_tokens BLOB,
+                processed_description_tokens BLOB,
+                processed_title_hash INTEGER,
+                processed_description_hash INTEGER,
                 FOREIGN KEY(specification_id) REFERENCES specifications(id),
                 FOREIGN KEY(obligation_id) REFERENCES obligations(id),
                 FOREIGN KEY(test_procedure_id) REFERENCES test_procedures(id)
@@ -110,6 +193,10 @@ class DataWriter:
         )
 
     def create_requirement_similarities_table(self):
+        """
+        Create the original similarity table. SchemaMigrator converts it to
+        requirement_similarity_scores and a view of the same name.
+        """
         self.cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS requirement_similarities (
@@ -130,6 +217,24 @@ class DataWriter:
             """
         )
 
+    def create_specification_comparisons_table(self):
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS specification_comparisons (
+                specification1_id INTEGER,
+                specification2_id INTEGER,
+                comparison_method_id INTEGER,
+                status TEXT,
+                similarity_count INTEGER,
+                finished_at TEXT,
+                PRIMARY KEY(specification1_id, specification2_id, comparison_method_id),
+                FOREIGN KEY(specification1_id) REFERENCES specifications(id),
+                FOREIGN KEY(specification2_id) REFERENCES specifications(id),
+                FOREIGN KEY(comparison_method_id) REFERENCES comparison_methods(id)
+            )
+            """
+        )
+
     def create_standard_table(self, table_name):
         self.cursor.execute(
             f"""
@@ -163,10 +268,14 @@ class DataWriter:
             "spec_categories", parsed_file.category_type
         )
         type_id = self.get_or_create_id("spec_types", parsed_file.spec_type)
+        # (name, version) is unique, importing a specification again reuses its row
         self.cursor.execute(
             """
             INSERT INTO specifications (name, version, fullname, file_path, category_id, type_id)
             VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name, version) DO UPDATE SET
+                fullname = excluded.fullname,
+                file_path = excluded.file_path
             """,
             (
                 parsed_file.spec_name,
@@ -231,7 +340,107 @@ class DataWriter:
             """,
             (req_count, spec_id),
         )
-        self.conn.commit()
+        self.commit()
+
+    def set_specification_file_state(self, spec_id, file_hash, file_mtime):
+        """
+        Remember which file content was imported, so unchanged files can be skipped.
+        """
+        with self.conn:
+            self.conn.execute(
+                """
+                UPDATE specifications
+                SET file_hash = ?, file_mtime = ?
+                WHERE id = ?
+                """,
+                (file_hash, file_mtime, spec_id),
+            )
+
+    def delete_specification_requirements(self, spec_id):
+        """
+        Delete the requirements of a specification together with all
+        similarities and comparison results that refer to them. Returns the
+        number of deleted similarities and specification comparisons.
+        """
+        # Queued similarities must not be written after their requirements are gone
+        self.similarity_writer.wait()
+        self.cursor.execute(
+            "SELECT 1 FROM requirements WHERE specification_id = ? LIMIT 1", (spec_id,)
+        )
+        if self.cursor.fetchone() is None:
+            return 0, 0
+
+        # One statement per side, so both use an index of requirement_similarity_scores
+        similarity_count = 0
+        for requirement_column in ("requirement1_id", "requirement2_id"):
+            self.cursor.execute(
+                f"""
+                DELETE FROM requirement_similarity_scores
+                WHERE comparison_method_id IN (SELECT id FROM comparison_methods)
+                  AND {requirement_column} IN (SELECT id FROM requirements WHERE specification_id = ?)
+                """,
+                (spec_id,),
+            )
+            similarity_count += self.cursor.rowcount
+        self.cursor.execute(
+            """
+            DELETE FROM specification_comparisons
+            WHERE specification1_id = ? OR specification2_id = ?
+            """,
+            (spec_id, spec_id),
+        )
+        comparison_count = self.cursor.rowcount
+        self.cursor.execute(
+            """
+            DELETE FROM specification_similarity_summary
+            WHERE specification1_id = ? OR specification2_id = ?
+            """,
+            (spec_id, spec_id),
+        )
+        self.cursor.execute(
+            "DELETE FROM requirements WHERE specification_id = ?", (spec_id,)
+        )
+        self.bump_corpus_revision()
+        self.commit()
+        return similarity_count, comparison_count
+
+    def write_specification_requirements(self, specification, requirement_batches):
+        """
+        Replace the requirements of a specification with the given batches of
+        Requirement objects in one transaction. If anything fails, the
+        specification is left as it was and marked as 'import_failed'.
+        Returns the number of requirements written.
+        """
+        try:
+            with self.transaction():
+                similarity_count, comparison_count = self.delete_specification_requirements(specification.id)
+                total_entries = 0
+                for requirements in requirement_batches:
+                    for requirement in requirements:
+                        try:
+                            self.add_requirement(requirement)
+                            total_entries += 1
+                        except sqlite3.Error as e:
+                            logging.error(f"Error inserting data into database: {e}")
+                            continue
+                    self.flush_requirements()
+                self.update_specification_req_count(specification.id)
+                self.bump_corpus_revision()
+        except Exception:
+            logging.error(
+                f"Import of {specification.fullname} failed, all of its rows were rolled back."
+            )
+            self.set_specification_status(specification.id, "import_failed")
+            raise
+
+        self.set_specification_status(specification.id, "imported")
+        if comparison_count:
+            # Requirements got new ids, every comparison of the specification is computed again
+            logging.warning(
+                f"Re-importing {specification.fullname} deleted {similarity_count} similarities of "
+                f"{comparison_count} specification comparisons, the next comparison run recomputes them."
+            )
+        return total_entries
 
     def add_requirement(self, requirement):
         source_id = self.get_or_create_id("req_sources", requirement.source)
@@ -251,22 +460,34 @@ class DataWriter:
                 requirement.processed_description,
                 obligation_id,
                 test_procedure_id,
+                self.token_vocabulary.pack(requirement.processed_title),
+                self.token_vocabulary.pack(requirement.processed_description),
+                content_hash(requirement.processed_title),
+                content_hash(requirement.processed_description),
             )
         )
 
     def commit_requirements(self):
+        self.flush_requirements()
+        self.commit()
+
+    def flush_requirements(self):
+        """
+        Insert the buffered requirements without committing them.
+        """
         self.cursor.executemany(
             """
             INSERT INTO requirements (
                 specification_id, source_id, requirement_number, title, description,
-                processed_title, processed_description, obligation_id, test_procedure_id
+                processed_title, processed_description, obligation_id, test_procedure_id,
+                processed_title_tokens, processed_description_tokens,
+                processed_title_hash, processed_description_hash
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             self.requirements_to_insert,
         )
         self.requirements_to_insert = []  # Clear the list after inserting
-        self.conn.commit()
 
     def add_requirement_similarities(
         self,
@@ -280,50 +501,180 @@ class DataWriter:
         description_similarity: float,
         comparison_method: str,
     ):
-        combined_identifier = f"{requirement1_id}_{requirement2_id}"
-        title_similarity_rounded = round(title_similarity, 3)
-        description_similarity_rounded = round(description_similarity, 3)
-        method_id = self.get_or_create_id("comparison_methods", comparison_method)
+        """
+        Queue a similarity for the writer thread, which writes it with the next
+        full batch. The similarity summaries are refreshed on commit.
+        """
+        # The specification ids and requirement numbers are served by the
+        # requirement_similarities view and not stored again
+        if comparison_method != self.comparison_method:
+            self.comparison_method_id = self.get_or_create_id("comparison_methods", comparison_method)
+            self.comparison_method = comparison_method
 
-        self.requirement_similarities_to_insert.append(
+        self.similarity_summary_pairs.add((spec1_id, spec2_id, self.comparison_method_id))
+        self.pair_similarity_count += 1
+        self.similarity_writer.add(
             (
-                combined_identifier,
-                spec1_id,
-                spec2_id,
+                self.comparison_method_id,
                 requirement1_id,
                 requirement2_id,
-                requirement1_number,
-                requirement2_number,
-                title_similarity_rounded,
-                description_similarity_rounded,
-                method_id,
+                int(round(title_similarity * SCORE_SCALE)),
+                int(round(description_similarity * SCORE_SCALE)),
+            )
+        )
+
+    def add_memoized_score(self, comparison_method, text1_hash, text2_hash, similarity_score):
+        """
+        Remember the score of two texts, given by their content hashes with
+        the lower one first. Written with the next commit.
+        """
+        method_id = self.get_or_create_id("comparison_methods", comparison_method)
+        self.memoized_scores_to_insert.append((method_id, text1_hash, text2_hash, similarity_score))
+
+    def flush_memoized_scores(self, conn, memoized_scores):
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO similarity_score_memo (
+                comparison_method_id, text1_hash, text2_hash, similarity_score
             )
+            VALUES (?, ?, ?, ?)
+            """,
+            memoized_scores,
         )
 
     def commit_requirement_similarities(self):
-        try:
-            self.cursor.executemany(
+        """
+        Write all queued similarities and refresh the summaries of their
+        specification pairs.
+        """
+        self.finish_similarities(None)
+
+    def begin_specification_comparison(self, spec1_id, spec2_id, comparison_method):
+        """
+        Delete the results of an interrupted earlier attempt at a specification
+        pair, before its similarities are added again.
+        """
+        method_id = self.get_or_create_id("comparison_methods", comparison_method)
+        self.similarity_writer.call(
+            lambda conn: self.delete_specification_pair_similarities(conn, spec1_id, spec2_id, method_id)
+        )
+
+    def delete_specification_pair_similarities(self, conn, spec1_id, spec2_id, method_id):
+        with conn:
+            conn.execute(
                 """
-                INSERT INTO requirement_similarities (
-                    combined_identifier,
-                    specification1_id,
-                    specification2_id,
-                    requirement1_id,
-                    requirement2_id,
-                    requirement1_number,
-                    requirement2_number,
-                    title_similarity_score,
-                    description_similarity_score,
-                    comparison_method_id
+                DELETE FROM requirement_similarity_scores
+                WHERE comparison_method_id = ?
+                  AND requirement1_id IN (SELECT id FROM requirements WHERE specification_id = ?)
+                  AND requirement2_id IN (SELECT id FROM requirements WHERE specification_id = ?)
+                """,
+                (method_id, spec1_id, spec2_id),
+            )
+
+    def commit_specification_comparison(self, spec1_id, spec2_id, comparison_method):
+        """
+        Wait until the similarities of one specification pair are written, then
+        refresh its summary and mark the pair as done in one transaction. The
+        similarities themselves are committed batch by batch; a pair without
+        its specification_comparisons entry is compared again by the next run,
+        after begin_specification_comparison removed its partial results.
+        """
+        method_id = self.get_or_create_id("comparison_methods", comparison_method)
+        self.similarity_summary_pairs.add((spec1_id, spec2_id, method_id))
+        self.finish_similarities((spec1_id, spec2_id, method_id, self.pair_similarity_count))
+
+    def discard_similarities(self):
+        """
+        Drop the similarities and memoized scores added since the last
+        commit, e.g. after writing them failed. Batches that already reached
+        the writer thread are not undone; their pair has no
+        specification_comparisons entry and is replaced when compared again.
+        """
+        self.similarity_writer.discard()
+        self.similarity_summary_pairs = set()
+        self.memoized_scores_to_insert = []
+        self.pair_similarity_count = 0
+
+    def finish_similarities(self, comparison):
+        summary_pairs = sorted(self.similarity_summary_pairs)
+        memoized_scores = self.memoized_scores_to_insert
+        self.similarity_summary_pairs = set()
+        self.memoized_scores_to_insert = []
+        self.pair_similarity_count = 0
+        self.similarity_writer.call(
+            lambda conn: self.write_similarity_commit(conn, summary_pairs, memoized_scores, comparison)
+        )
+
+    def write_similarity_commit(self, conn, summary_pairs, memoized_scores, comparison):
+        """
+        Runs on the similarity writer thread, after all queued similarities.
+        """
+        with conn:
+            self.flush_memoized_scores(conn, memoized_scores)
+            self.refresh_similarity_summaries(conn, summary_pairs)
+            self.bump_corpus_revision(conn)
+            if comparison is not None:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO specification_comparisons (
+                        specification1_id, specification2_id, comparison_method_id,
+                        status, similarity_count, finished_at
+                    )
+                    VALUES (?, ?, ?, 'done', ?, datetime('now'))
+                    """,
+                    comparison,
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?,?)
+
+    def refresh_similarity_summaries(self, conn, summary_pairs):
+        """
+        Recompute the specification_similarity_summary rows of the pairs that
+        got new similarities. Each pair is aggregated over the primary key of
+        requirement_similarity_scores, so the cost depends on the size of the
+        pair and not on the whole table. Runs in the caller's transaction.
+        """
+        for spec1_id, spec2_id, method_id in summary_pairs:
+            conn.execute(
+                """
+                DELETE FROM specification_similarity_summary
+                WHERE specification1_id = ? AND specification2_id = ? AND comparison_method_id = ?
                 """,
-                self.requirement_similarities_to_insert,
+                (spec1_id, spec2_id, method_id),
+            )
+            conn.execute(
+                """
+                INSERT INTO specification_similarity_summary
+                SELECT
+                    ?, ?, ?,
+                    COUNT(*),
+                    SUM(title_score),
+                    SUM(description_score),
+                    MAX(title_score),
+                    MAX(description_score),
+                    SUM(description_score >= 500),
+                    SUM(description_score >= 700),
+                    SUM(description_score >= 900)
+                FROM requirement_similarity_scores
+                WHERE comparison_method_id = ?
+                  AND requirement1_id IN (SELECT id FROM requirements WHERE specification_id = ?)
+                  AND requirement2_id IN (SELECT id FROM requirements WHERE specification_id = ?)
+                HAVING COUNT(*) > 0
+                """,
+                (spec1_id, spec2_id, method_id, method_id, spec1_id, spec2_id),
+            )
+
+    def write_minhash_signatures(self, signatures):
+        """
+        Store (requirement_id, num_perm, seed, signature) rows, replacing
+        signatures computed with other parameters.
+        """
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO requirement_minhashes (requirement_id, num_perm, seed, signature)
+                VALUES (?, ?, ?, ?)
+                """,
+                signatures,
             )
-        except sqlite3.IntegrityError as e:
-            print(f"An error occurred: {e}")
-        self.requirement_similarities_to_insert = []  # Clear the list after inserting
-        self.conn.commit()
 
     def set_specification_status(self, spec_id, status):
         query = """
@@ -336,6 +687,9 @@ class DataWriter:
 
     def close_connection(self):
         """
-        Close the database connection.
+        Write the queued similarities and close the database connection.
         """
-        self.conn.close()
+        try:
+            self.similarity_writer.close()
+        finally:
+            self.conn.close()
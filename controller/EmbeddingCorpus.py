@@ -0,0 +1,116 @@
+import glob
+import logging
+import os
+import time
+
+import numpy as np
+
+# The vectors are computed from the original texts, not the stemmed ones
+TEXT_FIELDS = {"processed_title": "title", "processed_description": "description"}
+
+
+class EmbeddingCorpus:
+    """
+    L2-normalized spaCy document vectors of all requirement titles and
+    descriptions as float32 matrices.
+
+    The matrices are saved as .npy files named after the spaCy model and the
+    corpus version and memory-mapped when loaded, so all processes using the
+    same files share one copy in the page cache. Only the tokenizer and the
+    static word vectors of the model are used, every pipeline component is
+    disabled while embedding.
+    """
+
+    def __init__(self, nlp, cache_directory="./public/db/cache", batch_size=256):
+        self.nlp = nlp
+        self.model_name = f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}"
+        self.cache_directory = cache_directory
+        self.batch_size = batch_size
+        self.version = None
+        self.requirement_ids = []
+        self.row_by_requirement_id = {}
+        self.title_matrix = None
+        self.description_matrix = None
+
+    def load(self, data_reader):
+        self.version = data_reader.get_corpus_version(tuple(TEXT_FIELDS.values()))
+        cache_prefix = self.get_cache_prefix()
+
+        if cache_prefix and os.path.exists(f"{cache_prefix}-ids.npy"):
+            state = {
+                name: np.load(f"{cache_prefix}-{name}.npy", mmap_mode="r")
+                for name in ("ids", "title", "description")
+            }
+            logging.info(f"Memory-mapped {self.model_name} embeddings for corpus version {self.version}")
+        else:
+            state = self.fit(data_reader.get_requirement_texts())
+            if cache_prefix:
+                self.save(state, cache_prefix)
+
+        self.requirement_ids = state["ids"].tolist()
+        self.title_matrix = state["title"]
+        self.description_matrix = state["description"]
+        self.row_by_requirement_id = {
+            requirement_id: row for row, requirement_id in enumerate(self.requirement_ids)
+        }
+        return self
+
+    def fit(self, requirements):
+        start_time = time.perf_counter()
+        state = {
+            "ids": np.array([req["id"] for req in requirements], dtype=np.int64),
+            "title": self.embed([req["title"] for req in requirements]),
+            "description": self.embed([req["description"] for req in requirements]),
+        }
+        logging.info(
+            f"Embedded {len(requirements)} requirements with {self.model_name} in {time.perf_counter() - start_time:.1f}s"
+        )
+        return state
+
+    def embed(self, texts):
+        """
+        Return the normalized document vectors of the texts. Texts without any
+        known word get a zero vector, i.e. similarity 0 to everything.
+        """
+        vectors = np.zeros((len(texts), self.nlp.vocab.vectors_length), dtype=np.float32)
+        documents = self.nlp.pipe(
+            (text or "" for text in texts), batch_size=self.batch_size, disable=self.nlp.pipe_names
+        )
+        for row, document in enumerate(documents):
+            if document.has_vector:
+                vectors[row] = document.vector
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def get_cache_prefix(self):
+        if not self.cache_directory:
+            return None
+        return os.path.join(self.cache_directory, f"embeddings-{self.model_name}-{self.version}")
+
+    def save(self, state, cache_prefix):
+        os.makedirs(self.cache_directory, exist_ok=True)
+        # The ids file is written last, load() treats it as the marker of a complete set
+        for name in ("title", "description", "ids"):
+            temporary_path = f"{cache_prefix}-{name}.{os.getpid()}.tmp.npy"
+            np.save(temporary_path, state[name])
+            os.replace(temporary_path, f"{cache_prefix}-{name}.npy")
+
+        # Vectors of older corpus versions are never read again
+        for stale_path in glob.glob(os.path.join(self.cache_directory, f"embeddings-{self.model_name}-*.npy")):
+            if not stale_path.startswith(f"{cache_prefix}-"):
+                os.remove(stale_path)
+
+    def get_matrix(self, requirements, field):
+        """
+        Return the rows of the given requirements. Requirements that were
+        imported after the matrix was built are embedded on the fly.
+        """
+        text_field = TEXT_FIELDS[field]
+        rows = [self.row_by_requirement_id.get(req["id"]) for req in requirements]
+        if None in rows:
+            return self.embed([req[text_field] for req in requirements])
+
+        matrix = self.title_matrix if field == "processed_title" else self.description_matrix
+        return matrix[rows]
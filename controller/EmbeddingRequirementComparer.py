@@ -0,0 +1,62 @@
+import numpy as np
+
+from EmbeddingCorpus import EmbeddingCorpus
+from RequirementComparer import BlockedRequirementComparer
+from RequirementProcessor import load_pipeline
+
+
+class EmbeddingRequirementComparer(BlockedRequirementComparer):
+    """
+    Cosine similarity of spaCy document vectors (averaged static word
+    vectors) of the original requirement texts. This matches requirements
+    that use different words for the same thing, which the lexical comparers
+    miss. Cosine similarities of document vectors are high on average, so the
+    threshold has to be much higher than for the lexical comparers.
+
+    Queries are answered with one dot product of the normalized query vector
+    against the memory-mapped corpus matrix. Query texts should be the
+    original, not the preprocessed text. The pipeline is the one of
+    RequirementProcessor, given as nlp or loaded once per process.
+    """
+
+    model_name = "de_core_news_md"
+
+    def __init__(self, data_reader, data_writer, threshold, corpus=None, nlp=None):
+        super().__init__(data_reader, data_writer, threshold)
+        if corpus is None:
+            corpus = EmbeddingCorpus(nlp if nlp is not None else load_pipeline(self.model_name)).load(data_reader)
+        self.corpus = corpus
+
+    def calculate_similarity(self, text1: str, text2: str) -> float:
+        vectors = self.corpus.embed([text1, text2])
+        return float(vectors[0] @ vectors[1])
+
+    def get_comparison_method(self) -> str:
+        return 'embedding_cosine_similarity'
+
+    def get_content_key(self, requirement):
+        # The vectors are computed from the original texts, which may differ for equal processed texts
+        return (requirement["title"], requirement["description"])
+
+    def build_matrices(self, requirements1, requirements2, field):
+        return (
+            self.corpus.get_matrix(requirements1, field),
+            self.corpus.get_matrix(requirements2, field),
+        )
+
+    def score_block(self, matrix1, matrix2):
+        return np.asarray(matrix1 @ matrix2.T)
+
+    def find_similar_requirements(
+        self, input_text, requirements=None, top_k=None, min_score=None
+    ):
+        threshold = self.get_query_threshold(min_score)
+        if requirements is None:
+            requirement_ids = self.corpus.requirement_ids
+            matrix = self.corpus.description_matrix
+        else:
+            requirement_ids = [req["id"] for req in requirements]
+            matrix = self.corpus.get_matrix(requirements, "processed_description")
+
+        similarities = matrix @ self.corpus.embed([input_text])[0]
+        return self.build_matches_from_scores(requirement_ids, similarities, threshold, top_k)
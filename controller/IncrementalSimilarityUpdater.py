@@ -0,0 +1,187 @@
+import logging
+import time
+
+
+class IncrementalSimilarityUpdater:
+    """
+    Brings the similarities of a new specification version up to date without
+    comparing it from scratch.
+
+    The requirements of the new version are diffed against the previous
+    version by requirement_number and processed text. For every specification
+    the previous version was compared with, similarities of unchanged
+    requirements are copied over to the new requirement ids and only added or
+    changed requirements are scored again. The new version is compared with
+    the previous version in full. Each pair is committed together with its
+    specification_comparisons entry, so ComparisonScheduler skips it.
+
+    Copied scores are the ones computed for the previous version. This is
+    exact for comparers that only look at the two texts of a pair; for
+    corpus-level weights (TF-IDF) they reflect the corpus at that time.
+    """
+
+    def __init__(self, data_reader, data_writer, comparer):
+        self.data_reader = data_reader
+        self.data_writer = data_writer
+        self.comparer = comparer
+
+    def diff_requirements(self, previous_requirements, requirements):
+        """
+        Return the mapping of unchanged requirement ids (previous id to new id)
+        and the list of added or changed requirements.
+        """
+        previous_by_number = {}
+        for req in previous_requirements:
+            previous_by_number.setdefault(req["requirement_number"], req)
+
+        unchanged_ids = {}
+        changed_requirements = []
+        for req in requirements:
+            previous_req = previous_by_number.pop(req["requirement_number"], None)
+            if (
+                previous_req is not None
+                and previous_req["processed_title"] == req["processed_title"]
+                and previous_req["processed_description"] == req["processed_description"]
+            ):
+                unchanged_ids[previous_req["id"]] = req["id"]
+            else:
+                changed_requirements.append(req)
+        return unchanged_ids, changed_requirements
+
+    def get_compared_specifications(self, specification):
+        """
+        Return the ids of all specifications that were compared with the given one.
+        """
+        partner_ids = set()
+        for row in self.data_reader.get_finished_specification_comparisons(
+            self.comparer.get_comparison_method()
+        ):
+            if row["specification1_id"] == specification["id"]:
+                partner_ids.add(row["specification2_id"])
+            elif row["specification2_id"] == specification["id"]:
+                partner_ids.add(row["specification1_id"])
+        return partner_ids
+
+    def update(self, specification):
+        previous_specification = self.data_reader.get_previous_specification(specification)
+        if previous_specification is None:
+            logging.info(f"{specification['fullname']} has no previous version, nothing to update")
+            return
+
+        start_time = time.perf_counter()
+        requirements = self.data_reader.get_requirements_by_specification(specification)
+        previous_requirements = self.data_reader.get_requirements_by_specification(previous_specification)
+        unchanged_ids, changed_requirements = self.diff_requirements(previous_requirements, requirements)
+        logging.info(
+            f"{specification['fullname']}: {len(unchanged_ids)} requirements unchanged, {len(changed_requirements)} added or changed since {previous_specification['fullname']}"
+        )
+
+        specifications_by_id = {
+            spec["id"]: spec for spec in self.data_reader.get_all_specifications()
+        }
+        partner_ids = self.get_compared_specifications(previous_specification) - {specification["id"]}
+        self.data_writer.set_specification_status(specification["id"], "comparing")
+        try:
+            self.compare_versions(specification, requirements, previous_specification, previous_requirements)
+            for partner_id in sorted(partner_ids):
+                self.update_pair(
+                    specification,
+                    requirements,
+                    previous_specification,
+                    specifications_by_id[partner_id],
+                    unchanged_ids,
+                    changed_requirements,
+                )
+        except Exception:
+            logging.error(f"Could not update the similarities of {specification['fullname']}")
+            # Rows of the unfinished pair must not be written with a later one
+            self.data_writer.discard_similarities()
+            self.data_writer.set_specification_status(specification["id"], "comparison_failed")
+            raise
+        self.data_writer.set_specification_status(specification["id"], "compared")
+
+        logging.info(
+            f"Updated similarities of {specification['fullname']} against {len(partner_ids) + 1} specifications in {time.perf_counter() - start_time:.1f}s"
+        )
+
+    def compare_versions(self, specification, requirements, previous_specification, previous_requirements):
+        """
+        Compare the new version with the previous one. There are no stored
+        similarities to reuse, so all requirements are scored.
+        """
+        comparison_method = self.comparer.get_comparison_method()
+        pair = sorted(
+            [(specification, requirements), (previous_specification, previous_requirements)],
+            key=lambda item: item[0]["id"],
+        )
+        pair_ids = (pair[0][0]["id"], pair[1][0]["id"])
+        self.data_writer.begin_specification_comparison(*pair_ids, comparison_method)
+        self.comparer.compare_requirement_lists(pair[0][0], pair[0][1], pair[1][0], pair[1][1])
+        self.data_writer.commit_specification_comparison(*pair_ids, comparison_method)
+        logging.info(f"Progress: {specification['fullname']} with {previous_specification['fullname']}: compared in full")
+
+    def update_pair(
+        self,
+        specification,
+        requirements,
+        previous_specification,
+        partner_specification,
+        unchanged_ids,
+        changed_requirements,
+    ):
+        comparison_method = self.comparer.get_comparison_method()
+        # Pairs are stored with the lower specification id first, as in ComparisonScheduler
+        specification_first = specification["id"] < partner_specification["id"]
+        previous_first = previous_specification["id"] < partner_specification["id"]
+        new_pair_ids = (
+            (specification["id"], partner_specification["id"])
+            if specification_first
+            else (partner_specification["id"], specification["id"])
+        )
+        self.data_writer.begin_specification_comparison(*new_pair_ids, comparison_method)
+
+        # Reuse the scores of unchanged requirements under their new ids
+        previous_pair = (
+            (previous_specification["id"], partner_specification["id"])
+            if previous_first
+            else (partner_specification["id"], previous_specification["id"])
+        )
+        reused_count = 0
+        for row in self.data_reader.get_specification_pair_similarities(*previous_pair, comparison_method):
+            if previous_first:
+                previous_id, partner_id = row["requirement1_id"], row["requirement2_id"]
+                previous_number, partner_number = row["requirement1_number"], row["requirement2_number"]
+            else:
+                previous_id, partner_id = row["requirement2_id"], row["requirement1_id"]
+                previous_number, partner_number = row["requirement2_number"], row["requirement1_number"]
+            if previous_id not in unchanged_ids:
+                continue
+
+            new_pair = (
+                (specification["id"], partner_specification["id"], unchanged_ids[previous_id], partner_id, previous_number, partner_number)
+                if specification_first
+                else (partner_specification["id"], specification["id"], partner_id, unchanged_ids[previous_id], partner_number, previous_number)
+            )
+            self.data_writer.add_requirement_similarities(
+                *new_pair,
+                row["title_similarity_score"],
+                row["description_similarity_score"],
+                comparison_method,
+            )
+            reused_count += 1
+
+        # Score only the added or changed requirements
+        partner_requirements = self.data_reader.get_requirements_by_specification(partner_specification)
+        if specification_first:
+            self.comparer.compare_requirement_lists(
+                specification, changed_requirements, partner_specification, partner_requirements
+            )
+        else:
+            self.comparer.compare_requirement_lists(
+                partner_specification, partner_requirements, specification, changed_requirements
+            )
+
+        self.data_writer.commit_specification_comparison(*new_pair_ids, comparison_method)
+        logging.info(
+            f"Progress: {specification['fullname']} with {partner_specification['fullname']}: reused {reused_count} similarities"
+        )
@@ -0,0 +1,219 @@
+import copy
+
+import numpy as np
+import scipy.sparse
+
+from Metrics import metrics
+from RequirementCorpus import RequirementCorpus
+
+
+class InvertedIndex:
+    """
+    Inverted index from token ids to requirements over a RequirementCorpus.
+
+    The postings are the token matrix of one field in CSC form: column t
+    holds the corpus rows of all requirements containing token t. A query
+    only touches the postings of its own tokens, so Jaccard scores are
+    computed for requirements that share at least one token with the query
+    instead of for the whole table.
+    """
+
+    def __init__(self, field="processed_description", corpus=None):
+        self.field = field
+        self.corpus = corpus if corpus is not None else RequirementCorpus()
+        self.postings = None
+        self.token_counts = None
+        self.indexed_state = None  # Generation and size of the corpus the postings were built from
+
+    def __len__(self):
+        return len(self.corpus)
+
+    def refresh(self, data_reader):
+        """
+        Add the requirements that were imported since the last refresh, or
+        rebuild the postings if the corpus was loaded again (see
+        RequirementCorpus.refresh).
+        """
+        self.corpus.refresh(data_reader)
+        state = (self.corpus.generation, len(self.corpus))
+        if state != self.indexed_state:
+            self.indexed_state = state
+            matrix = self.corpus.matrices[self.field]
+            self.postings = matrix.tocsc()
+            # Size of every token set, repeated tokens are one entry of the row
+            self.token_counts = np.diff(matrix.indptr)
+
+    def refreshed(self, data_reader):
+        """
+        Return a refreshed copy of the index. Queries running on this one in
+        other threads keep seeing a consistent corpus and postings.
+        """
+        index = copy.copy(self)
+        index.corpus = self.corpus.copy()
+        index.refresh(data_reader)
+        return index
+
+    def query(self, processed_text, threshold, top_k=None):
+        """
+        Return (requirement_id, similarity) tuples with a Jaccard similarity
+        above the threshold, best first and ties by descending id. The scores
+        are identical to CustomRequirementComparer.calculate_similarity. With
+        top_k only the k best matches are returned.
+        """
+        token_ids, query_count = self.corpus.encode(processed_text)
+        return self.query_token_ids(token_ids, query_count, threshold, top_k)
+
+    def query_token_ids(self, token_ids, query_count, threshold, top_k=None):
+        return query_postings(
+            self.postings.indptr,
+            self.postings.indices,
+            self.token_counts,
+            self.corpus.requirement_ids,
+            token_ids,
+            query_count,
+            threshold,
+            top_k,
+        )
+
+    def query_many(self, processed_texts, threshold, top_k=None):
+        """
+        Yield the results of query for every text, scoring blocks of texts at
+        once (see query_postings_many).
+        """
+        encoded_texts = [self.corpus.encode(processed_text) for processed_text in processed_texts]
+        return self.query_token_ids_many(
+            [token_ids for token_ids, _ in encoded_texts],
+            [query_count for _, query_count in encoded_texts],
+            threshold,
+            top_k,
+        )
+
+    def query_token_ids_many(self, token_id_lists, query_counts, threshold, top_k=None):
+        return query_postings_many(
+            self.postings.indptr,
+            self.postings.indices,
+            self.token_counts,
+            self.corpus.requirement_ids,
+            token_id_lists,
+            query_counts,
+            threshold,
+            top_k,
+        )
+
+    def get_memory_usage(self):
+        return {
+            **self.corpus.get_memory_usage(),
+            "postings_bytes": self.postings.indptr.nbytes + self.postings.indices.nbytes + self.token_counts.nbytes,
+        }
+
+
+def query_postings(indptr, indices, token_counts, requirement_ids, token_ids, query_count, threshold, top_k=None):
+    """
+    Score all requirements sharing a token with the query. indptr and indices
+    are the postings in CSC form, token_counts the size of the token set and
+    requirement_ids the id of every row; they may as well be read-only views
+    of a mapped index artifact.
+    """
+    token_ids = token_ids[token_ids < len(indptr) - 1]
+    rows = np.concatenate(
+        [indices[indptr[token_id]:indptr[token_id + 1]] for token_id in token_ids]
+        or [np.zeros(0, dtype=indices.dtype)]
+    )
+    candidates, common_counts = np.unique(rows, return_counts=True)
+    return rank_candidates(
+        candidates, common_counts, query_count, token_counts, requirement_ids, threshold, top_k
+    )
+
+
+def query_postings_many(
+    indptr, indices, token_counts, requirement_ids, token_id_lists, query_counts, threshold, top_k=None,
+    block_size=256,
+):
+    """
+    Yield the results of query_postings for every token id list. The token
+    sets of a block of queries are a sparse query matrix; gathering the
+    postings of all its entries and summing them per query and row computes
+    its product with the postings, i.e. the shared token counts of every
+    query and requirement, in one vectorized pass per block.
+    """
+    column_count = len(indptr) - 1
+    for block_start in range(0, len(token_id_lists), block_size):
+        block = [
+            token_ids[token_ids < column_count]
+            for token_ids in token_id_lists[block_start:block_start + block_size]
+        ]
+        token_ids = np.concatenate(block or [np.zeros(0, dtype=np.int32)])
+        query_rows = np.repeat(np.arange(len(block)), [len(block_token_ids) for block_token_ids in block])
+
+        starts = indptr[token_ids]
+        lengths = indptr[token_ids + 1] - starts
+        # Positions of all postings of all tokens, each token's range in turn
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        common_counts = scipy.sparse.csr_matrix(
+            (
+                np.ones(len(positions), dtype=np.int32),
+                (np.repeat(query_rows, lengths), indices[positions]),
+            ),
+            shape=(len(block), len(requirement_ids)),
+        )
+        common_counts.sum_duplicates()
+
+        for row, query_count in enumerate(query_counts[block_start:block_start + len(block)]):
+            row_slice = slice(common_counts.indptr[row], common_counts.indptr[row + 1])
+            yield rank_candidates(
+                common_counts.indices[row_slice],
+                common_counts.data[row_slice],
+                query_count,
+                token_counts,
+                requirement_ids,
+                threshold,
+                top_k,
+            )
+
+
+def rank_candidates(candidates, common_counts, query_count, token_counts, requirement_ids, threshold, top_k=None):
+    """
+    Return (requirement_id, similarity) tuples of the candidates above the
+    threshold, best first and ties by descending id.
+
+    With top_k the search is bounded: since |A n B| / |A u B| is at most
+    |A n B| / max(|A|, |B|), the exact scores of the top_k candidates with
+    the best bound are a floor, and only candidates whose bound reaches it
+    are scored. Those are cut to the k best by a partition before sorting.
+    """
+    candidate_token_counts = token_counts[candidates]
+    if top_k is not None and len(candidates) > top_k:
+        bounds = common_counts / np.maximum(query_count, candidate_token_counts)
+        best_bounded = np.argpartition(-bounds, top_k - 1)[:top_k]
+        floor = max(threshold, float(np.min(
+            common_counts[best_bounded]
+            / (query_count + candidate_token_counts[best_bounded] - common_counts[best_bounded])
+        )))
+        # Candidates scoring exactly the floor are kept, they may win a tie by id
+        reachable = bounds >= floor
+        candidates = candidates[reachable]
+        common_counts = common_counts[reachable]
+        candidate_token_counts = candidate_token_counts[reachable]
+
+    metrics.increment("candidates_scored_total", len(candidates))
+    # |A u B| = |A| + |B| - |A n B|
+    similarities = common_counts / (query_count + candidate_token_counts - common_counts)
+    above_threshold = similarities > threshold
+    candidates = candidates[above_threshold]
+    similarities = similarities[above_threshold]
+
+    if top_k is not None and len(similarities) > top_k:
+        # Everything scoring at least the k-th best, ties at the cut included
+        kth_similarity = np.partition(similarities, len(similarities) - top_k)[len(similarities) - top_k]
+        best = similarities >= kth_similarity
+        candidates = candidates[best]
+        similarities = similarities[best]
+
+    matched_requirement_ids = requirement_ids[candidates]
+    order = np.lexsort((-matched_requirement_ids, -similarities))
+    if top_k is not None:
+        order = order[:top_k]
+    return [
+        (int(requirement_id), float(similarity))
+        for requirement_id, similarity in zip(matched_requirement_ids[order], similarities[order])
+    ]
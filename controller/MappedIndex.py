@@ -0,0 +1,279 @@
+import bisect
+import copy
+import datetime
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from InvertedIndex import InvertedIndex, query_postings, query_postings_many
+from RequirementCorpus import RequirementCorpus
+
+MAGIC = b"SPECIDX1"
+FORMAT_VERSION = 2
+# Arrays start at multiples of the cache line size
+ALIGNMENT = 64
+
+
+def get_file_signature(path):
+    """
+    Return what identifies one version of a file, None if it does not exist.
+    Artifacts are replaced with os.replace, so a new version is a new inode.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def write_index_artifact(path, data_reader, field="processed_description"):
+    """
+    Write the inverted index of all requirements to path and return its
+    header.
+
+    The file is the magic bytes, the length of a JSON header as uint64 and the
+    header, followed by the arrays it lists with their dtype, shape and offset.
+    The tokens are stored as their sorted UTF-8 bytes with offsets, so a
+    reader looks them up by bisection instead of building a dict. The file is
+    written next to path and moved over it, readers never see a partial file.
+    """
+    start_time = time.perf_counter()
+    # One read transaction, so the revision, tokens and requirements are consistent
+    data_reader.conn.execute("BEGIN")
+    try:
+        revision = data_reader.get_corpus_revision()
+        corpus_version = data_reader.get_corpus_version()
+        corpus = RequirementCorpus().load(data_reader)
+    finally:
+        data_reader.conn.rollback()
+
+    postings = corpus.matrices[field].tocsc()
+    tokens = sorted((token.encode("utf-8"), token_id) for token, token_id in corpus.vocabulary.items())
+    arrays = {
+        "requirement_ids": corpus.requirement_ids,
+        "specification_ids": corpus.specification_ids,
+        "postings_indptr": postings.indptr.astype(np.int64),
+        "postings_indices": postings.indices.astype(np.int32),
+        "token_counts": np.diff(corpus.matrices[field].indptr).astype(np.int32),
+        "token_bytes": np.frombuffer(b"".join(token for token, _ in tokens), dtype=np.uint8),
+        "token_offsets": np.cumsum([0] + [len(token) for token, _ in tokens], dtype=np.int64),
+        "token_ids": np.array([token_id for _, token_id in tokens], dtype=np.int32),
+    }
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "field": field,
+        "revision": revision,
+        "corpus_version": corpus_version,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "last_requirement_id": corpus.last_requirement_id,
+        "last_token_id": corpus.last_token_id,
+        "requirements_generation": corpus.generation,
+        "arrays": {},
+    }
+    # The offsets depend on the header length, so it is padded to a fixed size first
+    header_size = ALIGNMENT * (len(json.dumps(header)) // ALIGNMENT + 1) + 2 * ALIGNMENT * len(arrays)
+    offset = len(MAGIC) + 8 + header_size
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode("utf-8").ljust(header_size)
+    if len(header_bytes) > header_size:
+        raise ValueError("Index artifact header exceeds its reserved size")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".index-")
+    try:
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(MAGIC + struct.pack("<Q", header_size) + header_bytes)
+            for name, array in arrays.items():
+                file.write(b"\0" * (header["arrays"][name]["offset"] - file.tell()))
+                file.write(np.ascontiguousarray(array).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    logging.info(
+        f"Wrote index artifact of {len(corpus)} requirements and {len(tokens)} tokens to {path} "
+        f"in {time.perf_counter() - start_time:.2f}s"
+    )
+    return header
+
+
+class TokenTable:
+    """
+    Sorted token bytes of an artifact as a sequence for bisect.
+    """
+
+    def __init__(self, token_bytes, token_offsets, token_ids):
+        self.token_bytes = token_bytes
+        self.token_offsets = token_offsets
+        self.token_ids = token_ids
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    def __getitem__(self, position):
+        return self.token_bytes[self.token_offsets[position]:self.token_offsets[position + 1]].tobytes()
+
+    def get(self, token):
+        token = token.encode("utf-8")
+        position = bisect.bisect_left(self, token)
+        if position < len(self) and self[position] == token:
+            return int(self.token_ids[position])
+        return None
+
+
+class MappedIndex:
+    """
+    InvertedIndex read from a prebuilt artifact (see write_index_artifact).
+
+    The arrays are read-only views of the memory-mapped file, so nothing is
+    copied when it is opened and all processes mapping the same file share
+    its pages in the page cache. Requirements imported after the artifact was
+    built are kept in a small InvertedIndex of their own, and the results of
+    both are merged.
+    """
+
+    def __init__(self, path, field="processed_description"):
+        self.path = path
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            self.signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            # The mapping stays valid when the file is replaced or deleted
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an index artifact")
+        (header_size,) = struct.unpack_from("<Q", self.buffer, len(MAGIC))
+        self.header = json.loads(self.buffer[len(MAGIC) + 8:len(MAGIC) + 8 + header_size])
+        if self.header["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {self.header['format_version']}, expected {FORMAT_VERSION}")
+        if self.header["field"] != field:
+            raise ValueError(f"{path} indexes {self.header['field']}, expected {field}")
+
+        arrays = {
+            name: np.frombuffer(
+                self.buffer, dtype=np.dtype(spec["dtype"]), count=int(np.prod(spec["shape"])), offset=spec["offset"]
+            ).reshape(spec["shape"])
+            for name, spec in self.header["arrays"].items()
+        }
+        self.requirement_ids = arrays["requirement_ids"]
+        self.specification_ids = arrays["specification_ids"]
+        self.postings_indptr = arrays["postings_indptr"]
+        self.postings_indices = arrays["postings_indices"]
+        self.token_counts = arrays["token_counts"]
+        self.tokens = TokenTable(arrays["token_bytes"], arrays["token_offsets"], arrays["token_ids"])
+
+        self.delta = InvertedIndex(
+            field,
+            RequirementCorpus(
+                self.header["last_requirement_id"],
+                self.header["last_token_id"],
+                self.header["requirements_generation"],
+            ),
+        )
+        logging.info(
+            f"Memory-mapped index artifact {path} of {len(self.requirement_ids)} requirements "
+            f"built at revision {self.header['revision']}"
+        )
+
+    def __len__(self):
+        return len(self.requirement_ids) + len(self.delta)
+
+    def refresh(self, data_reader):
+        """
+        Add the requirements that were imported since the artifact was built.
+        Raises ValueError once requirements in the artifact were deleted or
+        changed; it has to be built again.
+        """
+        self.delta.refresh(data_reader)
+
+    def refreshed(self, data_reader):
+        """
+        Same as InvertedIndex.refreshed, the mapped arrays are shared.
+        """
+        index = copy.copy(self)
+        index.delta = self.delta.refreshed(data_reader)
+        return index
+
+    def encode(self, processed_text):
+        tokens = set((processed_text or "").split())
+        token_ids = []
+        for token in tokens:
+            token_id = self.tokens.get(token)
+            if token_id is None:
+                token_id = self.delta.corpus.vocabulary.get(token)
+            if token_id is not None:
+                token_ids.append(token_id)
+        return np.array(token_ids, dtype=np.int32), len(tokens)
+
+    def query(self, processed_text, threshold, top_k=None):
+        """
+        Same as InvertedIndex.query.
+        """
+        token_ids, query_count = self.encode(processed_text)
+        results = query_postings(
+            self.postings_indptr,
+            self.postings_indices,
+            self.token_counts,
+            self.requirement_ids,
+            token_ids,
+            query_count,
+            threshold,
+            top_k,
+        )
+        if len(self.delta):
+            results += self.delta.query_token_ids(token_ids, query_count, threshold, top_k)
+            results.sort(key=lambda result: (-result[1], -result[0]))
+            if top_k is not None:
+                results = results[:top_k]
+        return results
+
+    def query_many(self, processed_texts, threshold, top_k=None):
+        """
+        Same as InvertedIndex.query_many.
+        """
+        encoded_texts = [self.encode(processed_text) for processed_text in processed_texts]
+        token_id_lists = [token_ids for token_ids, _ in encoded_texts]
+        query_counts = [query_count for _, query_count in encoded_texts]
+        artifact_results = query_postings_many(
+            self.postings_indptr,
+            self.postings_indices,
+            self.token_counts,
+            self.requirement_ids,
+            token_id_lists,
+            query_counts,
+            threshold,
+            top_k,
+        )
+        if not len(self.delta):
+            yield from artifact_results
+            return
+
+        delta_results = self.delta.query_token_ids_many(token_id_lists, query_counts, threshold, top_k)
+        for results, new_results in zip(artifact_results, delta_results):
+            results = sorted(results + new_results, key=lambda result: (-result[1], -result[0]))
+            yield results if top_k is None else results[:top_k]
+
+    def get_memory_usage(self):
+        return {
+            "artifact": self.path,
+            "artifact_revision": self.header["revision"],
+            "artifact_created_at": self.header["created_at"],
+            "artifact_requirements": len(self.requirement_ids),
+            "artifact_tokens": len(self.tokens),
+            "mapped_bytes": len(self.buffer),
+            "delta": self.delta.get_memory_usage(),
+        }
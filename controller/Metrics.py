@@ -0,0 +1,149 @@
+import bisect
+import contextlib
+import threading
+import time
+
+# Upper bounds in seconds, from a cached lookup to a full scan of a large corpus
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DESCRIPTIONS = {
+    "stage_seconds": ("histogram", "Time spent in a stage of handling a request"),
+    "request_seconds": ("histogram", "Time until the response of an endpoint was returned"),
+    "candidates_scored_total": ("counter", "Requirements whose similarity with a query was computed"),
+    "results_returned_total": ("counter", "Similar requirements returned to clients"),
+}
+
+NULL_SPAN = contextlib.nullcontext()
+
+
+class RequestTimings(threading.local):
+    # A class default instead of getattr, which is slow for missing attributes
+    timings = None
+
+
+class Span:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe_stage(self.stage, time.perf_counter() - self.start_time)
+        return False
+
+
+class Metrics:
+    """
+    Latency histograms and counters of one process, rendered in the
+    Prometheus text format.
+
+    Stages are timed with spans:
+
+        with metrics.span("preprocess"):
+            ...
+
+    When disabled, span returns a shared no-op context and increment returns
+    at once, so instrumented code only pays for an attribute check.
+
+    Between start_request and finish_request the spans of the current thread
+    are also summed per stage, e.g. for a Server-Timing header. Every gunicorn
+    worker keeps its own values, like the QueryCache statistics in /status.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.local = RequestTimings()
+        self.histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+        self.counters = {}  # (name, labels) -> value
+
+    def span(self, stage):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, stage)
+
+    def observe_stage(self, stage, seconds):
+        self.observe("stage_seconds", seconds, (("stage", stage),))
+        timings = self.local.timings
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def observe(self, name, seconds, labels=()):
+        if not self.enabled:
+            return
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def increment(self, name, value=1, labels=()):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def start_request(self):
+        self.local.timings = {}
+
+    def finish_request(self):
+        """
+        Return the summed seconds per stage since start_request.
+        """
+        timings = self.local.timings
+        self.local.timings = None
+        return timings or {}
+
+    def format_server_timing(self, timings):
+        return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
+
+    def render(self, prefix="spec_explorer_"):
+        with self.lock:
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        for name, (metric_type, description) in DESCRIPTIONS.items():
+            series = histograms if metric_type == "histogram" else counters
+            keys = sorted(key for key in series if key[0] == name)
+            if not keys:
+                continue
+            lines.append(f"# HELP {prefix}{name} {description}")
+            lines.append(f"# TYPE {prefix}{name} {metric_type}")
+            for key in keys:
+                labels = key[1]
+                if metric_type == "counter":
+                    lines.append(f"{prefix}{name}{format_labels(labels)} {series[key]}")
+                    continue
+                counts, total, count = series[key]
+                cumulative_count = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative_count += bucket_count
+                    bound_label = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f"{prefix}{name}_bucket{format_labels(labels + (('le', bound_label),))} {cumulative_count}"
+                    )
+                lines.append(f"{prefix}{name}_sum{format_labels(labels)} {total!r}")
+                lines.append(f"{prefix}{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+# Shared by all modules of a process, like the logging configuration
+metrics = Metrics()
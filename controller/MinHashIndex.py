@@ -0,0 +1,125 @@
+import logging
+import time
+import zlib
+from itertools import combinations
+
+import numpy as np
+
+from CustomRequirementComparer import CustomRequirementComparer
+
+# Universal hashing (a * x + b) mod p with the Mersenne prime 2^61 - 1. Token
+# hashes x and the coefficients a and b are below 2^32, so a * x + b < 2^64
+# is computed in uint64 without wrapping around before the reduction.
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_COEFFICIENT = 1 << 32
+MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+class MinHashIndex:
+    """
+    MinHash signatures of the processed requirement descriptions and a banded
+    LSH index over them.
+
+    The probability that two token sets share a MinHash value equals their
+    Jaccard similarity, the metric of CustomRequirementComparer. The signature
+    is cut into bands of rows values; requirements with an identical band land
+    in the same bucket and become a candidate pair. A pair with similarity s
+    is found with probability 1 - (1 - s^rows)^bands, so the candidates are
+    verified exactly afterwards. Signatures are stored in requirement_minhashes
+    and only computed for requirements that do not have one yet.
+    """
+
+    def __init__(self, num_perm=128, bands=16, rows=8, seed=1):
+        if bands * rows > num_perm:
+            raise ValueError(f"bands * rows must not exceed num_perm ({bands} * {rows} > {num_perm})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = rows
+        self.seed = seed
+
+        rnd = np.random.RandomState(seed)
+        self.a = rnd.randint(1, MAX_COEFFICIENT, size=num_perm, dtype=np.uint64)
+        self.b = rnd.randint(0, MAX_COEFFICIENT, size=num_perm, dtype=np.uint64)
+        self.requirement_ids = []
+        self.processed_descriptions = {}
+        self.buckets = [{} for _ in range(bands)]
+
+    def get_threshold(self):
+        """
+        Similarity at which a pair becomes a candidate with probability of about one half.
+        """
+        return (1.0 / self.bands) ** (1.0 / self.rows)
+
+    def get_candidate_probability(self, similarity):
+        return 1.0 - (1.0 - similarity ** self.rows) ** self.bands
+
+    def get_signature(self, tokens):
+        # crc32 instead of hash(), which is salted per process
+        token_hashes = np.fromiter(
+            (zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint64, count=len(tokens)
+        )
+        permuted = ((np.outer(token_hashes, self.a) + self.b) % MERSENNE_PRIME) & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def load(self, data_reader, data_writer=None):
+        """
+        Read the stored signatures, compute the missing ones and fill the LSH
+        buckets. New signatures are persisted if a data_writer is given.
+        """
+        start_time = time.perf_counter()
+        new_signatures = []
+        for req in data_reader.get_minhash_signatures(self.num_perm, self.seed):
+            tokens = set((req["processed_description"] or "").split())
+            if not tokens:
+                continue  # Jaccard similarity is undefined for empty texts
+
+            if req["signature"] is None:
+                signature = self.get_signature(tokens)
+                new_signatures.append((req["id"], self.num_perm, self.seed, signature.tobytes()))
+            else:
+                signature = np.frombuffer(req["signature"], dtype=np.uint32)
+            self.add(req["id"], req["processed_description"], signature)
+
+        if data_writer is not None and new_signatures:
+            data_writer.write_minhash_signatures(new_signatures)
+        logging.info(
+            f"Loaded MinHash signatures of {len(self.requirement_ids)} requirements ({len(new_signatures)} new) in {time.perf_counter() - start_time:.1f}s"
+        )
+        return self
+
+    def add(self, requirement_id, processed_description, signature):
+        self.requirement_ids.append(requirement_id)
+        self.processed_descriptions[requirement_id] = processed_description
+        for band, buckets in enumerate(self.buckets):
+            key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            buckets.setdefault(key, []).append(requirement_id)
+
+    def get_candidate_pairs(self):
+        """
+        Return all pairs of requirement ids (lower id first) that share a bucket in any band.
+        """
+        candidate_pairs = set()
+        for buckets in self.buckets:
+            for requirement_ids in buckets.values():
+                if len(requirement_ids) > 1:
+                    candidate_pairs.update(combinations(sorted(requirement_ids), 2))
+        return candidate_pairs
+
+    def find_near_duplicates(self, threshold, candidate_pairs=None):
+        """
+        Verify the candidate pairs with the exact Jaccard similarity of
+        CustomRequirementComparer and return (requirement1_id, requirement2_id,
+        similarity) for those above the threshold.
+        """
+        if candidate_pairs is None:
+            candidate_pairs = self.get_candidate_pairs()
+
+        comparer = CustomRequirementComparer(None, None, threshold)
+        near_duplicates = []
+        for requirement1_id, requirement2_id in candidate_pairs:
+            similarity = comparer.calculate_similarity(
+                self.processed_descriptions[requirement1_id], self.processed_descriptions[requirement2_id]
+            )
+            if similarity > threshold:
+                near_duplicates.append((requirement1_id, requirement2_id, similarity))
+        return sorted(near_duplicates)
@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    LRU cache of query results with a time to live and a memory limit.
+
+    Entries belong to the corpus revision they were computed for. When the
+    revision changes (after an import or a similarity recompute) all entries
+    are dropped. Values are stored as JSON, so their size is known exactly
+    and a shared tier can store them as they are.
+
+    The optional shared tier is a SharedQueryCache that all gunicorn workers
+    read and write; it is asked after a miss in the process-local LRU.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, ttl_seconds=3600, shared=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (created_at, serialized value)
+        self.current_bytes = 0
+        self.revision = None
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def set_revision(self, revision):
+        with self.lock:
+            if revision == self.revision:
+                return
+            if self.revision is not None:
+                self.stats["invalidations"] += 1
+                logging.info(f"Corpus revision changed to {revision}, dropping {len(self.entries)} cached results")
+            self.revision = revision
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def get(self, key):
+        """
+        Return the cached value or None.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl_seconds:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return json.loads(entry[1])
+            if entry is not None:
+                self.remove(key)
+            revision = self.revision
+
+        serialized = self.shared.get(key, revision, self.ttl_seconds) if self.shared else None
+        with self.lock:
+            if serialized is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["shared_hits"] += 1
+            if revision == self.revision:
+                self.store(key, serialized)
+        return json.loads(serialized)
+
+    def put(self, key, value):
+        serialized = json.dumps(value)
+        with self.lock:
+            revision = self.revision
+            self.store(key, serialized)
+        if self.shared:
+            self.shared.put(key, revision, serialized)
+
+    def store(self, key, serialized):
+        if len(serialized) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = (time.time(), serialized)
+        self.current_bytes += len(serialized)
+        while self.current_bytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def remove(self, key):
+        _, serialized = self.entries.pop(key)
+        self.current_bytes -= len(serialized)
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["shared_hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round((self.stats["hits"] + self.stats["shared_hits"]) / lookups, 3) if lookups else None,
+                "entries": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "revision": self.revision,
+                "shared": self.shared is not None,
+            }
+
+
+class SharedQueryCache:
+    """
+    Query results in a separate SQLite file, shared by all worker processes.
+    The requirements database is opened read-only by the web app, so the
+    cache lives in its own file. Rows of other revisions or past their time
+    to live are never returned and are purged whenever a new revision shows up.
+    """
+
+    def __init__(self, path, max_rows=10000):
+        self.path = path
+        self.max_rows = max_rows
+        self.local = threading.local()
+        self.purged_revision = None
+        self.put_count = 0
+
+    def connect(self):
+        # A connection must not be shared across a fork, open one per process and thread
+        if getattr(self.local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")  # Losing cached results is harmless
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_cache (
+                    key TEXT PRIMARY KEY,
+                    revision INTEGER,
+                    created_at REAL,
+                    value TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_query_cache_created_at ON query_cache(created_at)")
+            self.local.pid = os.getpid()
+            self.local.conn = conn
+        return self.local.conn
+
+    def get(self, key, revision, ttl_seconds):
+        try:
+            row = self.connect().execute(
+                "SELECT value FROM query_cache WHERE key = ? AND revision = ? AND created_at >= ?",
+                (key, revision, time.time() - ttl_seconds),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Shared query cache unavailable: {e}")
+            return None
+        return row[0] if row else None
+
+    def put(self, key, revision, serialized):
+        try:
+            conn = self.connect()
+            with conn:
+                if revision != self.purged_revision:
+                    conn.execute("DELETE FROM query_cache WHERE revision <> ?", (revision,))
+                    self.purged_revision = revision
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_cache (key, revision, created_at, value) VALUES (?, ?, ?, ?)",
+                    (key, revision, time.time(), serialized),
+                )
+                self.put_count += 1
+                if self.put_count % 100 == 0:
+                    # Keep the newest max_rows results
+                    conn.execute(
+                        """
+                        DELETE FROM query_cache WHERE key IN (
+                            SELECT key FROM query_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                        )
+                        """,
+                        (self.max_rows,),
+                    )
+        except sqlite3.Error as e:
+            logging.warning(f"Shared query cache unavailable: {e}")
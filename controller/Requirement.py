@@ -1,5 +1,11 @@
 
 class Requirement:
+    # No per-instance __dict__, imports hold many of these at once
+    __slots__ = (
+        "specification_id", "source", "requirement_number", "title", "description",
+        "processed_title", "processed_description", "obligation", "test_procedure",
+    )
+
     specification_id: int  
     source: str
     requirement_number: str
@@ -8,7 +14,7 @@ class Requirement:
     processed_title: str
     processed_description: str
     obligation: str
-    test_procedure: str = "unknown"  # Default value for test_procedure
+    test_procedure: str  # Defaults to "unknown"
     
     def __init__(self, specification_id, source, requirement_number, title, description, 
                  processed_title, processed_description, obligation, test_procedure="unknown"):
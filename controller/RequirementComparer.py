@@ -1,9 +1,27 @@
+import heapq
 import logging
 from abc import ABC, abstractmethod
 
+import numpy as np
+import scipy.sparse
+
+from Metrics import metrics
+from TokenVocabulary import content_hash
+
+
+def get_text_hash(requirement, field):
+    """
+    Return the stored content hash of a processed field, or compute it for
+    requirements that were not read from the database.
+    """
+    text_hash = requirement.get(f"{field}_hash")
+    return text_hash if text_hash is not None else content_hash(requirement[field])
 
 
 class RequirementComparer(ABC):
+    # Upper bound for the number of scores held in memory per block
+    max_block_cells = 2_000_000
+
     def __init__(self, data_reader, data_writer, threshold):
         self.data_reader = data_reader
         self.data_writer = data_writer
@@ -13,53 +31,198 @@ class RequirementComparer(ABC):
     def compare_requirements(self, specification1, specification2):
         spec1_requirements = self.data_reader.get_requirements_by_specification(specification1)
         spec2_requirements = self.data_reader.get_requirements_by_specification(specification2)
-        for i, spec1_req in enumerate(spec1_requirements):
-            for spec2_req in spec2_requirements:
+        self.compare_requirement_lists(
+            specification1, spec1_requirements, specification2, spec2_requirements
+        )
+
+    def compare_requirement_lists(
+        self, specification1, spec1_requirements, specification2, spec2_requirements
+    ):
+        """
+        Compare given requirements of two specifications, e.g. only the
+        changed requirements of a new specification version.
+        """
+        if not spec1_requirements or not spec2_requirements:
+            return
+
+        # Requirements with the same texts are scored once, by their first member
+        self.compare_groups(
+            specification1,
+            self.group_by_content(spec1_requirements),
+            specification2,
+            self.group_by_content(spec2_requirements),
+        )
+
+    def compare_groups(self, specification1, spec1_groups, specification2, spec2_groups):
+        """
+        Score the requirement groups of two specifications. Comparers that
+        can score whole blocks at once derive from BlockedRequirementComparer.
+        """
+        self.compare_groups_pairwise(specification1, spec1_groups, specification2, spec2_groups)
+
+    def get_content_key(self, requirement):
+        """
+        Return what the scores of a requirement depend on; requirements with
+        the same key get the same scores.
+        """
+        return (
+            get_text_hash(requirement, "processed_title"),
+            get_text_hash(requirement, "processed_description"),
+        )
+
+    def group_by_content(self, requirements):
+        """
+        Return the requirements as lists of requirements with the same
+        content key, in the order of their first occurrence.
+        """
+        groups = {}
+        for req in requirements:
+            groups.setdefault(self.get_content_key(req), []).append(req)
+        return list(groups.values())
+
+    def add_group_similarities(
+        self, specification1, spec1_group, specification2, spec2_group, title_similarity, description_similarity
+    ):
+        """
+        Write one computed score for every requirement pair of two groups.
+        """
+        for spec1_req in spec1_group:
+            for spec2_req in spec2_group:
                 if spec1_req["requirement_number"] == spec2_req["requirement_number"]:
                     continue
 
-                title_similarity = self.calculate_similarity(
-                    spec1_req["processed_title"], spec2_req["processed_title"]
-                )
-                description_similarity = self.calculate_similarity(
-                    spec1_req["processed_description"],
-                    spec2_req["processed_description"],
+                self.data_writer.add_requirement_similarities(
+                    specification1["id"],
+                    specification2["id"],
+                    spec1_req["id"],
+                    spec2_req["id"],
+                    spec1_req["requirement_number"],
+                    spec2_req["requirement_number"],
+                    title_similarity,
+                    description_similarity,
+                    self.get_comparison_method()
                 )
 
+    def compare_requirements_pairwise(
+        self, specification1, spec1_requirements, specification2, spec2_requirements
+    ):
+        self.compare_groups_pairwise(
+            specification1,
+            self.group_by_content(spec1_requirements),
+            specification2,
+            self.group_by_content(spec2_requirements),
+        )
+
+    def compare_groups_pairwise(self, specification1, spec1_groups, specification2, spec2_groups):
+        """
+        Score every pair of groups with calculate_similarity. Scores are looked
+        up in and added to the similarity_score_memo, so texts that were
+        compared before, e.g. in an earlier version of a specification, are
+        not scored again.
+        """
+        memoized_scores = self.get_memoized_scores(
+            {
+                get_text_hash(group[0], field)
+                for group in spec1_groups + spec2_groups
+                for field in ("processed_title", "processed_description")
+            }
+        )
+        for i, spec1_group in enumerate(spec1_groups):
+            for spec2_group in spec2_groups:
+                description_similarity = self.calculate_memoized_similarity(
+                    memoized_scores, spec1_group[0], spec2_group[0], "processed_description"
+                )
                 if self.is_above_threshold(description_similarity, self.threshold):
-                    self.data_writer.add_requirement_similarities(
-                        specification1["id"],
-                        specification2["id"],
-                        spec1_req["id"],
-                        spec2_req["id"],
-                        spec1_req["requirement_number"],
-                        spec2_req["requirement_number"],
-                        title_similarity,
-                        description_similarity,
-                        self.get_comparison_method()
+                    title_similarity = self.calculate_memoized_similarity(
+                        memoized_scores, spec1_group[0], spec2_group[0], "processed_title"
+                    )
+                    self.add_group_similarities(
+                        specification1, spec1_group, specification2, spec2_group,
+                        title_similarity, description_similarity,
                     )
             if (i + 1) % 100 == 0:
                 logging.info(
-                    f"Progress: Compared {i + 1} requirements of {specification1['name']} V{specification1['version']} with {specification2['name']} V{specification2['version']} by using {self.get_comparison_method()}"
+                    f"Progress: Compared {i + 1} distinct requirements of {specification1['name']} V{specification1['version']} with {specification2['name']} V{specification2['version']} by using {self.get_comparison_method()}"
                 )
 
+    def get_memoized_scores(self, text_hashes):
+        text_hashes.discard(None)
+        if self.data_reader is None or not text_hashes:
+            return {}
+        return self.data_reader.get_memoized_scores(self.get_comparison_method(), text_hashes)
+
+    def calculate_memoized_similarity(self, memoized_scores, requirement1, requirement2, field):
+        hash1 = get_text_hash(requirement1, field)
+        hash2 = get_text_hash(requirement2, field)
+        if hash1 is None or hash2 is None:
+            return self.calculate_similarity(requirement1[field], requirement2[field])
+
+        # Scores are symmetric, the lower hash comes first
+        key = (hash1, hash2) if hash1 <= hash2 else (hash2, hash1)
+        similarity = memoized_scores.get(key)
+        if similarity is None:
+            similarity = memoized_scores[key] = float(
+                self.calculate_similarity(requirement1[field], requirement2[field])
+            )
+            if self.data_writer is not None:
+                self.data_writer.add_memoized_score(self.get_comparison_method(), *key, similarity)
+        return similarity
+
+
+    def find_similar_requirements(
+        self, processed_input_text, requirements=None, top_k=None, min_score=None
+    ):
+        """
+        Return the requirements whose description is more similar to the input
+        than the threshold, or than min_score if given. With top_k only the k
+        most similar ones are kept (in a bounded heap), best first.
+        """
+        threshold = self.get_query_threshold(min_score)
 
-    def find_similar_requirements(self, processed_input_text):
-        all_requirements = self.data_reader.get_all_requirements()
-        
-        similar_requirements = []
-        
-        for req in all_requirements:
-            description_similarity = self.calculate_similarity(processed_input_text, req["processed_description"])
+        # A preloaded corpus can be passed in to avoid reading the whole table per query
+        if requirements is None:
+            requirements = self.data_reader.get_all_requirements()
+        metrics.increment("candidates_scored_total", len(requirements))
 
-            if self.is_above_threshold(description_similarity, self.threshold):
-                # Füge Similarität und Threshold dem Requirement-Datenobjekt hinzu
-                req_with_similarity = req.copy()  # Erstelle eine Kopie des Requirement-Objekts, falls nötig
-                req_with_similarity["similarity"] = description_similarity
-                req_with_similarity["threshold"] = self.threshold
-                similar_requirements.append(req_with_similarity)
+        scored_requirements = (
+            (self.calculate_similarity(processed_input_text, req["processed_description"]), req["id"])
+            for req in requirements
+        )
+        matches = (
+            (description_similarity, requirement_id)
+            for description_similarity, requirement_id in scored_requirements
+            if self.is_above_threshold(description_similarity, threshold)
+        )
+        if top_k is not None:
+            matches = heapq.nlargest(top_k, matches)
 
-        return similar_requirements
+        return [
+            self.build_match(requirement_id, description_similarity, threshold)
+            for description_similarity, requirement_id in matches
+        ]
+
+    def get_query_threshold(self, min_score):
+        return self.threshold if min_score is None else min_score
+
+    def build_match(self, requirement_id, similarity, threshold):
+        # Only id and similarity are needed, DataReader.enrich_requirements loads the rest
+        return {"id": requirement_id, "similarity": similarity, "threshold": threshold}
+
+    def build_matches_from_scores(self, requirement_ids, similarities, threshold, top_k):
+        """
+        Build the matches from one score per corpus row, best first. With top_k
+        only the k best rows are selected (argpartition) before sorting.
+        """
+        metrics.increment("candidates_scored_total", len(similarities))
+        rows = np.flatnonzero(similarities > threshold)
+        if top_k is not None and len(rows) > top_k:
+            rows = rows[np.argpartition(-similarities[rows], top_k - 1)[:top_k]]
+        rows = rows[np.argsort(-similarities[rows], kind="stable")]
+
+        return [
+            self.build_match(requirement_ids[row], float(similarities[row]), threshold)
+            for row in rows
+        ]
 
     def is_above_threshold(self, description_similarity: float, treshold: float) -> bool:
         return description_similarity > treshold
@@ -73,3 +236,94 @@ class RequirementComparer(ABC):
     def get_comparison_method(self) -> str:
         pass
 
+
+class BlockedRequirementComparer(RequirementComparer):
+    """
+    Comparer that scores two requirement lists as a product of row matrices,
+    one row per requirement, instead of pair by pair.
+    """
+
+    @abstractmethod
+    def build_matrices(self, requirements1, requirements2, field):
+        """
+        Return one row matrix per requirement list for the given text field.
+        """
+
+    @abstractmethod
+    def score_block(self, matrix1, matrix2):
+        """
+        Return the (sparse or dense) similarity block of all rows of matrix1
+        against all rows of matrix2.
+        """
+
+    def compare_groups(self, specification1, spec1_groups, specification2, spec2_groups):
+        spec1_representatives = [group[0] for group in spec1_groups]
+        spec2_representatives = [group[0] for group in spec2_groups]
+        self.compare_requirements_blocked(
+            specification1,
+            spec1_groups,
+            specification2,
+            spec2_groups,
+            self.build_matrices(spec1_representatives, spec2_representatives, "processed_description"),
+            self.build_matrices(spec1_representatives, spec2_representatives, "processed_title"),
+        )
+
+    def compare_requirements_blocked(
+        self,
+        specification1,
+        spec1_groups,
+        specification2,
+        spec2_groups,
+        description_matrices,
+        title_matrices,
+    ):
+        """
+        Score the requirement groups of specification1 in blocks of rows
+        against all groups of specification2, one matrix row per group. A
+        block never holds more than max_block_cells scores, so memory stays
+        bounded for large specs.
+        """
+        spec1_descriptions, spec2_descriptions = description_matrices
+        spec1_titles, spec2_titles = title_matrices
+        block_size = max(1, self.max_block_cells // len(spec2_groups))
+
+        for start in range(0, len(spec1_groups), block_size):
+            stop = min(start + block_size, len(spec1_groups))
+            rows, columns, description_scores = self.get_scores_above_threshold(
+                self.score_block(spec1_descriptions[start:stop], spec2_descriptions)
+            )
+            if len(rows) == 0:
+                continue
+            title_scores = self.get_scores_at(
+                self.score_block(spec1_titles[start:stop], spec2_titles), rows, columns
+            )
+
+            for row, column, title_similarity, description_similarity in zip(
+                rows, columns, title_scores, description_scores
+            ):
+                self.add_group_similarities(
+                    specification1,
+                    spec1_groups[start + row],
+                    specification2,
+                    spec2_groups[column],
+                    float(title_similarity),
+                    float(description_similarity),
+                )
+
+            logging.info(
+                f"Progress: Compared {stop} requirements of {specification1['name']} V{specification1['version']} with {specification2['name']} V{specification2['version']} by using {self.get_comparison_method()}"
+            )
+
+    def get_scores_above_threshold(self, block):
+        if scipy.sparse.issparse(block):
+            block = block.tocoo()
+            above_threshold = block.data > self.threshold
+            return block.row[above_threshold], block.col[above_threshold], block.data[above_threshold]
+
+        rows, columns = np.nonzero(block > self.threshold)
+        return rows, columns, block[rows, columns]
+
+    def get_scores_at(self, block, rows, columns):
+        if scipy.sparse.issparse(block):
+            return np.asarray(block.tocsr()[rows, columns]).ravel()
+        return block[rows, columns]
@@ -0,0 +1,170 @@
+import copy
+import logging
+import sys
+import time
+
+import numpy as np
+import scipy.sparse
+
+from TokenVocabulary import TOKEN_ID_DTYPE
+
+FIELDS = ("processed_title", "processed_description")
+
+
+def build_token_matrix(packed_token_id_lists, column_count=None, binary=False):
+    """
+    Return a CSR matrix with one row per packed token id list (see
+    TokenVocabulary) and one column per token id, holding how often the token
+    occurs, or 1 with binary=True.
+    """
+    packed_token_id_lists = [packed_token_ids or b"" for packed_token_ids in packed_token_id_lists]
+    lengths = np.fromiter(
+        (len(packed_token_ids) // TOKEN_ID_DTYPE.itemsize for packed_token_ids in packed_token_id_lists),
+        dtype=np.int64,
+        count=len(packed_token_id_lists),
+    )
+    token_ids = np.frombuffer(b"".join(packed_token_id_lists), dtype=TOKEN_ID_DTYPE).astype(np.int32)
+    if column_count is None:
+        column_count = int(token_ids.max()) + 1 if len(token_ids) else 0
+
+    # Converting from coordinates sums up repeated tokens of a row
+    matrix = scipy.sparse.csr_matrix(
+        (
+            np.ones(len(token_ids), dtype=np.int32),
+            (np.repeat(np.arange(len(lengths), dtype=np.int32), lengths), token_ids),
+        ),
+        shape=(len(lengths), column_count),
+    )
+    if binary:
+        matrix.data[:] = 1
+    return matrix
+
+
+class RequirementCorpus:
+    """
+    Compact in-memory form of the processed requirement texts.
+
+    Requirements are rows of parallel arrays of requirement and specification
+    ids, sorted by id. Every processed field is a CSR matrix of token counts
+    whose columns are the ids of the tokens table, i.e. an int32 array of
+    token ids per requirement plus the row offsets. The token ids are read
+    from the packed BLOB columns, so loading does not split strings and no
+    Python object is kept per requirement or per token occurrence.
+
+    New requirements are appended by refresh. When requirements were deleted
+    or their tokens changed, which the requirements generation of the
+    database counts, their rows are stale and their ids may have been reused,
+    so the corpus is loaded again.
+    """
+
+    def __init__(self, last_requirement_id=0, last_token_id=0, generation=None):
+        # Only requirements and tokens with larger ids are loaded, e.g. the ones an index artifact misses
+        self.first_requirement_id = last_requirement_id
+        self.generation = generation
+        self.clear(last_requirement_id, last_token_id)
+
+    def clear(self, last_requirement_id=0, last_token_id=0):
+        self.vocabulary = {}
+        self.requirement_ids = np.zeros(0, dtype=np.int64)
+        self.specification_ids = np.zeros(0, dtype=np.int32)
+        self.matrices = {field: scipy.sparse.csr_matrix((0, 0), dtype=np.int32) for field in FIELDS}
+        self.last_requirement_id = last_requirement_id
+        self.last_token_id = last_token_id
+
+    def __len__(self):
+        return len(self.requirement_ids)
+
+    def load(self, data_reader):
+        self.refresh(data_reader)
+        return self
+
+    def refresh(self, data_reader):
+        """
+        Add the tokens and requirements that were written since the last
+        refresh, or load all of them again if existing requirements were
+        deleted or changed. Returns the number of added requirements.
+
+        A corpus that starts after first_requirement_id cannot load the
+        requirements before it and raises ValueError instead.
+        """
+        start_time = time.perf_counter()
+        # Read before the rows, a concurrent change is then seen by the next refresh
+        generation = data_reader.get_requirements_generation()
+        if self.generation is not None and generation != self.generation:
+            if self.first_requirement_id:
+                raise ValueError(f"Requirements up to id {self.first_requirement_id} were deleted or changed")
+            logging.info("Requirements were deleted or changed, loading the corpus again")
+            self.clear()
+        self.generation = generation
+
+        new_tokens = data_reader.get_token_vocabulary(self.last_token_id)
+        self.vocabulary.update((sys.intern(token), token_id) for token, token_id in new_tokens.items())
+        self.last_token_id = max(self.last_token_id, *new_tokens.values()) if new_tokens else self.last_token_id
+
+        rows = data_reader.get_requirement_tokens_after(self.last_requirement_id)
+        if not rows:
+            return 0
+        self.last_requirement_id = rows[-1][0]
+
+        unpacked_count = sum(1 for row in rows if row[2] is None and row[3] is None)
+        if unpacked_count:
+            logging.warning(f"{unpacked_count} requirements have no packed token ids and are indexed without tokens")
+
+        self.requirement_ids = np.concatenate(
+            (self.requirement_ids, np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)))
+        )
+        self.specification_ids = np.concatenate(
+            (self.specification_ids, np.fromiter((row[1] or 0 for row in rows), dtype=np.int32, count=len(rows)))
+        )
+        column_count = self.last_token_id + 1
+        for column, field in enumerate(FIELDS, start=2):
+            # Widened without resizing in place, copies may share the matrix
+            matrix = self.matrices[field]
+            matrix = scipy.sparse.csr_matrix(
+                (matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], column_count)
+            )
+            self.matrices[field] = scipy.sparse.vstack(
+                (matrix, build_token_matrix([row[column] for row in rows], column_count)), format="csr"
+            )
+
+        logging.info(
+            f"Loaded tokens of {len(rows)} requirements into the corpus in {time.perf_counter() - start_time:.2f}s"
+        )
+        return len(rows)
+
+    def copy(self):
+        """
+        Return a corpus that can be refreshed without changing this one. The
+        arrays are shared, refresh replaces them instead of writing to them.
+        """
+        corpus = copy.copy(self)
+        corpus.vocabulary = dict(self.vocabulary)
+        corpus.matrices = dict(self.matrices)
+        return corpus
+
+    def encode(self, processed_text):
+        """
+        Return the ids of the known tokens of a text and the number of its
+        distinct tokens, known or not.
+        """
+        tokens = set((processed_text or "").split())
+        token_ids = [self.vocabulary[token] for token in tokens if token in self.vocabulary]
+        return np.array(token_ids, dtype=np.int32), len(tokens)
+
+    def get_memory_usage(self):
+        """
+        Return the bytes held by the arrays and the vocabulary.
+        """
+        matrix_bytes = sum(
+            matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes for matrix in self.matrices.values()
+        )
+        vocabulary_bytes = sys.getsizeof(self.vocabulary) + sum(
+            sys.getsizeof(token) + sys.getsizeof(token_id) for token, token_id in self.vocabulary.items()
+        )
+        return {
+            "requirements": len(self),
+            "tokens": len(self.vocabulary),
+            "id_bytes": self.requirement_ids.nbytes + self.specification_ids.nbytes,
+            "matrix_bytes": matrix_bytes,
+            "vocabulary_bytes": vocabulary_bytes,
+        }
@@ -1,9 +1,11 @@
 import openpyxl
+import functools
+import itertools
 import logging
-import os
 import re
-import sqlite3
 import string
+import sys
+import time
 import spacy
 import nltk
 from nltk.corpus import stopwords
@@ -12,90 +14,154 @@ from nltk.stem import SnowballStemmer
 from Requirement import Requirement
 
 
+# Every character matched by the regular expression \d (Unicode category Nd)
+DECIMAL_DIGITS = "".join(
+    chr(codepoint) for codepoint in range(sys.maxunicode + 1) if chr(codepoint).isdecimal()
+)
+
+
+@functools.lru_cache(maxsize=None)
+def load_pipeline(model_name="de_core_news_md"):
+    """
+    Load a spaCy pipeline once per process. RequirementProcessor and
+    EmbeddingRequirementComparer share it, and pool workers forked after it
+    was loaded use the copy of the parent process.
+    """
+    return spacy.load(model_name)
+
+
 class RequirementProcessor:
-    def __init__(self, data_writer, words_to_replace):
+    def __init__(self, data_writer, words_to_replace, stem_cache_size=100_000):
         self.data_writer = data_writer
-        self.nlp = spacy.load("de_core_news_md")
+        self.nlp = load_pipeline("de_core_news_md")
         nltk.download("stopwords")
         nltk.download("wordnet")
         self.words_to_replace = words_to_replace
+        self.stop_words = set(stopwords.words("german"))
+        self.stemmer = SnowballStemmer("german")
+
+        # Compiled once instead of per call
+        self.replace_pattern = (
+            re.compile("|".join(re.escape(word) for word in words_to_replace))
+            if words_to_replace
+            else None
+        )
+        self.translation_table = str.maketrans("", "", string.punctuation + DECIMAL_DIGITS)
+        self.stem = functools.lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
 
     def preprocess_text(self, text):
         if text is None or text.strip() == "":
             return None
 
-        # Replace each word in the array with an empty string
-        for word_to_replace in self.words_to_replace:
-            text = text.replace(word_to_replace, "")
-
-        # Continue with the preprocessing steps
-        text = text.lower()
-        text = text.translate(str.maketrans("", "", string.punctuation))
-        text = re.sub(r"\d+", "", text)
-        text = text.strip()
-
-        # Tokenization and stopword removal
-        stop_words = set(stopwords.words("german"))
-        words = text.split()
-        words = [word for word in words if word not in stop_words]
-
-        # Stemming
-        stemmer = SnowballStemmer("german")
-        words = [stemmer.stem(word) for word in words]
-
-        return " ".join(words)
+        # Replace each word in the array with an empty string. One regex scan
+        # finds the texts without any of them; the others keep the sequential
+        # replacement because removing one word may join a later one.
+        if self.replace_pattern is not None and self.replace_pattern.search(text):
+            for word_to_replace in self.words_to_replace:
+                text = text.replace(word_to_replace, "")
 
-    def import_requirements_to_db(self, specification):
-        print(f"Importing {specification.name}")
-        workbook = openpyxl.load_workbook(specification.file_path)
-        sheet = workbook["Festlegungen"]
+        # Lowercase, then drop punctuation and digits in one pass
+        text = text.lower().translate(self.translation_table)
 
-        total_entries = 0
-        for row in sheet.iter_rows(min_row=2):  # Skip the header row
-            requirement_number = row[0].value
-            title = row[1].value
-            description = row[2].value
-            obligation = row[4].value  # Skip 'Beschreibung (HTML)'
-
-            source = specification.name
-            test_procedure = "unknown"
+        # Tokenization, stopword removal and stemming
+        return " ".join(
+            self.stem(word) for word in text.split() if word not in self.stop_words
+        )
 
-            # Check if there are more columns for 'Quelle (Referenz)' and 'Pruefverfahren'
-            if len(row) > 5:
-                source = row[5].value or source
-            if len(row) > 6:
-                test_procedure = row[6].value
+    def preprocess_many(self, texts):
+        """
+        Preprocess a batch of texts. Texts occurring more than once in the
+        batch are only processed once.
+        """
+        processed_texts = {}
+        for text in texts:
+            if text not in processed_texts:
+                processed_texts[text] = self.preprocess_text(text)
+        return [processed_texts[text] for text in texts]
+
+    def import_requirements_to_db(self, specification, batch_size=1000):
+        """
+        Stream the 'Festlegungen' sheet of the specification's workbook into
+        the database. Rows are read in read-only mode and written in batches
+        of batch_size, all inside one transaction: a failing file leaves no
+        requirements of the specification behind.
+        """
+        logging.info(f"Importing {specification.name}")
+        start_time = time.perf_counter()
+        total_entries = self.data_writer.write_specification_requirements(
+            specification, self.read_requirements(specification, batch_size)
+        )
 
-            processed_title = self.preprocess_text(title)
-            processed_description = self.preprocess_text(description)
+        elapsed_seconds = time.perf_counter() - start_time
+        logging.info(
+            f"Total number of entries added from {specification.name}: {total_entries} ({total_entries / elapsed_seconds:.0f} rows/s)"
+        )
 
+    def read_requirements(self, specification, batch_size=1000):
+        """
+        Yield the preprocessed requirements of the specification's workbook in
+        batches of at most batch_size rows.
+        """
+        rows_read = 0
+        for batch in self.read_sheet_rows(specification.file_path, batch_size):
+            yield self.build_requirements(specification, batch, rows_read)
+            rows_read += len(batch)
+
+    def read_sheet_rows(self, file, batch_size=1000):
+        """
+        Yield the data rows of the 'Festlegungen' sheet of a workbook, given
+        as a path or a binary file object, in batches of at most batch_size.
+        """
+        workbook = openpyxl.load_workbook(file, read_only=True)
+        try:
+            sheet = workbook["Festlegungen"]
+            rows = sheet.iter_rows(min_row=2, values_only=True)  # Skip the header row
+            yield from iter(lambda: list(itertools.islice(rows, batch_size)), [])
+        finally:
+            workbook.close()
+
+    def parse_row(self, row, default_source):
+        """
+        Map a row of the 'Festlegungen' sheet to the fields of a Requirement.
+        """
+        fields = {
+            "requirement_number": row[0],
+            "title": row[1],
+            "description": row[2],
+            "obligation": row[4],  # Skip 'Beschreibung (HTML)'
+            "source": default_source,
+            "test_procedure": "unknown",
+        }
+
+        # Check if there are more columns for 'Quelle (Referenz)' and 'Pruefverfahren'
+        if len(row) > 5:
+            fields["source"] = row[5] or default_source
+        if len(row) > 6:
+            fields["test_procedure"] = row[6]
+        return fields
+
+    def build_requirements(self, specification, rows, row_offset):
+        """
+        Preprocess a batch of sheet rows into Requirement objects. row_offset
+        is the number of data rows before the batch.
+        """
+        processed_titles = self.preprocess_many([row[1] for row in rows])
+        processed_descriptions = self.preprocess_many([row[2] for row in rows])
+
+        requirements = []
+        for row_number, row, processed_title, processed_description in zip(
+            itertools.count(row_offset + 2), rows, processed_titles, processed_descriptions
+        ):
             if processed_title is None or processed_description is None:
                 logging.error(
-                    f"Row {total_entries+2} in {specification.fullname} has empty title or description and will be skipped."
+                    f"Row {row_number} in {specification.fullname} has empty title or description and will be skipped."
                 )
                 continue
 
-            requirement = Requirement(
+            requirements.append(Requirement(
                 specification_id=specification.id,
-                source=source,
-                requirement_number=requirement_number,
-                title=title,
-                description=description,
                 processed_title=processed_title,
                 processed_description=processed_description,
-                obligation=obligation,
-                test_procedure=test_procedure,
-            )
-
-            try:
-                self.data_writer.add_requirement(requirement)
-                total_entries += 1
-            except sqlite3.Error as e:
-                logging.error(f"Error inserting data into database: {e}")
-                continue
-        self.data_writer.commit_requirements()
-        self.data_writer.update_specification_req_count(specification.id)
-
-        logging.info(
-            f"Total number of entries added from {specification.name}: {total_entries}"
-        )
+                **self.parse_row(row, specification.name),
+            ))
+        return requirements
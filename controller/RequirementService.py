@@ -0,0 +1,381 @@
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import zipfile
+
+from CustomRequirementComparer import CustomRequirementComparer
+from DataReader import DataReader
+from InvertedIndex import InvertedIndex
+from MappedIndex import MappedIndex, get_file_signature
+from Metrics import metrics
+from RequirementProcessor import RequirementProcessor
+from SchemaMigrator import configure_connection
+
+
+class RequirementService:
+    """
+    Process-wide state behind the web endpoints.
+
+    The NLP pipeline, stopword set, stemmer and an inverted index over the
+    requirement corpus are loaded once when the service is created. With
+    gunicorn's preload_app this happens in the master process and the forked
+    workers share the loaded state, so a request only does the scoring work.
+
+    With use_index=False no corpus is held in memory; the candidates of a
+    query are taken from the requirements_fts index and scored exactly.
+
+    When an index artifact exists at index_path (see scripts/build_index.py)
+    it is memory-mapped instead of loading the corpus, so all workers share
+    one copy. Every request checks whether the file was replaced and then
+    switches to the new artifact.
+
+    Results are kept in an optional QueryCache. Every request reads the corpus
+    revision; when it changed, the cache is dropped and the index picks up
+    newly imported requirements.
+
+    The stages of loading and of every query are timed as spans of the
+    process-wide Metrics (see Metrics.py).
+    """
+
+    def __init__(self, db_path, words_to_replace, threshold, use_index=True, cache=None, index_path=None):
+        self.db_path = db_path
+        self.index_path = index_path
+        self.index_signature = None
+        self.threshold = threshold
+        self.cache = cache
+        self.local = threading.local()
+        self.index_lock = threading.Lock()
+
+        start_time = time.perf_counter()
+        with metrics.span("load_nlp"):
+            self.processor = RequirementProcessor(None, words_to_replace)
+        self.index = None
+        conn = self.connect()
+        try:
+            data_reader = DataReader(conn)
+            # Read before the index, so a concurrent import is picked up by the next request
+            self.revision = data_reader.get_corpus_revision()
+            if use_index:
+                with metrics.span("load_index"):
+                    self.index = self.open_index(data_reader)
+        finally:
+            conn.close()
+        if self.cache is not None:
+            self.cache.set_revision(self.revision)
+        self.startup_seconds = time.perf_counter() - start_time
+
+        logging.info(
+            f"Loaded NLP resources and {len(self.index) if self.index is not None else 'no'} requirements in {self.startup_seconds:.2f}s"
+        )
+
+    def connect(self):
+        """
+        Open a read-only connection; the web endpoints never write.
+        """
+        uri = pathlib.Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        return configure_connection(sqlite3.connect(uri, uri=True), read_only=True)
+
+    def get_data_reader(self):
+        """
+        Return the DataReader of the current thread. Connections must not be
+        shared across a fork, so a new one is opened in every worker process.
+        """
+        if getattr(self.local, "pid", None) != os.getpid():
+            with metrics.span("connect"):
+                self.local.data_reader = DataReader(self.connect())
+            self.local.pid = os.getpid()
+        return self.local.data_reader
+
+    def open_index(self, data_reader):
+        """
+        Return the refreshed index, mapped from the artifact if there is one.
+        """
+        self.index_signature = get_file_signature(self.index_path) if self.index_path else None
+        if self.index_signature is not None:
+            try:
+                index = MappedIndex(self.index_path)
+                self.index_signature = index.signature
+                index.refresh(data_reader)
+                return index
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not use the index artifact {self.index_path}, loading the corpus instead: {e}")
+        index = InvertedIndex()
+        index.refresh(data_reader)
+        return index
+
+    def is_index_artifact_replaced(self):
+        if self.index is None or self.index_path is None:
+            return False
+        signature = get_file_signature(self.index_path)
+        return signature is not None and signature != self.index_signature
+
+    def refresh_index(self, data_reader):
+        """
+        Return a refreshed copy of the index, the current one is left as it is.
+        """
+        try:
+            return self.index.refreshed(data_reader)
+        except ValueError as e:
+            # An artifact that misses deletions is only replaced by scripts/build_index.py
+            logging.error(f"Index artifact {self.index_path} is outdated, loading the corpus instead: {e}")
+            index = InvertedIndex()
+            index.refresh(data_reader)
+            return index
+
+    def check_revision(self, data_reader):
+        """
+        Switch to a replaced index artifact or refresh the index after the
+        corpus revision changed. One thread at a time builds the new index,
+        which is complete before it is assigned; requests still holding the
+        old one finish with it.
+        """
+        with metrics.span("check_revision"):
+            revision = data_reader.get_corpus_revision()
+            artifact_replaced = self.is_index_artifact_replaced()
+        if revision == self.revision and not artifact_replaced:
+            return
+
+        with self.index_lock:
+            # Threads that waited for the lock find the work done
+            if self.is_index_artifact_replaced():
+                logging.info(f"Index artifact {self.index_path} changed, switching to it")
+                self.index = self.open_index(data_reader)
+            revision = data_reader.get_corpus_revision()
+            if revision == self.revision:
+                return
+            if self.index is not None:
+                with metrics.span("refresh_index"):
+                    self.index = self.refresh_index(data_reader)
+            if self.cache is not None:
+                self.cache.set_revision(revision)
+            self.revision = revision
+
+    def get_cache_key(self, processed_input_text, top_k, min_score):
+        # Jaccard scores only depend on the set of stems, not on their order or repetitions
+        tokens = " ".join(sorted(set(processed_input_text.split())))
+        return json.dumps(["custom_similarity", self.threshold, top_k, min_score, tokens])
+
+    def find_similar_requirements(self, input_text, top_k=None, min_score=None):
+        with metrics.span("preprocess"):
+            processed_input_text = self.processor.preprocess_many([input_text])[0]
+        if processed_input_text is None:
+            return []
+
+        data_reader = self.get_data_reader()
+        self.check_revision(data_reader)
+        cache_key = self.get_cache_key(processed_input_text, top_k, min_score)
+        if self.cache is not None:
+            with metrics.span("cache_lookup"):
+                cached_requirements = self.cache.get(cache_key)
+            if cached_requirements is not None:
+                metrics.increment("results_returned_total", len(cached_requirements))
+                return cached_requirements
+
+        comparer = CustomRequirementComparer(
+            data_reader, None, self.threshold, index=self.index
+        )
+        with metrics.span("score"):
+            # Without the in-memory index only requirements sharing a stem are scored
+            candidates = data_reader.get_fts_candidates(processed_input_text) if self.index is None else None
+            similar_requirements = comparer.find_similar_requirements(
+                processed_input_text, candidates, top_k=top_k, min_score=min_score
+            )
+        with metrics.span("enrich"):
+            enriched_requirements = data_reader.enrich_requirements(similar_requirements)
+        if self.cache is not None:
+            self.cache.put(cache_key, enriched_requirements)
+        metrics.increment("results_returned_total", len(enriched_requirements))
+        return enriched_requirements
+
+    def find_similar_requirements_many(self, input_texts, top_k=None, min_score=None):
+        """
+        Yield the enriched similar requirements of every input text, in input
+        order. The texts are preprocessed in one pass and the ones not in the
+        cache are scored against the index in blocks; every result is yielded
+        as soon as it is enriched.
+        """
+        with metrics.span("preprocess"):
+            processed_input_texts = self.processor.preprocess_many(input_texts)
+        data_reader = self.get_data_reader()
+        self.check_revision(data_reader)
+        cache_keys = [
+            self.get_cache_key(processed_input_text, top_k, min_score) if processed_input_text is not None else None
+            for processed_input_text in processed_input_texts
+        ]
+        with metrics.span("cache_lookup"):
+            cached_results = [
+                self.cache.get(cache_key) if self.cache is not None and cache_key is not None else None
+                for cache_key in cache_keys
+            ]
+
+        comparer = CustomRequirementComparer(
+            data_reader, None, self.threshold, index=self.index
+        )
+        pending_texts = [
+            processed_input_text
+            for processed_input_text, cached_requirements in zip(processed_input_texts, cached_results)
+            if processed_input_text is not None and cached_requirements is None
+        ]
+        if self.index is not None:
+            pending_matches = comparer.find_similar_requirements_many(pending_texts, top_k=top_k, min_score=min_score)
+        else:
+            pending_matches = (
+                comparer.find_similar_requirements(
+                    processed_input_text,
+                    data_reader.get_fts_candidates(processed_input_text),
+                    top_k=top_k,
+                    min_score=min_score,
+                )
+                for processed_input_text in pending_texts
+            )
+
+        for cache_key, cached_requirements in zip(cache_keys, cached_results):
+            if cache_key is None:
+                yield []
+            elif cached_requirements is not None:
+                metrics.increment("results_returned_total", len(cached_requirements))
+                yield cached_requirements
+            else:
+                # Blocks of inputs are scored when their first input is reached
+                with metrics.span("score"):
+                    similar_requirements = next(pending_matches)
+                with metrics.span("enrich"):
+                    enriched_requirements = data_reader.enrich_requirements(similar_requirements)
+                if self.cache is not None:
+                    self.cache.put(cache_key, enriched_requirements)
+                metrics.increment("results_returned_total", len(enriched_requirements))
+                yield enriched_requirements
+
+    def read_query_rows(self, file, max_rows=None):
+        """
+        Return the rows of an uploaded workbook in the 'Festlegungen' layout of
+        the specification imports as requirement fields. Raises ValueError if
+        the file is not such a workbook, or as soon as more than max_rows rows
+        were read.
+        """
+        rows = []
+        try:
+            for batch in self.processor.read_sheet_rows(file):
+                rows.extend(self.processor.parse_row(row, None) for row in batch)
+                if max_rows is not None and len(rows) > max_rows:
+                    raise ValueError(f"The workbook has more than {max_rows} rows")
+        except (zipfile.BadZipFile, KeyError, IndexError) as e:
+            raise ValueError("Not an XLSX workbook with a 'Festlegungen' sheet") from e
+        return rows
+
+    def export_similar_requirements_batch(self, input_texts, labels=None, top_k=None, min_score=None):
+        """
+        Return an iterator over one NDJSON line per input text with its
+        position, the fields of its label if given, e.g. the requirement number
+        of an uploaded row, and its similar requirements.
+
+        The first line is computed before returning, so errors of the
+        preprocessing, the revision check or the first block are raised while
+        the response can still have an error status. An error in a later
+        block ends the lines with an error line instead of a truncated body.
+        """
+        lines = self.generate_similar_requirements_lines(input_texts, labels, top_k, min_score)
+        first_line = next(lines, None)
+        if first_line is None:
+            return iter(())
+        return self.append_error_line(first_line, lines)
+
+    def generate_similar_requirements_lines(self, input_texts, labels, top_k, min_score):
+        results = self.find_similar_requirements_many(input_texts, top_k=top_k, min_score=min_score)
+        for input_index, enriched_requirements in enumerate(results):
+            line = {
+                "index": input_index,
+                **(labels[input_index] if labels is not None else {}),
+                "similar_requirements": enriched_requirements,
+            }
+            # Workbook cells may hold numbers or dates
+            yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+    def append_error_line(self, first_line, lines, error_line=None):
+        yield first_line
+        try:
+            yield from lines
+        except Exception:
+            logging.error("An error occurred", exc_info=True)
+            yield error_line if error_line is not None else json.dumps({"error": "An error occurred"}) + "\n"
+
+    def search(self, search_text, specification_id=None, obligation=None, page=1, page_size=20):
+        processed_search_text = self.processor.preprocess_many([search_text])[0]
+        data_reader = self.get_data_reader()
+        search_args = (search_text, processed_search_text, specification_id, obligation)
+        return {
+            "page": page,
+            "page_size": page_size,
+            "total": data_reader.count_search_results(*search_args),
+            "results": data_reader.search_requirements(
+                *search_args, limit=page_size, offset=(page - 1) * page_size
+            ),
+        }
+
+    def export_specification_pair_similarities(
+        self, spec1_id, spec2_id, comparison_method, output_format="ndjson", after=None, limit=None
+    ):
+        """
+        Return an iterator over the similarities of a specification pair as
+        NDJSON or CSV text chunks. Pairs are stored with the lower
+        specification id first, the ids may be given in either order. A client
+        that passes a limit continues with after set to the combined_identifier
+        of the last row.
+
+        Like export_similar_requirements_batch, the first chunk is read before
+        returning and a later error ends the chunks with an error line.
+        """
+        if spec1_id > spec2_id:
+            spec1_id, spec2_id = spec2_id, spec1_id
+        chunks = self.generate_specification_pair_chunks(
+            spec1_id, spec2_id, comparison_method, output_format, after, limit
+        )
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return iter(())
+        error_line = "error,An error occurred\n" if output_format == "csv" else None
+        return self.append_error_line(first_chunk, chunks, error_line)
+
+    def generate_specification_pair_chunks(self, spec1_id, spec2_id, comparison_method, output_format, after, limit):
+        data_reader = self.get_data_reader()
+        rows = itertools.islice(
+            data_reader.iter_specification_pair_similarities(spec1_id, spec2_id, comparison_method, after), limit
+        )
+
+        buffer = io.StringIO()
+        csv_writer = None
+        for row_number, row in enumerate(rows, 1):
+            if output_format == "csv":
+                if csv_writer is None:
+                    csv_writer = csv.DictWriter(buffer, fieldnames=list(row))
+                    csv_writer.writeheader()
+                csv_writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, ensure_ascii=False))
+                buffer.write("\n")
+            if row_number % 100 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def get_similarity_matrix(self, comparison_method):
+        return self.get_data_reader().get_similarity_summary(comparison_method)
+
+    def get_status(self):
+        return {
+            "pid": os.getpid(),
+            "startup_seconds": round(self.startup_seconds, 3),
+            "requirement_count": len(self.index) if self.index is not None else None,
+            "index_memory": self.index.get_memory_usage() if self.index is not None else None,
+            "corpus_revision": self.revision,
+            "query_cache": self.cache.get_stats() if self.cache is not None else None,
+        }
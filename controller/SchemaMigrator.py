@@ -0,0 +1,474 @@
+import logging
+
+from TokenVocabulary import TokenVocabulary, content_hash
+
+
+def configure_connection(conn, read_only=False):
+    """
+    Apply the connection pragmas used by all readers and writers. WAL
+    journaling lets web workers keep reading while a long similarity
+    computation writes; it is stored in the database file, so only writers
+    switch it on.
+    """
+    if not read_only:
+        conn.execute("PRAGMA journal_mode = WAL")
+        # With WAL, NORMAL is safe against corruption and avoids an fsync per commit
+        conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -65536")  # 64 MiB
+    conn.execute("PRAGMA mmap_size = 268435456")  # 256 MiB
+    return conn
+
+
+class SchemaMigrator:
+    """
+    Versioned schema changes for databases created by DataWriter.
+
+    Every migration runs once, in its own transaction, and is recorded in
+    schema_migrations. New migrations are appended to the list in __init__
+    with the next version number; existing ones must never change.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.cursor.row_factory = None  # Plain tuples, whatever the connection uses
+        self.migrations = [
+            (1, "Add file_hash and file_mtime to specifications", self.add_specification_file_state),
+            (2, "Add indexes for requirement and similarity lookups", self.add_lookup_indexes),
+            (3, "Store requirement similarities in compact integer-keyed form", self.add_compact_similarity_storage),
+            (4, "Add full-text index over requirement texts", self.add_requirements_fts),
+            (5, "Add MinHash signatures of requirements", self.add_requirement_minhashes),
+            (6, "Add corpus revision counter", self.add_corpus_revision),
+            (7, "Add materialized specification similarity summary", self.add_specification_similarity_summary),
+            (8, "Add interned tokens and packed token ids of requirements", self.add_requirement_token_ids),
+            (9, "Add content hashes of processed texts and the similarity score memo", self.add_requirement_content_hashes),
+            (10, "Add generation counter of deleted or changed requirements", self.add_requirements_generation),
+            (11, "Drop MinHash signatures computed with overflowing hashes", self.drop_overflowing_minhashes),
+        ]
+
+    def get_version(self):
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT
+            )
+            """
+        )
+        self.cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        return self.cursor.fetchone()[0]
+
+    def migrate(self):
+        current_version = self.get_version()
+        for version, description, migration in self.migrations:
+            if version <= current_version:
+                continue
+
+            self.conn.commit()
+            self.cursor.execute("BEGIN")
+            try:
+                migration()
+                self.cursor.execute(
+                    """
+                    INSERT INTO schema_migrations (version, description, applied_at)
+                    VALUES (?, ?, datetime('now'))
+                    """,
+                    (version, description),
+                )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            logging.info(f"Applied schema migration {version}: {description}")
+
+    def add_missing_columns(self, table_name, columns):
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        existing_columns = {row[1] for row in self.cursor.fetchall()}
+        for column_name, column_type in columns.items():
+            if column_name not in existing_columns:
+                self.cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+
+    def add_specification_file_state(self):
+        self.add_missing_columns("specifications", {"file_hash": "TEXT", "file_mtime": "REAL"})
+
+    def add_lookup_indexes(self):
+        # get_requirements_by_specification, get_requirements_after and spec deletes
+        self.cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_requirements_specification
+            ON requirements(specification_id, requirement_number)
+            """
+        )
+        # get_requirement_by_number
+        self.cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_requirements_number
+            ON requirements(requirement_number)
+            """
+        )
+        # Similarities of a requirement from either side; covering for get_similarity_counts
+        self.cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_requirement_similarities_requirement1
+            ON requirement_similarities(requirement1_id, requirement2_id)
+            """
+        )
+        self.cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_requirement_similarities_requirement2
+            ON requirement_similarities(requirement2_id, requirement1_id)
+            """
+        )
+        # Results of one specification pair and method
+        self.cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_requirement_similarities_method
+            ON requirement_similarities(comparison_method_id, specification1_id, specification2_id)
+            """
+        )
+
+    def get_object_type(self, name):
+        self.cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def add_compact_similarity_storage(self):
+        """
+        Replace the requirement_similarities table by requirement_similarity_scores,
+        which only holds the integer key and the scores in thousandths. The
+        specification ids and requirement numbers are joined in by the
+        requirement_similarities view, so readers keep working unchanged.
+        """
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS requirement_similarity_scores (
+                comparison_method_id INTEGER NOT NULL,
+                requirement1_id INTEGER NOT NULL,
+                requirement2_id INTEGER NOT NULL,
+                title_score INTEGER,
+                description_score INTEGER,
+                PRIMARY KEY(comparison_method_id, requirement1_id, requirement2_id),
+                FOREIGN KEY(comparison_method_id) REFERENCES comparison_methods(id),
+                FOREIGN KEY(requirement1_id) REFERENCES requirements(id),
+                FOREIGN KEY(requirement2_id) REFERENCES requirements(id)
+            ) WITHOUT ROWID
+            """
+        )
+        # Similarities of a requirement on the second side of a pair
+        self.cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_requirement_similarity_scores_requirement2
+            ON requirement_similarity_scores(comparison_method_id, requirement2_id)
+            """
+        )
+
+        if self.get_object_type("requirement_similarities") == "table":
+            # Scores were stored rounded to three decimals, so this is lossless
+            self.cursor.execute(
+                """
+                INSERT INTO requirement_similarity_scores (
+                    comparison_method_id, requirement1_id, requirement2_id,
+                    title_score, description_score
+                )
+                SELECT
+                    comparison_method_id,
+                    requirement1_id,
+                    requirement2_id,
+                    CAST(ROUND(title_similarity_score * 1000) AS INTEGER),
+                    CAST(ROUND(description_similarity_score * 1000) AS INTEGER)
+                FROM requirement_similarities
+                """
+            )
+            self.cursor.execute("DROP TABLE requirement_similarities")
+
+        self.cursor.execute(
+            """
+            CREATE VIEW IF NOT EXISTS requirement_similarities AS
+            SELECT
+                rs.requirement1_id || '_' || rs.requirement2_id AS combined_identifier,
+                r1.specification_id AS specification1_id,
+                r2.specification_id AS specification2_id,
+                rs.requirement1_id,
+                rs.requirement2_id,
+                r1.requirement_number AS requirement1_number,
+                r2.requirement_number AS requirement2_number,
+                rs.title_score / 1000.0 AS title_similarity_score,
+                rs.description_score / 1000.0 AS description_similarity_score,
+                rs.comparison_method_id
+            FROM requirement_similarity_scores rs
+            JOIN requirements r1 ON rs.requirement1_id = r1.id
+            JOIN requirements r2 ON rs.requirement2_id = r2.id
+            """
+        )
+
+    def add_requirements_fts(self):
+        """
+        FTS5 index over the original and the processed requirement texts. It is
+        an external-content table, so the texts are not stored twice; triggers
+        keep it in sync with every insert, update and delete on requirements.
+        """
+        self.cursor.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS requirements_fts USING fts5(
+                title,
+                description,
+                processed_title,
+                processed_description,
+                content='requirements',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+            """
+        )
+        self.cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS requirements_fts_insert AFTER INSERT ON requirements BEGIN
+                INSERT INTO requirements_fts (rowid, title, description, processed_title, processed_description)
+                VALUES (new.id, new.title, new.description, new.processed_title, new.processed_description);
+            END
+            """
+        )
+        self.cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS requirements_fts_delete AFTER DELETE ON requirements BEGIN
+                INSERT INTO requirements_fts (requirements_fts, rowid, title, description, processed_title, processed_description)
+                VALUES ('delete', old.id, old.title, old.description, old.processed_title, old.processed_description);
+            END
+            """
+        )
+        self.cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS requirements_fts_update AFTER UPDATE ON requirements BEGIN
+                INSERT INTO requirements_fts (requirements_fts, rowid, title, description, processed_title, processed_description)
+                VALUES ('delete', old.id, old.title, old.description, old.processed_title, old.processed_description);
+                INSERT INTO requirements_fts (rowid, title, description, processed_title, processed_description)
+                VALUES (new.id, new.title, new.description, new.processed_title, new.processed_description);
+            END
+            """
+        )
+        # Index the requirements that already exist
+        self.cursor.execute("INSERT INTO requirements_fts (requirements_fts) VALUES ('rebuild')")
+
+    def add_requirement_minhashes(self):
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS requirement_minhashes (
+                requirement_id INTEGER PRIMARY KEY,
+                num_perm INTEGER,
+                seed INTEGER,
+                signature BLOB,
+                FOREIGN KEY(requirement_id) REFERENCES requirements(id)
+            )
+            """
+        )
+        # A signature is only valid for the processed text it was computed from
+        self.cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS requirement_minhashes_delete AFTER DELETE ON requirements BEGIN
+                DELETE FROM requirement_minhashes WHERE requirement_id = old.id;
+            END
+            """
+        )
+        self.cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS requirement_minhashes_update
+            AFTER UPDATE OF processed_description ON requirements BEGIN
+                DELETE FROM requirement_minhashes WHERE requirement_id = old.id;
+            END
+            """
+        )
+
+    def add_corpus_revision(self):
+        # Single row, incremented by DataWriter whenever requirements or similarities change
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS corpus_revision (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                revision INTEGER NOT NULL
+            )
+            """
+        )
+        self.cursor.execute("INSERT OR IGNORE INTO corpus_revision (id, revision) VALUES (1, 0)")
+
+    def add_specification_similarity_summary(self):
+        """
+        Aggregates of requirement_similarity_scores per specification pair and
+        comparison method, maintained by DataWriter whenever the similarities
+        of a pair change. Scores are in thousandths like the scores table.
+        """
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS specification_similarity_summary (
+                specification1_id INTEGER NOT NULL,
+                specification2_id INTEGER NOT NULL,
+                comparison_method_id INTEGER NOT NULL,
+                similarity_count INTEGER NOT NULL,
+                title_score_sum INTEGER,
+                description_score_sum INTEGER,
+                max_title_score INTEGER,
+                max_description_score INTEGER,
+                description_score_500_count INTEGER,
+                description_score_700_count INTEGER,
+                description_score_900_count INTEGER,
+                PRIMARY KEY(specification1_id, specification2_id, comparison_method_id),
+                FOREIGN KEY(specification1_id) REFERENCES specifications(id),
+                FOREIGN KEY(specification2_id) REFERENCES specifications(id),
+                FOREIGN KEY(comparison_method_id) REFERENCES comparison_methods(id)
+            ) WITHOUT ROWID
+            """
+        )
+        self.cursor.execute("DELETE FROM specification_similarity_summary")
+        self.cursor.execute(
+            """
+            INSERT INTO specification_similarity_summary
+            SELECT
+                r1.specification_id,
+                r2.specification_id,
+                rs.comparison_method_id,
+                COUNT(*),
+                SUM(rs.title_score),
+                SUM(rs.description_score),
+                MAX(rs.title_score),
+                MAX(rs.description_score),
+                SUM(rs.description_score >= 500),
+                SUM(rs.description_score >= 700),
+                SUM(rs.description_score >= 900)
+            FROM requirement_similarity_scores rs
+            JOIN requirements r1 ON rs.requirement1_id = r1.id
+            JOIN requirements r2 ON rs.requirement2_id = r2.id
+            GROUP BY r1.specification_id, r2.specification_id, rs.comparison_method_id
+            """
+        )
+
+    def add_requirement_token_ids(self):
+        """
+        Add the tokens table and the packed token ids of the processed texts,
+        and fill them in for the existing requirements.
+        """
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tokens (
+                id INTEGER PRIMARY KEY,
+                token TEXT NOT NULL UNIQUE
+            )
+            """
+        )
+        self.add_missing_columns(
+            "requirements", {"processed_title_tokens": "BLOB", "processed_description_tokens": "BLOB"}
+        )
+
+        # Only changes of the indexed texts need to touch the full-text index
+        self.cursor.execute("DROP TRIGGER IF EXISTS requirements_fts_update")
+        self.cursor.execute(
+            """
+            CREATE TRIGGER requirements_fts_update
+            AFTER UPDATE OF title, description, processed_title, processed_description ON requirements BEGIN
+                INSERT INTO requirements_fts (requirements_fts, rowid, title, description, processed_title, processed_description)
+                VALUES ('delete', old.id, old.title, old.description, old.processed_title, old.processed_description);
+                INSERT INTO requirements_fts (rowid, title, description, processed_title, processed_description)
+                VALUES (new.id, new.title, new.description, new.processed_title, new.processed_description);
+            END
+            """
+        )
+
+        self.cursor.execute(
+            """
+            SELECT id, processed_title, processed_description
+            FROM requirements
+            WHERE processed_title_tokens IS NULL AND processed_description_tokens IS NULL
+            ORDER BY id
+            """
+        )
+        rows = self.cursor.fetchall()
+        token_vocabulary = TokenVocabulary(self.conn)
+        self.cursor.executemany(
+            """
+            UPDATE requirements
+            SET processed_title_tokens = ?, processed_description_tokens = ?
+            WHERE id = ?
+            """,
+            [
+                (token_vocabulary.pack(processed_title), token_vocabulary.pack(processed_description), requirement_id)
+                for requirement_id, processed_title, processed_description in rows
+            ],
+        )
+
+    def add_requirement_content_hashes(self):
+        """
+        Add the content hashes of the processed texts, fill them in for the
+        existing requirements, and add the memo of similarity scores keyed by
+        the hashes of the two texts.
+        """
+        self.add_missing_columns(
+            "requirements", {"processed_title_hash": "INTEGER", "processed_description_hash": "INTEGER"}
+        )
+        # Exact duplicates are found by a join on the hash
+        self.cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_requirements_description_hash
+            ON requirements(processed_description_hash)
+            """
+        )
+        # Scores of pair-local comparers only depend on the two texts, the lower hash comes first
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS similarity_score_memo (
+                comparison_method_id INTEGER NOT NULL,
+                text1_hash INTEGER NOT NULL,
+                text2_hash INTEGER NOT NULL,
+                similarity_score REAL NOT NULL,
+                PRIMARY KEY(comparison_method_id, text1_hash, text2_hash),
+                FOREIGN KEY(comparison_method_id) REFERENCES comparison_methods(id)
+            ) WITHOUT ROWID
+            """
+        )
+
+        self.cursor.execute(
+            """
+            SELECT id, processed_title, processed_description
+            FROM requirements
+            WHERE processed_title_hash IS NULL AND processed_description_hash IS NULL
+            """
+        )
+        rows = self.cursor.fetchall()
+        self.cursor.executemany(
+            """
+            UPDATE requirements
+            SET processed_title_hash = ?, processed_description_hash = ?
+            WHERE id = ?
+            """,
+            [
+                (content_hash(processed_title), content_hash(processed_description), requirement_id)
+                for requirement_id, processed_title, processed_description in rows
+            ],
+        )
+
+    def add_requirements_generation(self):
+        """
+        Count deletions and token changes of existing requirements. Freed ids
+        are handed out again, so corpora loaded from the database are only
+        extended with newer ids while the generation stays the same.
+        """
+        self.add_missing_columns("corpus_revision", {"requirements_generation": "INTEGER NOT NULL DEFAULT 0"})
+        self.cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS requirements_generation_delete AFTER DELETE ON requirements BEGIN
+                UPDATE corpus_revision SET requirements_generation = requirements_generation + 1 WHERE id = 1;
+            END
+            """
+        )
+        self.cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS requirements_generation_update
+            AFTER UPDATE OF processed_title_tokens, processed_description_tokens ON requirements BEGIN
+                UPDATE corpus_revision SET requirements_generation = requirements_generation + 1 WHERE id = 1;
+            END
+            """
+        )
+
+    def drop_overflowing_minhashes(self):
+        # Signatures wrapped a * x + b around 2^64, MinHashIndex computes the missing ones again
+        self.cursor.execute("DELETE FROM requirement_minhashes")
@@ -0,0 +1,166 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SimilarityWriter:
+    """
+    Writes requirement similarity scores in batches from a dedicated thread.
+
+    Rows are collected until batch_size is reached and handed to the writer
+    thread through a queue of at most max_pending_batches batches; a producer
+    that is faster than the database blocks instead of buffering without
+    bound. Every batch is one transaction of INSERT ... ON CONFLICT upserts,
+    so a pair written twice replaces its scores instead of failing the batch.
+
+    Other writes that must follow the queued rows are passed to call() and
+    run on the writer thread in order. The thread gets its own connection from
+    connect(), opened with check_same_thread=False as it is created here and
+    used there; without connect, e.g. for in-memory databases, everything runs
+    in the calling thread on conn.
+    """
+
+    def __init__(self, conn, connect=None, batch_size=10000, max_pending_batches=4):
+        self.conn = conn
+        self.connect = connect
+        self.batch_size = batch_size
+        self.rows = []
+        self.queue = queue.Queue(maxsize=max_pending_batches)
+        self.thread = None
+        self.error = None
+        self.written_count = 0
+        self.write_seconds = 0.0
+
+    def add(self, row):
+        """
+        Queue a (comparison_method_id, requirement1_id, requirement2_id,
+        title_score, description_score) row.
+        """
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the collected rows to the writer thread without waiting for them.
+        """
+        if self.rows:
+            rows, self.rows = self.rows, []
+            self.submit(lambda conn: self.write_rows(conn, rows), None)
+
+    def discard(self):
+        """
+        Drop the rows that were not handed to the writer thread yet.
+        """
+        self.rows = []
+
+    def call(self, function):
+        """
+        Run function(conn) on the writer thread after all rows added so far
+        and return its result, or raise its exception.
+        """
+        self.flush()
+        future = Future()
+        self.submit(function, future)
+        return future.result()
+
+    def wait(self):
+        """
+        Block until all rows added so far are written.
+        """
+        self.call(lambda conn: None)
+
+    def submit(self, function, future):
+        self.raise_error()
+        if self.connect is None:
+            self.run_task(self.conn, function, future)
+            self.raise_error()
+            return
+
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run, args=(self.connect(),), name="similarity-writer", daemon=True
+            )
+            self.thread.start()
+        self.queue.put((function, future))
+
+    def raise_error(self):
+        # A failed batch has nobody waiting for it, the next caller gets the error
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def run(self, conn):
+        try:
+            while True:
+                task = self.queue.get()
+                if task is None:
+                    break
+                self.run_task(conn, *task)
+        finally:
+            conn.close()
+
+    def run_task(self, conn, function, future):
+        if self.error is not None:
+            # Nothing runs after a failed batch, e.g. marking its pair as done,
+            # until a caller got the error
+            if future is not None:
+                error, self.error = self.error, None
+                future.set_exception(error)
+            return
+
+        try:
+            result = function(conn)
+        except BaseException as e:
+            if future is None:
+                logging.error(f"Writing similarities failed: {e}")
+                self.error = e
+            else:
+                future.set_exception(e)
+        else:
+            if future is not None:
+                future.set_result(result)
+
+    def write_rows(self, conn, rows):
+        start_time = time.perf_counter()
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO requirement_similarity_scores (
+                    comparison_method_id,
+                    requirement1_id,
+                    requirement2_id,
+                    title_score,
+                    description_score
+                )
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (comparison_method_id, requirement1_id, requirement2_id) DO UPDATE SET
+                    title_score = excluded.title_score,
+                    description_score = excluded.description_score
+                """,
+                rows,
+            )
+        self.write_seconds += time.perf_counter() - start_time
+        self.written_count += len(rows)
+
+    def get_rows_per_second(self):
+        return self.written_count / self.write_seconds if self.write_seconds else 0.0
+
+    def close(self):
+        """
+        Write the remaining rows and stop the writer thread.
+        """
+        try:
+            self.wait()
+        finally:
+            if self.thread is not None:
+                self.queue.put(None)
+                self.thread.join()
+                self.thread = None
+        if self.written_count:
+            logging.info(
+                f"Wrote {self.written_count} similarities in {self.write_seconds:.1f}s "
+                f"({self.get_rows_per_second():.0f} rows/s)"
+            )
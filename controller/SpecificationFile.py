@@ -0,0 +1,49 @@
+import hashlib
+import os
+import re
+
+
+class SpecificationFile:
+    """
+    A specification workbook on disk, e.g. gemSpec_ePA_FdV_V1.53.0.xlsx.
+    Provides the attributes DataWriter.get_or_create_specification expects.
+    """
+
+    # Document type by file name prefix, see DataWriter.populate_static_data
+    spec_types = {
+        "gemKPT": ("Konzepte", "Spezifikationsdokumente"),
+        "gemSysL": ("Systemlösung", "Spezifikationsdokumente"),
+        "gemSpec": ("Spezifikationen", "Spezifikationsdokumente"),
+        "gemF": ("Feature-Spezifikationen", "Spezifikationsdokumente"),
+        "gemRL": ("Richtlinien", "Spezifikationsdokumente"),
+        "gemProdT": ("Produkttyp Steckbriefe", "Steckbriefe"),
+        "gemAnbT": ("Anbietertyp Steckbriefe", "Steckbriefe"),
+        "gemAnw": ("Anwendungssteckbrief", "Steckbriefe"),
+        "gemVZ": ("Verzeichnis", "Steckbriefe"),
+    }
+
+    name_pattern = re.compile(r"^(?P<name>.+?)_V(?P<version>\d[\w.\-]*)$")
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.filename = os.path.basename(file_path)
+
+        stem = os.path.splitext(self.filename)[0]
+        match = self.name_pattern.match(stem)
+        self.spec_name = match.group("name") if match else stem
+        self.spec_version = match.group("version") if match else "unknown"
+
+        prefix = self.spec_name.split("_")[0]
+        self.spec_type, self.category_type = self.spec_types.get(prefix, ("Unbekannt", "Unbekannt"))
+
+        self.file_mtime = os.path.getmtime(file_path)
+        self.file_hash = None
+
+    def get_file_hash(self):
+        if self.file_hash is None:
+            sha256 = hashlib.sha256()
+            with open(self.file_path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            self.file_hash = sha256.hexdigest()
+        return self.file_hash
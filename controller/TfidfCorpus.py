@@ -0,0 +1,121 @@
+import glob
+import logging
+import os
+import pickle
+
+import numpy as np
+import scipy.sparse
+from sklearn.feature_extraction.text import TfidfTransformer
+
+from RequirementCorpus import RequirementCorpus
+
+
+class TfidfCorpus:
+    """
+    TF-IDF model fitted once over the processed titles and descriptions of
+    all requirements.
+
+    The term counts come from a RequirementCorpus, whose columns are the ids
+    of the tokens table. The fitted IDF weights, the vocabulary and the
+    row-normalized sparse matrices are cached on disk, keyed by the corpus
+    version, so they are only rebuilt after the requirements changed. Because
+    the rows are L2-normalized the cosine similarity of two rows is their dot
+    product.
+    """
+
+    def __init__(self, cache_directory="./public/db/cache"):
+        self.cache_directory = cache_directory
+        self.version = None
+        self.transformer = None
+        self.vocabulary = {}
+        self.requirement_ids = []
+        self.row_by_requirement_id = {}
+        self.title_matrix = None
+        self.description_matrix = None
+
+    def load(self, data_reader):
+        self.version = data_reader.get_corpus_version()
+        cache_path = self.get_cache_path()
+
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rb") as cache_file:
+                state = pickle.load(cache_file)
+            logging.info(f"Loaded TF-IDF matrix for corpus version {self.version} from {cache_path}")
+        else:
+            state = self.fit(RequirementCorpus().load(data_reader))
+            if cache_path:
+                self.save(state, cache_path)
+
+        self.transformer = state["transformer"]
+        self.vocabulary = state["vocabulary"]
+        self.requirement_ids = state["requirement_ids"]
+        self.title_matrix = state["title_matrix"]
+        self.description_matrix = state["description_matrix"]
+        self.row_by_requirement_id = {
+            requirement_id: row for row, requirement_id in enumerate(self.requirement_ids)
+        }
+        return self
+
+    def fit(self, corpus):
+        title_counts = corpus.matrices["processed_title"]
+        description_counts = corpus.matrices["processed_description"]
+
+        # Same weights as a TfidfVectorizer splitting at whitespace, fitted on titles and descriptions
+        transformer = TfidfTransformer()
+        transformer.fit(scipy.sparse.vstack((title_counts, description_counts)))
+        logging.info(
+            f"Fitted TF-IDF weights of {len(corpus.vocabulary)} tokens over {len(corpus)} requirements"
+        )
+
+        return {
+            "transformer": transformer,
+            "vocabulary": corpus.vocabulary,
+            "requirement_ids": corpus.requirement_ids.tolist(),
+            "title_matrix": transformer.transform(title_counts),
+            "description_matrix": transformer.transform(description_counts),
+        }
+
+    def get_cache_path(self):
+        if not self.cache_directory:
+            return None
+        return os.path.join(self.cache_directory, f"tfidf-tokens-{self.version}.pkl")
+
+    def save(self, state, cache_path):
+        os.makedirs(self.cache_directory, exist_ok=True)
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as cache_file:
+            pickle.dump(state, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, cache_path)
+
+        # Matrices of older corpus versions are never read again
+        for stale_path in glob.glob(os.path.join(self.cache_directory, "tfidf-*.pkl")):
+            if stale_path != cache_path:
+                os.remove(stale_path)
+
+    def transform(self, texts):
+        # Tokens the weights were not fitted on are left out, as by TfidfVectorizer
+        column_count = len(self.transformer.idf_)
+        rows = []
+        columns = []
+        for row, text in enumerate(texts):
+            for token in (text or "").split():
+                token_id = self.vocabulary.get(token)
+                if token_id is not None and token_id < column_count:
+                    rows.append(row)
+                    columns.append(token_id)
+        counts = scipy.sparse.csr_matrix(
+            (np.ones(len(columns), dtype=np.int32), (rows, columns)), shape=(len(texts), column_count)
+        )
+        return self.transformer.transform(counts)
+
+    def get_matrix(self, requirements, field):
+        """
+        Return the rows of the given requirements. Requirements that were
+        imported after the matrix was built are transformed on the fly.
+        """
+        rows = [self.row_by_requirement_id.get(req["id"]) for req in requirements]
+        if None in rows:
+            return self.transform([req[field] for req in requirements])
+
+        matrix = self.title_matrix if field == "processed_title" else self.description_matrix
+        return matrix[rows]
@@ -0,0 +1,45 @@
+from RequirementComparer import BlockedRequirementComparer
+from TfidfCorpus import TfidfCorpus
+
+
+class TfidfRequirementComparer(BlockedRequirementComparer):
+    """
+    Cosine similarity of TF-IDF vectors whose IDF weights come from the whole
+    requirement corpus. Queries and specification comparisons are answered
+    with sparse matrix products against the precomputed corpus matrix.
+    """
+
+    def __init__(self, data_reader, data_writer, threshold, corpus=None):
+        super().__init__(data_reader, data_writer, threshold)
+        self.corpus = corpus if corpus is not None else TfidfCorpus().load(data_reader)
+
+    def calculate_similarity(self, text1: str, text2: str) -> float:
+        vectors = self.corpus.transform([text1, text2])
+        return float(vectors[0].multiply(vectors[1]).sum())
+
+    def get_comparison_method(self) -> str:
+        return 'tfidf_cosine_similarity'
+
+    def build_matrices(self, requirements1, requirements2, field):
+        return (
+            self.corpus.get_matrix(requirements1, field),
+            self.corpus.get_matrix(requirements2, field),
+        )
+
+    def score_block(self, matrix1, matrix2):
+        return matrix1 @ matrix2.T
+
+    def find_similar_requirements(
+        self, processed_input_text, requirements=None, top_k=None, min_score=None
+    ):
+        if requirements is not None:
+            return super().find_similar_requirements(
+                processed_input_text, requirements, top_k, min_score
+            )
+
+        threshold = self.get_query_threshold(min_score)
+        query_vector = self.corpus.transform([processed_input_text])
+        similarities = (self.corpus.description_matrix @ query_vector.T).toarray().ravel()
+        return self.build_matches_from_scores(
+            self.corpus.requirement_ids, similarities, threshold, top_k
+        )
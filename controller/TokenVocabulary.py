@@ -0,0 +1,58 @@
+import hashlib
+
+import numpy as np
+
+# Token ids are packed as little-endian unsigned 32-bit integers
+TOKEN_ID_DTYPE = np.dtype("<u4")
+
+
+def content_hash(processed_text):
+    """
+    Return a signed 64-bit hash of a processed text, as stored in the
+    processed_title_hash and processed_description_hash columns.
+    """
+    if processed_text is None:
+        return None
+    digest = hashlib.blake2b(processed_text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class TokenVocabulary:
+    """
+    Interned integer ids of the stemmed tokens, stored in the tokens table.
+
+    Processed texts are stored next to their string form as a BLOB of packed
+    token ids in text order, so readers can load the corpus without splitting
+    strings. New tokens are inserted in the caller's transaction; after a
+    rollback reset() must be called, as the ids handed out may be reused.
+    """
+
+    def __init__(self, conn):
+        self.cursor = conn.cursor()
+        self.cursor.row_factory = None  # Plain tuples, whatever the connection uses
+        self.token_ids = None
+
+    def reset(self):
+        self.token_ids = None
+
+    def get_token_id(self, token):
+        if self.token_ids is None:
+            self.cursor.execute("SELECT token, id FROM tokens")
+            self.token_ids = dict(self.cursor.fetchall())
+
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            self.cursor.execute("INSERT INTO tokens (token) VALUES (?)", (token,))
+            token_id = self.token_ids[token] = self.cursor.lastrowid
+        return token_id
+
+    def pack(self, processed_text):
+        if processed_text is None:
+            return None
+        return np.array(
+            [self.get_token_id(token) for token in processed_text.split()], dtype=TOKEN_ID_DTYPE
+        ).tobytes()
+
+    @staticmethod
+    def unpack(packed_token_ids):
+        return np.frombuffer(packed_token_ids or b"", dtype=TOKEN_ID_DTYPE)
@@ -0,0 +1,11 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# preload_app imports app.py (and with it the RequirementService, which loads
+# spaCy, NLTK and the requirement corpus) once in the master process. The
+# workers are forked afterwards and share that state copy-on-write instead of
+# loading it again per worker or per request.
+import os
+
+bind = os.environ.get("SPEC_EXPLORER_BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("SPEC_EXPLORER_WORKERS", "4"))
+preload_app = True
@@ -0,0 +1,99 @@
+"""
+Benchmark of RequirementComparer.compare_requirements on two synthetic
+specifications, blocked sparse engine against the pairwise loop.
+
+The pairwise loop is only timed on a sample of rows of the first
+specification and extrapolated, a full run would take too long.
+
+    python scripts/benchmark_compare_requirements.py --requirements 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from CustomRequirementComparer import CustomRequirementComparer
+
+
+VOCABULARY_SIZE = 3000
+WEIGHTS = [1.0 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+
+
+class SyntheticReader:
+    def __init__(self, requirements_by_spec):
+        self.requirements_by_spec = requirements_by_spec
+
+    def get_requirements_by_specification(self, specification):
+        return self.requirements_by_spec[specification["id"]]
+
+    def get_memoized_scores(self, comparison_method, text_hashes):
+        return {}  # Every pair is scored
+
+
+class CountingWriter:
+    def __init__(self):
+        self.count = 0
+
+    def add_requirement_similarities(self, *args):
+        self.count += 1
+
+    def add_memoized_score(self, *args):
+        pass
+
+
+def make_specification(spec_id, requirement_count, vocabulary, rnd):
+    requirements = []
+    for i in range(requirement_count):
+        # Zipf-like token distribution, similar to stemmed requirement texts
+        description = " ".join(rnd.choices(vocabulary, weights=WEIGHTS, k=rnd.randint(8, 40)))
+        title = " ".join(rnd.choices(vocabulary, weights=WEIGHTS, k=rnd.randint(2, 6)))
+        requirements.append(
+            {
+                "id": spec_id * 1_000_000 + i,
+                "requirement_number": f"A_{spec_id}_{i:05d}",
+                "processed_title": title,
+                "processed_description": description,
+            }
+        )
+    specification = {"id": spec_id, "name": f"gemSpec_Synthetic_{spec_id}", "version": "1.0.0"}
+    return specification, requirements
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requirements", type=int, default=5000)
+    parser.add_argument("--sample", type=int, default=50)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    vocabulary = [f"tok{rank}" for rank in range(VOCABULARY_SIZE)]
+    specification1, requirements1 = make_specification(1, args.requirements, vocabulary, rnd)
+    specification2, requirements2 = make_specification(2, args.requirements, vocabulary, rnd)
+    reader = SyntheticReader({1: requirements1, 2: requirements2})
+
+    writer = CountingWriter()
+    comparer = CustomRequirementComparer(reader, writer, args.threshold)
+    start_time = time.perf_counter()
+    comparer.compare_requirements(specification1, specification2)
+    blocked_seconds = time.perf_counter() - start_time
+    print(f"blocked:  {blocked_seconds:8.2f}s  {writer.count} pairs above {args.threshold}")
+
+    writer = CountingWriter()
+    comparer = CustomRequirementComparer(reader, writer, args.threshold)
+    start_time = time.perf_counter()
+    comparer.compare_requirements_pairwise(
+        specification1, requirements1[: args.sample], specification2, requirements2
+    )
+    sample_seconds = time.perf_counter() - start_time
+    pairwise_seconds = sample_seconds * args.requirements / args.sample
+    print(
+        f"pairwise: {pairwise_seconds:8.2f}s  (extrapolated from {args.sample} rows in {sample_seconds:.2f}s)"
+    )
+    print(f"speedup:  {pairwise_seconds / blocked_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
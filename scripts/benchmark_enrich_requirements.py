@@ -0,0 +1,150 @@
+"""
+Benchmark of DataReader.enrich_requirements against the original query.
+
+The original query inlined every id and similarity into a VALUES clause and
+bound one parameter per id, so each call compiled a new statement. It also
+joined the three lookup tables and grouped by requirement number. The current
+version binds a single JSON parameter to a constant statement and maps the
+lookup names from memory.
+
+    python scripts/benchmark_enrich_requirements.py --requirements 60000
+
+With 60,000 requirements the original query took 177 ms for 1,000 results
+and the current one 10 ms (18x); for 10 results both stay below 0.2 ms. At
+50,000 results reading the descriptions dominates, 1.2 s against 1.0 s.
+With the default SQLITE_MAX_VARIABLE_NUMBER (32766) of SQLite builds that
+do not raise it, the original query fails for more than 32766 results.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from DataReader import DataReader
+from DataWriter import DataWriter
+
+
+def legacy_enrich_requirements(data_reader, similar_requirements):
+    values_list = ", ".join(
+        [f"({req['id']}, {req['similarity']})" for req in similar_requirements]
+    )
+    data_reader.cursor.execute(
+        f'''
+        WITH SimilarityTempTable (id, similarity) AS (VALUES {values_list})
+        SELECT
+            r.requirement_number AS req_requirement_number,
+            spec.name as spec_name,
+            source.name AS req_source,
+            r.title AS spec_title,
+            r.description AS spec_description,
+            obligation.name AS spec_obligation,
+            test.name AS spec_test_procedure,
+            s.similarity
+        FROM requirements r
+        JOIN specifications spec ON r.specification_id = spec.id
+        JOIN req_sources source ON r.source_id = source.id
+        JOIN req_obligations obligation ON r.obligation_id = obligation.id
+        JOIN req_test_procedures test ON r.test_procedure_id = test.id
+        JOIN SimilarityTempTable s ON r.id = s.id
+        WHERE r.id IN ({','.join(['?'] * len(similar_requirements))})
+        GROUP BY r.requirement_number
+        ORDER BY s.similarity DESC
+        ''',
+        [req["id"] for req in similar_requirements]
+    )
+    return data_reader.cursor.fetchall()
+
+
+def create_database(path, specification_count, requirement_count, rnd):
+    conn = sqlite3.connect(path)
+    data_writer = DataWriter(conn, True)
+    source_ids = [data_writer.get_or_create_id("req_sources", name) for name in ("gematik", "BSI", "EU")]
+    obligation_ids = [data_writer.get_or_create_id("req_obligations", name) for name in ("MUSS", "SOLL", "KANN")]
+    test_procedure_ids = [
+        data_writer.get_or_create_id("req_test_procedures", name) for name in ("Testfall", "Herstellererklärung")
+    ]
+
+    requirements_per_spec = requirement_count // specification_count
+    for spec_id in range(1, specification_count + 1):
+        conn.execute(
+            "INSERT INTO specifications (id, name, version, fullname, file_path, status) VALUES (?, ?, '1.0.0', ?, '', 'compared')",
+            (spec_id, f"gemSpec_Synthetic_{spec_id}", f"gemSpec_Synthetic_{spec_id}_V1.0.0"),
+        )
+    conn.executemany(
+        """
+        INSERT INTO requirements (id, specification_id, requirement_number, title, description,
+                                  source_id, obligation_id, test_procedure_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                req_id,
+                (req_id - 1) // requirements_per_spec + 1,
+                f"A_{req_id:06d}",
+                f"Anforderung {req_id}",
+                "Der Fachdienst MUSS " + " ".join(f"wort{rnd.randrange(5000)}" for _ in range(40)),
+                rnd.choice(source_ids),
+                rnd.choice(obligation_ids),
+                rnd.choice(test_procedure_ids),
+            )
+            for req_id in range(1, requirements_per_spec * specification_count + 1)
+        ),
+    )
+    conn.commit()
+    return conn
+
+
+def time_call(function, repeat):
+    best_seconds = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start_time
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return best_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--specifications", type=int, default=60)
+    parser.add_argument("--requirements", type=int, default=60000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "requirements.db")
+        conn = create_database(path, args.specifications, args.requirements, rnd)
+        try:
+            data_reader = DataReader(conn)
+            requirement_ids = [row["id"] for row in conn.execute("SELECT id FROM requirements")]
+            for size in args.sizes:
+                similar_requirements = [
+                    {"id": requirement_id, "similarity": round(rnd.random(), 3)}
+                    for requirement_id in rnd.sample(requirement_ids, min(size, len(requirement_ids)))
+                ]
+
+                current_seconds = time_call(
+                    lambda: data_reader.enrich_requirements(similar_requirements), args.repeat
+                )
+                try:
+                    legacy_seconds = time_call(
+                        lambda: legacy_enrich_requirements(data_reader, similar_requirements), args.repeat
+                    )
+                    legacy_result = f"{legacy_seconds * 1000:9.2f} ms"
+                    speedup = f"({legacy_seconds / current_seconds:.1f}x)"
+                except sqlite3.OperationalError as e:
+                    legacy_result = f"failed: {e}"
+                    speedup = ""
+                print(f"{len(similar_requirements):6} results: {legacy_result} -> {current_seconds * 1000:9.2f} ms {speedup}")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Microbenchmark of RequirementProcessor.preprocess_text against the previous
+implementation, which rebuilt the stopword set, the stemmer and the
+translation table on every call. Also checks that both produce identical
+output.
+
+    python scripts/benchmark_preprocess_text.py --texts 20000
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+from nltk.corpus import stopwords
+from nltk.stem import SnowballStemmer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from RequirementProcessor import RequirementProcessor
+
+WORDS_TO_REPLACE = ["ePA-Frontend", "ePA Frontend", "E-Rezept-FdV", "TI-ITSM-Teilnehmer", "Hersteller", "Produkttyp"]
+
+SAMPLE_WORDS = (
+    "Das ePA-Frontend des Versicherten MUSS die Daten vor dem Senden an den Konnektor "
+    "mit dem Schlüssel der Karte verschlüsseln. Der Hersteller des Produkttyp SOLL "
+    "sicherstellen, dass Fehlermeldungen (gemäß [gemSpec_TK] Kapitel 3.2.1) protokolliert "
+    "werden; das E-Rezept-FdV zeigt dem Nutzer 2 Hinweise an und löscht Token nach 24 Stunden."
+).split()
+
+
+def legacy_preprocess_text(text, words_to_replace):
+    if text is None or text.strip() == "":
+        return None
+
+    for word_to_replace in words_to_replace:
+        text = text.replace(word_to_replace, "")
+
+    text = text.lower()
+    text = text.translate(str.maketrans("", "", string.punctuation))
+    text = re.sub(r"\d+", "", text)
+    text = text.strip()
+
+    stop_words = set(stopwords.words("german"))
+    words = text.split()
+    words = [word for word in words if word not in stop_words]
+
+    stemmer = SnowballStemmer("german")
+    words = [stemmer.stem(word) for word in words]
+
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=20000)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    texts = [" ".join(rnd.choices(SAMPLE_WORDS, k=rnd.randint(10, 60))) for _ in range(args.texts)]
+
+    start_time = time.perf_counter()
+    legacy_results = [legacy_preprocess_text(text, WORDS_TO_REPLACE) for text in texts]
+    legacy_seconds = time.perf_counter() - start_time
+
+    processor = RequirementProcessor(None, WORDS_TO_REPLACE)
+    start_time = time.perf_counter()
+    results = processor.preprocess_many(texts)
+    seconds = time.perf_counter() - start_time
+
+    if results != legacy_results:
+        raise SystemExit("preprocess_many differs from the previous implementation")
+
+    print(f"before: {len(texts) / legacy_seconds:10.0f} texts/s")
+    print(f"after:  {len(texts) / seconds:10.0f} texts/s")
+    print(f"speedup: {legacy_seconds / seconds:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark of the similarity storage before and after schema migration 3.
+
+A database with synthetic requirements and similarities is created in the
+original requirement_similarities layout (TEXT key, denormalized
+specification ids and requirement numbers, REAL scores). Its size and query
+times are measured, then SchemaMigrator converts it to the compact
+requirement_similarity_scores table and the same queries run again through
+the requirement_similarities view.
+
+    python scripts/benchmark_similarity_storage.py --similarities 2000000
+
+With 1,000,000 similarities between 20 specifications of 1,000
+requirements, the database shrank from 120.7 MiB to 27.9 MiB (4.3x), a scan
+of the stored table got 1.4x faster and looking up all specification pairs
+4x faster. Scans through the view pay for joining the requirements and were
+about 1.4x slower than reading the denormalized columns.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from DataReader import DataReader
+from DataWriter import DataWriter
+from SchemaMigrator import SchemaMigrator
+
+
+def create_legacy_database(path, specification_count, requirement_count, similarity_count, rnd):
+    conn = sqlite3.connect(path)
+    data_writer = DataWriter(conn, True)
+
+    # Back to the schema of version 2
+    conn.execute("DROP VIEW requirement_similarities")
+    conn.execute("DROP TABLE requirement_similarity_scores")
+    conn.execute("DELETE FROM schema_migrations WHERE version >= 3")
+    data_writer.create_requirement_similarities_table()
+    SchemaMigrator(conn).add_lookup_indexes()
+    conn.commit()
+
+    method_id = data_writer.get_or_create_id("comparison_methods", "custom_similarity")
+    requirements_per_spec = requirement_count // specification_count
+    for spec_id in range(1, specification_count + 1):
+        conn.execute(
+            "INSERT INTO specifications (id, name, version, fullname, file_path, status) VALUES (?, ?, '1.0.0', ?, '', 'compared')",
+            (spec_id, f"gemSpec_Synthetic_{spec_id}", f"gemSpec_Synthetic_{spec_id}_V1.0.0"),
+        )
+    conn.executemany(
+        "INSERT INTO requirements (id, specification_id, requirement_number) VALUES (?, ?, ?)",
+        (
+            (req_id, (req_id - 1) // requirements_per_spec + 1, f"A_{req_id:06d}")
+            for req_id in range(1, requirements_per_spec * specification_count + 1)
+        ),
+    )
+
+    def similarities():
+        seen = set()
+        while len(seen) < similarity_count:
+            spec1_id, spec2_id = sorted(rnd.sample(range(1, specification_count + 1), 2))
+            requirement1_id = (spec1_id - 1) * requirements_per_spec + rnd.randrange(requirements_per_spec) + 1
+            requirement2_id = (spec2_id - 1) * requirements_per_spec + rnd.randrange(requirements_per_spec) + 1
+            if (requirement1_id, requirement2_id) in seen:
+                continue
+            seen.add((requirement1_id, requirement2_id))
+            yield (
+                f"{requirement1_id}_{requirement2_id}",
+                spec1_id,
+                spec2_id,
+                requirement1_id,
+                requirement2_id,
+                f"A_{requirement1_id:06d}",
+                f"A_{requirement2_id:06d}",
+                round(rnd.uniform(0, 1), 3),
+                round(rnd.uniform(0.2, 1), 3),
+                method_id,
+            )
+
+    conn.executemany(
+        "INSERT INTO requirement_similarities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        similarities(),
+    )
+    conn.commit()
+    return conn
+
+
+def get_database_size(conn, path):
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path)
+
+
+def time_queries(conn, specification_count, table, score_column):
+    data_reader = DataReader(conn)
+    timings = {}
+
+    start_time = time.perf_counter()
+    data_reader.cursor.execute(f"SELECT COUNT(*), AVG({score_column}) FROM {table}")
+    data_reader.cursor.fetchall()
+    timings["table scan"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    data_reader.cursor.execute(
+        """
+        SELECT specification1_id, specification2_id, AVG(description_similarity_score)
+        FROM requirement_similarities
+        GROUP BY specification1_id, specification2_id
+        """
+    )
+    data_reader.cursor.fetchall()
+    timings["view scan"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    data_reader.get_similarity_counts()
+    timings["get_similarity_counts"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for spec1_id in range(1, specification_count + 1):
+        for spec2_id in range(spec1_id + 1, specification_count + 1):
+            data_reader.get_specification_pair_similarities(spec1_id, spec2_id, "custom_similarity")
+    timings["all pair lookups"] = time.perf_counter() - start_time
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--specifications", type=int, default=20)
+    parser.add_argument("--requirements", type=int, default=20000)
+    parser.add_argument("--similarities", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "requirements.db")
+        conn = create_legacy_database(path, args.specifications, args.requirements, args.similarities, rnd)
+        try:
+            legacy_size = get_database_size(conn, path)
+            legacy_timings = time_queries(
+                conn, args.specifications, "requirement_similarities", "description_similarity_score"
+            )
+
+            start_time = time.perf_counter()
+            SchemaMigrator(conn).migrate()
+            migration_seconds = time.perf_counter() - start_time
+
+            compact_size = get_database_size(conn, path)
+            compact_timings = time_queries(
+                conn, args.specifications, "requirement_similarity_scores", "description_score"
+            )
+        finally:
+            conn.close()
+
+    print(f"{args.similarities} similarities, migrated in {migration_seconds:.1f}s")
+    print(f"size:                   {legacy_size / 2**20:8.1f} MiB -> {compact_size / 2**20:8.1f} MiB ({legacy_size / compact_size:.1f}x smaller)")
+    for name, legacy_seconds in legacy_timings.items():
+        compact_seconds = compact_timings[name]
+        print(f"{name + ':':23} {legacy_seconds:8.3f}s -> {compact_seconds:8.3f}s ({legacy_seconds / compact_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
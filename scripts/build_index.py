@@ -0,0 +1,44 @@
+"""
+Build the index artifact the web workers memory-map instead of loading the
+requirement corpus themselves, see MappedIndex.
+
+    python scripts/build_index.py
+    python scripts/build_index.py --db ./public/db/requirements.db --output ./public/db/requirements.index
+
+The artifact is replaced atomically, running workers switch to it with their
+next request. Requirements imported later are indexed by every worker on top
+of the artifact until it is built again.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from DataReader import DataReader
+from MappedIndex import write_index_artifact
+from SchemaMigrator import configure_connection
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="./public/db/requirements.db")
+    parser.add_argument("--output", default="./public/db/requirements.index")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    conn = configure_connection(sqlite3.connect(args.db), read_only=True)
+    try:
+        header = write_index_artifact(args.output, DataReader(conn))
+    finally:
+        conn.close()
+    print(
+        f"Indexed {header['arrays']['requirement_ids']['shape'][0]} requirements at revision {header['revision']} "
+        f"into {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
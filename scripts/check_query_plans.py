@@ -0,0 +1,119 @@
+"""
+Check that the hot DataReader queries use the indexes created by
+SchemaMigrator. Every query is run against an empty database created by
+DataWriter, its statements are captured and their EXPLAIN QUERY PLAN is
+searched for the expected index. Exits with status 1 if one is missing.
+
+    python scripts/check_query_plans.py
+
+tests/test_query_plans.py runs the same checks with pytest.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from DataReader import DataReader
+from DataWriter import DataWriter
+
+SPECIFICATION = {"id": 1, "name": "gemSpec_Example", "version": "1.0.0"}
+
+# (query, call on a DataReader, indexes that must appear in the plan)
+QUERY_CHECKS = [
+    (
+        "get_requirements_by_specification",
+        lambda reader: reader.get_requirements_by_specification(SPECIFICATION),
+        ["idx_requirements_specification"],
+    ),
+    (
+        "get_requirement_by_number",
+        lambda reader: reader.get_requirement_by_number("A_12345"),
+        ["idx_requirements_number"],
+    ),
+    (
+        "get_similarities_by_specifiaction",
+        lambda reader: reader.get_similarities_by_specifiaction(SPECIFICATION),
+        [
+            "PRIMARY KEY (comparison_method_id=? AND requirement1_id=?)",
+            "idx_requirement_similarity_scores_requirement2 (comparison_method_id=? AND requirement2_id=?)",
+        ],
+    ),
+    (
+        "get_specification_pair_similarities",
+        lambda reader: reader.get_specification_pair_similarities(1, 2, "custom_similarity"),
+        ["PRIMARY KEY (comparison_method_id=? AND requirement1_id=?)"],
+    ),
+    (
+        "get_similarity_counts",
+        lambda reader: reader.get_similarity_counts(),
+        ["COVERING INDEX idx_requirement_similarity_scores_requirement2"],
+    ),
+]
+
+
+def get_query_plan(conn, statement):
+    cursor = conn.cursor()
+    cursor.row_factory = None  # DataWriter installs a dict factory on the connection
+    cursor.execute(f"EXPLAIN QUERY PLAN {statement}")
+    return [row[3] for row in cursor.fetchall()]
+
+
+def get_call_query_plan(conn, data_reader, query):
+    """
+    Run the query and return the plan details of all SELECT statements it
+    executed on conn.
+    """
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        query(data_reader)
+    finally:
+        conn.set_trace_callback(None)
+
+    return [
+        detail
+        for statement in statements
+        if statement.lstrip().upper().startswith(("SELECT", "WITH"))
+        for detail in get_query_plan(conn, statement)
+    ]
+
+
+def check_query(conn, data_reader, name, query, expected_indexes):
+    plan = get_call_query_plan(conn, data_reader, query)
+    missing = [index for index in expected_indexes if not any(index in detail for detail in plan)]
+
+    for detail in plan:
+        logging.info(f"{name}: {detail}")
+    if missing:
+        logging.error(f"{name} does not use {', '.join(missing)}")
+    return not missing
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, "requirements.db"))
+        try:
+            DataWriter(conn, True)
+            data_reader = DataReader(conn)
+            results = [
+                check_query(conn, data_reader, name, query, expected_indexes)
+                for name, query, expected_indexes in QUERY_CHECKS
+            ]
+        finally:
+            conn.close()
+
+    if not all(results):
+        sys.exit(1)
+    logging.info(f"All {len(results)} queries use their indexes")
+
+
+if __name__ == "__main__":
+    main()
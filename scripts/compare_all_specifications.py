@@ -0,0 +1,43 @@
+"""
+Compare every pair of specifications in the database. Pairs that were
+already compared with the chosen method are skipped, so the command can be
+re-run after it was interrupted.
+
+    python scripts/compare_all_specifications.py --method custom_similarity --workers 8
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from ComparisonScheduler import ComparisonScheduler, comparers
+from DataReader import DataReader
+from DataWriter import DataWriter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="./public/db/requirements.db")
+    parser.add_argument("--method", choices=sorted(comparers), default="custom_similarity")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    data_writer = DataWriter(sqlite3.connect(args.db), False)
+    try:
+        data_reader = DataReader(data_writer.conn)
+        scheduler = ComparisonScheduler(
+            data_reader, data_writer, args.db, args.method, args.threshold, args.workers
+        )
+        scheduler.run()
+    finally:
+        # Writes the queued similarities and stops the writer thread first
+        data_writer.close_connection()
+
+
+if __name__ == "__main__":
+    main()
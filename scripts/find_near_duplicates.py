@@ -0,0 +1,129 @@
+"""
+Find near-duplicate requirements across the whole catalogue with MinHash/LSH.
+Candidate pairs from the LSH buckets are verified with the exact Jaccard
+similarity and written as CSV.
+
+With --recall-sample the LSH result is compared with a brute-force search
+over a random sample of requirements, to choose bands and rows. With --exact
+only requirements with the same processed description are written, found by
+a join on its content hash without computing any signature or score.
+
+    python scripts/find_near_duplicates.py --threshold 0.8 --output near_duplicates.csv
+    python scripts/find_near_duplicates.py --threshold 0.8 --bands 32 --rows 4 --recall-sample 5000
+    python scripts/find_near_duplicates.py --exact --output exact_duplicates.csv
+"""
+import argparse
+import csv
+import logging
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from CustomRequirementComparer import CustomRequirementComparer
+from DataReader import DataReader
+from DataWriter import DataWriter
+from MinHashIndex import MinHashIndex
+
+
+def find_near_duplicates_brute_force(requirement_ids, processed_descriptions, threshold):
+    requirements = [
+        {"id": requirement_id, "processed_description": processed_descriptions[requirement_id]}
+        for requirement_id in requirement_ids
+    ]
+    comparer = CustomRequirementComparer(None, None, threshold)
+    matrix, _ = comparer.build_matrices(requirements, requirements, "processed_description")
+    block_size = max(1, comparer.max_block_cells // len(requirements))
+
+    near_duplicates = set()
+    for start in range(0, len(requirements), block_size):
+        rows, columns, _ = comparer.get_scores_above_threshold(
+            comparer.score_block(matrix[start:start + block_size], matrix)
+        )
+        for row, column in zip(rows, columns):
+            if start + row < column:
+                near_duplicates.add((requirement_ids[start + row], requirement_ids[column]))
+    return near_duplicates
+
+
+def report_recall(index, threshold, sample_size, rnd):
+    sample_ids = sorted(rnd.sample(index.requirement_ids, min(sample_size, len(index.requirement_ids))))
+    sample = set(sample_ids)
+
+    start_time = time.perf_counter()
+    expected = find_near_duplicates_brute_force(sample_ids, index.processed_descriptions, threshold)
+    brute_force_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    candidate_pairs = {
+        pair for pair in index.get_candidate_pairs() if pair[0] in sample and pair[1] in sample
+    }
+    found = {
+        (requirement1_id, requirement2_id)
+        for requirement1_id, requirement2_id, _ in index.find_near_duplicates(threshold, candidate_pairs)
+    }
+    lsh_seconds = time.perf_counter() - start_time
+
+    all_pair_count = len(sample_ids) * (len(sample_ids) - 1) // 2
+    recall = len(found & expected) / len(expected) if expected else 1.0
+    print(f"sample:           {len(sample_ids)} requirements, {all_pair_count} pairs")
+    print(f"bands x rows:     {index.bands} x {index.rows}, LSH threshold {index.get_threshold():.2f}")
+    print(f"candidates:       {len(candidate_pairs)} pairs ({len(candidate_pairs) / max(all_pair_count, 1):.4%} of all)")
+    print(f"near duplicates:  {len(expected)} by brute force ({brute_force_seconds:.1f}s), {len(found)} by LSH ({lsh_seconds:.1f}s)")
+    print(f"recall:           {recall:.3f}")
+    for similarity in (threshold, (threshold + 1) / 2, 1.0):
+        print(f"  P(candidate | similarity {similarity:.2f}) = {index.get_candidate_probability(similarity):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="./public/db/requirements.db")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="CSV file, default stdout")
+    parser.add_argument("--recall-sample", type=int, default=None)
+    parser.add_argument("--exact", action="store_true", help="Only exact duplicates, by content hash")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    data_writer = DataWriter(sqlite3.connect(args.db), False)
+    try:
+        data_reader = DataReader(data_writer.conn)
+        if args.exact:
+            near_duplicates = [
+                (requirement1_id, requirement2_id, 1.0)
+                for requirement1_id, requirement2_id in data_reader.get_exact_duplicates()
+            ]
+        else:
+            index = MinHashIndex(args.num_perm, args.bands, args.rows, args.seed).load(data_reader, data_writer)
+    finally:
+        # Writes the queued similarities and stops the writer thread first
+        data_writer.close_connection()
+
+    if args.exact:
+        logging.info(f"Found {len(near_duplicates)} exact duplicate pairs")
+    elif args.recall_sample:
+        report_recall(index, args.threshold, args.recall_sample, random.Random(args.seed))
+        return
+    else:
+        near_duplicates = index.find_near_duplicates(args.threshold)
+        logging.info(f"Found {len(near_duplicates)} near-duplicate pairs above {args.threshold}")
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(["requirement1_id", "requirement2_id", "similarity"])
+        for requirement1_id, requirement2_id, similarity in near_duplicates:
+            writer.writerow([requirement1_id, requirement2_id, round(similarity, 3)])
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
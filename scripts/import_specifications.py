@@ -0,0 +1,44 @@
+"""
+Import all specification workbooks (*.xlsx with a 'Festlegungen' sheet) of a
+directory. Files that were already imported unchanged are skipped.
+
+    python scripts/import_specifications.py ./specifications --workers 8
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from BulkImporter import BulkImporter
+from DataReader import DataReader
+from DataWriter import DataWriter
+
+WORDS_TO_REPLACE = ["ePA-Frontend", "ePA Frontend", "E-Rezept-FdV", "TI-ITSM-Teilnehmer", "Hersteller", "Produkttyp"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory")
+    parser.add_argument("--db", default="./public/db/requirements.db")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    data_writer = DataWriter(sqlite3.connect(args.db), False)
+    try:
+        data_reader = DataReader(data_writer.conn)
+        importer = BulkImporter(
+            data_reader, data_writer, WORDS_TO_REPLACE, args.workers, args.batch_size
+        )
+        importer.run(args.directory)
+    finally:
+        # Writes the queued similarities and stops the writer thread first
+        data_writer.close_connection()
+
+
+if __name__ == "__main__":
+    main()
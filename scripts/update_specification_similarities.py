@@ -0,0 +1,47 @@
+"""
+Update the similarities of a newly imported specification version from its
+previous version: unchanged requirements reuse their stored scores, only
+added or changed requirements are compared again.
+
+    python scripts/update_specification_similarities.py gemSpec_ePA_FdV 1.54.0
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+from ComparisonScheduler import comparers
+from DataReader import DataReader
+from DataWriter import DataWriter
+from IncrementalSimilarityUpdater import IncrementalSimilarityUpdater
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("name")
+    parser.add_argument("version")
+    parser.add_argument("--db", default="./public/db/requirements.db")
+    parser.add_argument("--method", choices=sorted(comparers), default="custom_similarity")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    data_writer = DataWriter(sqlite3.connect(args.db), False)
+    try:
+        data_reader = DataReader(data_writer.conn)
+        specification = data_reader.get_specification(args.name, args.version)
+        if specification is None:
+            raise SystemExit(f"Specification {args.name} V{args.version} is not in the database")
+
+        comparer = comparers[args.method](data_reader, data_writer, args.threshold)
+        IncrementalSimilarityUpdater(data_reader, data_writer, comparer).update(specification)
+    finally:
+        # Writes the queued similarities and stops the writer thread first
+        data_writer.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "controller"))
+
+from DataReader import DataReader
+from DataWriter import DataWriter
+from Requirement import Requirement
+from SpecificationFile import SpecificationFile
+
+
+def import_specification(data_writer, file_path, processed_descriptions):
+    """
+    Import a specification the way RequirementProcessor does, with processed
+    texts given directly instead of being read from the workbook.
+    """
+    open(file_path, "ab").close()
+    specification = data_writer.get_or_create_specification(SpecificationFile(str(file_path)))
+    requirements = [
+        Requirement(
+            specification.id,
+            "gematik",
+            f"A_{number:05d}",
+            f"Titel {number}",
+            processed_description,
+            f"titel {number}",
+            processed_description,
+            "MUSS",
+        )
+        for number, processed_description in enumerate(processed_descriptions, start=1)
+    ]
+    data_writer.write_specification_requirements(specification, [requirements])
+    return specification
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    return str(tmp_path / "requirements.db")
+
+
+@pytest.fixture
+def data_writer(database_path):
+    data_writer = DataWriter(sqlite3.connect(database_path), False)
+    yield data_writer
+    data_writer.close_connection()
+
+
+@pytest.fixture
+def data_reader(database_path, data_writer):
+    conn = sqlite3.connect(database_path)
+    yield DataReader(conn)
+    conn.close()
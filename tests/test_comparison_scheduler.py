@@ -0,0 +1,42 @@
+from conftest import import_specification
+from ComparisonScheduler import ComparisonScheduler
+
+
+def get_pending_pair_ids(scheduler):
+    return [
+        (specification1["id"], specification2["id"])
+        for specification1, specification2 in scheduler.get_pending_pairs()
+    ]
+
+
+def test_run_compares_pending_pairs_and_skips_compared_ones(tmp_path, database_path, data_writer, data_reader):
+    for name in ("A", "B"):
+        import_specification(data_writer, tmp_path / f"gemSpec_{name}_V1.0.xlsx", [
+            "daten sicher speichern", "daten sicher senden", "protokoll prüfen",
+        ])
+    scheduler = ComparisonScheduler(data_reader, data_writer, database_path, "custom_similarity", 0.2, max_workers=1)
+    assert get_pending_pair_ids(scheduler) == [(1, 2)]
+
+    scheduler.run()
+    assert get_pending_pair_ids(scheduler) == []
+    assert {spec["status"] for spec in data_reader.get_all_specifications()} == {"compared"}
+    assert data_reader.get_similarity_summary("custom_similarity")
+
+    # Only the pairs of a newly imported specification are compared on the next run. The
+    # scores of the finished pair are removed, a comparison of it again would restore them.
+    data_writer.conn.execute("DELETE FROM requirement_similarity_scores")
+    data_writer.conn.commit()
+    import_specification(data_writer, tmp_path / "gemSpec_C_V1.0.xlsx", ["daten sicher löschen"])
+    assert get_pending_pair_ids(scheduler) == [(1, 3), (2, 3)]
+    scheduler.run()
+    assert get_pending_pair_ids(scheduler) == []
+    specification_pairs = data_writer.conn.execute(
+        """
+        SELECT DISTINCT r1.specification_id AS specification1_id, r2.specification_id AS specification2_id
+        FROM requirement_similarity_scores rs
+        JOIN requirements r1 ON rs.requirement1_id = r1.id
+        JOIN requirements r2 ON rs.requirement2_id = r2.id
+        """
+    ).fetchall()
+    assert specification_pairs
+    assert all(3 in (pair["specification1_id"], pair["specification2_id"]) for pair in specification_pairs)
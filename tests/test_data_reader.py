@@ -0,0 +1,40 @@
+import random
+
+from conftest import import_specification
+from InvertedIndex import InvertedIndex
+
+
+def test_corpus_version_changes_with_reused_ids_and_equal_lengths(tmp_path, data_writer, data_reader):
+    specification_path = tmp_path / "gemSpec_Test_V1.0.xlsx"
+    import_specification(data_writer, specification_path, ["daten sicher speichern", "daten senden"])
+    version = data_reader.get_corpus_version()
+    assert data_reader.get_corpus_version() == version
+
+    # Same count, same ids and same text lengths
+    import_specification(data_writer, specification_path, ["daten sicher speichern", "daten lesen_"])
+    assert data_reader.get_corpus_version() != version
+
+
+def test_corpus_version_of_original_texts(tmp_path, data_writer, data_reader):
+    import_specification(data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx", ["daten sicher speichern"])
+    version = data_reader.get_corpus_version(("title", "description"))
+    data_writer.conn.execute("UPDATE requirements SET description = 'Daten sicher speichern.'")
+    data_writer.conn.commit()
+
+    assert data_reader.get_corpus_version(("title", "description")) != version
+
+
+def test_fts_candidates_are_the_requirements_the_index_scores(tmp_path, data_writer, data_reader):
+    # Stems with hyphens, underscores, umlauts and without any letter or digit
+    vocabulary = ["daten", "sich", "e-mail", "prüf", "schlüssel_id", "§", "–", "„", "•", "tls", "ab"]
+    rng = random.Random(13)
+    descriptions = [" ".join(rng.sample(vocabulary, rng.randint(1, 4))) for _ in range(300)]
+    import_specification(data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx", descriptions)
+    index = InvertedIndex()
+    index.refresh(data_reader)
+
+    for _ in range(100):
+        query = " ".join(rng.sample(vocabulary, rng.randint(1, 3)))
+        fts_ids = {candidate["id"] for candidate in data_reader.get_fts_candidates(query)}
+        index_ids = {requirement_id for requirement_id, _ in index.query(query, 0.0)}
+        assert fts_ids == index_ids, query
@@ -0,0 +1,10 @@
+from conftest import import_specification
+
+
+def test_delete_specification_requirements_commits_outside_of_a_transaction(tmp_path, data_writer, data_reader):
+    specification = import_specification(
+        data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx", ["daten sicher speichern", "daten senden"]
+    )
+    assert data_writer.delete_specification_requirements(specification.id) == (0, 0)
+    # Read through the separate connection of data_reader
+    assert data_reader.get_requirements_by_specification({"id": specification.id}) == []
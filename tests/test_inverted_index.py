@@ -0,0 +1,82 @@
+import random
+
+from conftest import import_specification
+from InvertedIndex import InvertedIndex
+from MappedIndex import MappedIndex, write_index_artifact
+
+import pytest
+
+
+def test_refresh_drops_requirements_of_a_reimported_specification(tmp_path, data_writer, data_reader):
+    import_specification(data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx",
+        ["daten sicher speichern", "daten sicher senden", "daten sicher löschen"],
+    )
+    index = InvertedIndex()
+    index.refresh(data_reader)
+    assert [requirement_id for requirement_id, _ in index.query("daten sicher", 0.1, top_k=3)] == [3, 2, 1]
+
+    # The freed ids are handed out again
+    import_specification(data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx", ["protokoll prüfen"])
+    index.refresh(data_reader)
+
+    assert len(index) == 1
+    assert index.query("daten sicher", 0.1, top_k=3) == []
+    assert index.query("protokoll prüfen", 0.1) == [(1, 1.0)]
+
+
+def test_refresh_appends_new_requirements(tmp_path, data_writer, data_reader):
+    import_specification(data_writer, tmp_path / "gemSpec_A_V1.0.xlsx", ["daten sicher speichern"])
+    index = InvertedIndex()
+    index.refresh(data_reader)
+    import_specification(data_writer, tmp_path / "gemSpec_B_V1.0.xlsx", ["daten sicher senden"])
+    index.refresh(data_reader)
+
+    assert [requirement_id for requirement_id, _ in index.query("daten sicher", 0.1)] == [2, 1]
+
+
+def test_mapped_index_rejects_an_artifact_missing_deletions(tmp_path, data_writer, data_reader):
+    import_specification(data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx", ["daten sicher speichern", "daten sicher senden"])
+    artifact_path = str(tmp_path / "requirements.index")
+    write_index_artifact(artifact_path, data_reader)
+    index = MappedIndex(artifact_path)
+    index.refresh(data_reader)
+    import_specification(data_writer, tmp_path / "gemSpec_New_V1.0.xlsx", ["daten sicher löschen"])
+    index.refresh(data_reader)
+    assert [requirement_id for requirement_id, _ in index.query("daten sicher", 0.1)] == [3, 2, 1]
+
+    import_specification(data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx", ["protokoll prüfen"])
+    with pytest.raises(ValueError):
+        index.refresh(data_reader)
+
+
+def test_refreshed_leaves_the_index_in_use_unchanged(tmp_path, data_writer, data_reader):
+    import_specification(data_writer, tmp_path / "gemSpec_A_V1.0.xlsx", ["daten sicher speichern"])
+    index = InvertedIndex()
+    index.refresh(data_reader)
+    import_specification(data_writer, tmp_path / "gemSpec_B_V1.0.xlsx", ["daten sicher senden", "neue token"])
+
+    refreshed_index = index.refreshed(data_reader)
+
+    assert len(index) == 1
+    assert index.query("daten sicher", 0.1) == [(1, 2 / 3)]
+    assert "neue" not in index.corpus.vocabulary
+    assert [requirement_id for requirement_id, _ in refreshed_index.query("daten sicher", 0.1)] == [2, 1]
+    assert refreshed_index.query("neue token", 0.1) == [(3, 1.0)]
+
+
+def test_bounded_top_k_equals_the_cut_full_ranking(tmp_path, data_writer, data_reader):
+    # A small vocabulary, so many candidates tie on their similarity
+    vocabulary = ["daten", "sich", "speich", "send", "schlüssel", "tls", "prüf", "karte"]
+    rng = random.Random(20)
+    import_specification(data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx", [
+        " ".join(rng.sample(vocabulary, rng.randint(1, 6))) for _ in range(400)
+    ])
+    index = InvertedIndex()
+    index.refresh(data_reader)
+
+    for _ in range(50):
+        query = " ".join(rng.sample(vocabulary, rng.randint(1, 5)))
+        ranking = index.query(query, 0.1)
+        for top_k in (1, 3, 10, 1000):
+            assert index.query(query, 0.1, top_k=top_k) == ranking[:top_k]
+            assert list(index.query_many([query], 0.1, top_k=top_k)) == [ranking[:top_k]]
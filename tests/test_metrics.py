@@ -0,0 +1,55 @@
+from Metrics import Metrics, format_labels
+
+
+def test_render_has_cumulative_buckets_sums_and_counters():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe("request_seconds", 0.05, (("endpoint", "similar"),))
+    metrics.observe("request_seconds", 0.5, (("endpoint", "similar"),))
+    metrics.observe("request_seconds", 5.0, (("endpoint", "similar"),))
+    metrics.increment("results_returned_total", 3)
+    metrics.increment("results_returned_total", 2)
+
+    lines = metrics.render().splitlines()
+    assert 'spec_explorer_request_seconds_bucket{endpoint="similar",le="0.1"} 1' in lines
+    assert 'spec_explorer_request_seconds_bucket{endpoint="similar",le="1.0"} 2' in lines
+    assert 'spec_explorer_request_seconds_bucket{endpoint="similar",le="+Inf"} 3' in lines
+    assert 'spec_explorer_request_seconds_sum{endpoint="similar"} 5.55' in lines
+    assert 'spec_explorer_request_seconds_count{endpoint="similar"} 3' in lines
+    assert "# TYPE spec_explorer_results_returned_total counter" in lines
+    assert "spec_explorer_results_returned_total 5" in lines
+    # Metrics without values are left out
+    assert not any("candidates_scored_total" in line for line in lines)
+
+
+def test_spans_are_summed_per_stage_between_start_and_finish_request():
+    metrics = Metrics()
+    with metrics.span("preprocess"):
+        pass
+
+    metrics.start_request()
+    with metrics.span("score"):
+        pass
+    with metrics.span("score"):
+        pass
+    timings = metrics.finish_request()
+
+    assert list(timings) == ["score"]
+    assert metrics.finish_request() == {}
+    assert metrics.histograms[("stage_seconds", (("stage", "preprocess"),))][2] == 1
+    assert metrics.histograms[("stage_seconds", (("stage", "score"),))][2] == 2
+    assert metrics.format_server_timing({"score": 0.0125}) == "score;dur=12.50"
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    with metrics.span("score"):
+        pass
+    metrics.observe("request_seconds", 0.1)
+    metrics.increment("results_returned_total")
+
+    assert metrics.render() == "\n"
+
+
+def test_label_values_are_escaped():
+    assert format_labels(()) == ""
+    assert format_labels((("path", 'a"b\\c\nd'),)) == '{path="a\\"b\\\\c\\nd"}'
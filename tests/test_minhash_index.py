@@ -0,0 +1,29 @@
+import zlib
+
+from conftest import import_specification
+from MinHashIndex import MinHashIndex
+
+
+def test_signature_is_universal_hash_without_overflow():
+    index = MinHashIndex(num_perm=64, bands=8, rows=8)
+    tokens = {"daten", "sich", "speich", "schlüssel", "zertifikat"}
+    prime = (1 << 61) - 1
+    # Reference with Python integers, which never wrap around
+    expected = [
+        min(((int(a) * zlib.crc32(token.encode("utf-8")) + int(b)) % prime) & 0xFFFFFFFF for token in tokens)
+        for a, b in zip(index.a, index.b)
+    ]
+    assert index.get_signature(tokens).tolist() == expected
+
+
+def test_near_duplicates_are_verified_with_the_exact_similarity(tmp_path, data_writer, data_reader):
+    import_specification(data_writer, tmp_path / "gemSpec_Test_V1.0.xlsx", [
+        "daten sich speich verschlüssel tls",
+        "daten sich speich verschlüssel tls",
+        "daten sich speich verschlüssel",
+        "protokoll prüf",
+    ])
+    index = MinHashIndex(num_perm=64, bands=32, rows=2).load(data_reader, data_writer)
+    assert index.find_near_duplicates(0.7) == [(1, 2, 1.0), (1, 3, 0.8), (2, 3, 0.8)]
+    # Signatures are stored and read back on the next load
+    assert MinHashIndex(num_perm=64, bands=32, rows=2).load(data_reader).get_candidate_pairs() == index.get_candidate_pairs()
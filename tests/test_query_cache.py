@@ -0,0 +1,68 @@
+import json
+import time
+
+from QueryCache import QueryCache, SharedQueryCache
+
+
+def get_size(value):
+    return len(json.dumps(value))
+
+
+def test_least_recently_used_entries_are_evicted_over_max_bytes():
+    value = {"results": ["A_00001", "A_00002"]}
+    cache = QueryCache(max_bytes=2 * get_size(value))
+    cache.set_revision(1)
+    cache.put("a", value)
+    cache.put("b", value)
+    assert cache.get("a") == value
+
+    cache.put("c", value)
+    assert cache.get("b") is None
+    assert cache.get("a") == value
+    assert cache.get("c") == value
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["bytes"] == 2 * get_size(value)
+
+
+def test_entries_expire_after_their_time_to_live(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = QueryCache(ttl_seconds=60)
+    cache.set_revision(1)
+    cache.put("a", [1])
+
+    now[0] += 60
+    assert cache.get("a") == [1]
+    now[0] += 1
+    assert cache.get("a") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_revision_change_drops_all_entries():
+    cache = QueryCache()
+    cache.set_revision(1)
+    cache.put("a", [1])
+    cache.set_revision(1)
+    assert cache.get("a") == [1]
+
+    cache.set_revision(2)
+    assert cache.get("a") is None
+    assert cache.get_stats()["invalidations"] == 1
+
+
+def test_shared_tier_serves_results_of_other_workers_of_the_same_revision(tmp_path):
+    path = str(tmp_path / "cache" / "query_cache.db")
+    worker1 = QueryCache(shared=SharedQueryCache(path))
+    worker2 = QueryCache(shared=SharedQueryCache(path))
+    worker1.set_revision(1)
+    worker2.set_revision(1)
+    worker1.put("a", [1])
+
+    assert worker2.get("a") == [1]
+    assert worker2.get_stats()["shared_hits"] == 1
+    # The shared hit is kept in the local tier
+    assert worker2.get("a") == [1]
+    assert worker2.get_stats()["hits"] == 1
+
+    worker2.set_revision(2)
+    assert worker2.get("a") is None
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+from check_query_plans import QUERY_CHECKS, get_call_query_plan
+
+
+@pytest.mark.parametrize("name, query, expected_indexes", QUERY_CHECKS, ids=[check[0] for check in QUERY_CHECKS])
+def test_query_uses_indexes(data_reader, name, query, expected_indexes):
+    plan = get_call_query_plan(data_reader.conn, data_reader, query)
+    for index in expected_indexes:
+        assert any(index in detail for detail in plan), f"{name} does not use {index}: {plan}"
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from CustomRequirementComparer import CustomRequirementComparer
+
+
+class RecordingWriter:
+    """
+    Collects what a comparer writes, keyed by requirement pair.
+    """
+
+    def __init__(self):
+        self.similarities = {}
+
+    def add_requirement_similarities(
+        self, spec1_id, spec2_id, requirement1_id, requirement2_id, requirement1_number, requirement2_number,
+        title_similarity, description_similarity, comparison_method,
+    ):
+        self.similarities[(requirement1_id, requirement2_id)] = (title_similarity, description_similarity)
+
+    def add_memoized_score(self, comparison_method, text1_hash, text2_hash, similarity_score):
+        pass
+
+
+def build_requirements(rng, first_id, count):
+    vocabulary = ["daten", "sich", "speich", "send", "schlüssel", "tls", "prüf", "karte", "konnektor", "signatur"]
+    return [
+        {
+            "id": requirement_id,
+            "requirement_number": f"A_{requirement_id:05d}",
+            "processed_title": " ".join(rng.sample(vocabulary, rng.randint(1, 3))),
+            "processed_description": " ".join(rng.sample(vocabulary, rng.randint(2, 6))),
+        }
+        for requirement_id in range(first_id, first_id + count)
+    ]
+
+
+def test_blocked_compare_writes_the_pairs_and_scores_of_the_nested_loop():
+    rng = random.Random(5)
+    specification1 = {"id": 1, "name": "gemSpec_A", "version": "1.0"}
+    specification2 = {"id": 2, "name": "gemSpec_B", "version": "1.0"}
+    requirements1 = build_requirements(rng, 1, 60)
+    # Requirements with the same texts are scored once per group
+    requirements2 = build_requirements(rng, 100, 50)
+    requirements2.append(dict(requirements2[0], id=200, requirement_number="A_00200"))
+
+    def compare(blocked, max_block_cells):
+        writer = RecordingWriter()
+        comparer = CustomRequirementComparer(None, writer, 0.2)
+        comparer.max_block_cells = max_block_cells
+        if blocked:
+            comparer.compare_requirement_lists(specification1, requirements1, specification2, requirements2)
+        else:
+            comparer.compare_requirements_pairwise(specification1, requirements1, specification2, requirements2)
+        return writer.similarities
+
+    expected = compare(blocked=False, max_block_cells=CustomRequirementComparer.max_block_cells)
+    assert expected
+    # Several row blocks as well as a single one
+    for max_block_cells in (CustomRequirementComparer.max_block_cells, 200):
+        similarities = compare(blocked=True, max_block_cells=max_block_cells)
+        assert similarities.keys() == expected.keys()
+        for pair, scores in expected.items():
+            assert similarities[pair] == pytest.approx(scores)
@@ -0,0 +1,115 @@
+import csv
+import importlib
+import io
+import json
+
+import pytest
+
+# The service loads the spaCy pipeline of the imports
+pytest.importorskip("de_core_news_md")
+
+from conftest import import_specification
+from ComparisonScheduler import ComparisonScheduler
+from RequirementService import RequirementService
+
+DESCRIPTIONS = {
+    "A": ["Die Daten müssen sicher gespeichert werden.", "Das Protokoll muss geprüft werden.", "Die Karte wird gesperrt."],
+    # Requirements with the same number are not compared, the similar ones have other numbers
+    "B": [
+        "Der Schlüssel wird erneuert.",
+        "Die Daten müssen sicher gesendet werden.",
+        "Das Protokoll wird gespeichert.",
+        "Die Daten müssen sicher gespeichert und gesendet werden.",
+    ],
+}
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    # Where app.py opens the database when it is imported in tmp_path
+    db_directory = tmp_path / "public" / "db"
+    db_directory.mkdir(parents=True)
+    return str(db_directory / "requirements.db")
+
+
+@pytest.fixture
+def service(tmp_path, database_path, data_writer, data_reader):
+    service = RequirementService(database_path, [], 0.2)
+    for name, descriptions in DESCRIPTIONS.items():
+        import_specification(
+            data_writer, tmp_path / f"gemSpec_{name}_V1.0.xlsx", service.processor.preprocess_many(descriptions)
+        )
+    ComparisonScheduler(data_reader, data_writer, database_path, "custom_similarity", 0.2, max_workers=1).run()
+    return service
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, service):
+    monkeypatch.chdir(tmp_path)
+    app = importlib.import_module("app")
+    monkeypatch.setattr(app, "service", service)
+    return app.app.test_client()
+
+
+def read_lines(lines):
+    return [json.loads(line) for line in "".join(lines).splitlines()]
+
+
+def test_batch_export_has_the_results_of_single_queries(service):
+    texts = ["Daten sicher speichern", "", "Protokoll prüfen"]
+    labels = [{"requirement_number": f"Q_{number}"} for number in range(len(texts))]
+
+    lines = read_lines(service.export_similar_requirements_batch(texts, labels, top_k=2))
+
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert [line["requirement_number"] for line in lines] == ["Q_0", "Q_1", "Q_2"]
+    assert lines[0]["similar_requirements"]
+    for text, line in zip(texts, lines):
+        assert line["similar_requirements"] == service.find_similar_requirements(text, top_k=2)
+
+
+def test_batch_export_ends_with_an_error_line_after_the_first_line(monkeypatch, service):
+    def fail_after_first_result(input_texts, top_k=None, min_score=None):
+        yield []
+        raise RuntimeError("block failed")
+
+    monkeypatch.setattr(service, "find_similar_requirements_many", fail_after_first_result)
+
+    lines = read_lines(service.export_similar_requirements_batch(["a", "b"]))
+    assert lines == [{"index": 0, "similar_requirements": []}, {"error": "An error occurred"}]
+
+
+def test_pair_export_pages_ndjson_and_csv(service):
+    rows = read_lines(service.export_specification_pair_similarities(1, 2, "custom_similarity"))
+    assert len(rows) > 1
+    assert read_lines(service.export_specification_pair_similarities(2, 1, "custom_similarity")) == rows
+
+    # A client continues after the last row it received
+    first_page = read_lines(service.export_specification_pair_similarities(1, 2, "custom_similarity", limit=1))
+    after = tuple(int(requirement_id) for requirement_id in first_page[-1]["combined_identifier"].split("_"))
+    rest = read_lines(service.export_specification_pair_similarities(1, 2, "custom_similarity", after=after))
+    assert first_page + rest == rows
+
+    csv_rows = list(csv.DictReader(io.StringIO(
+        "".join(service.export_specification_pair_similarities(1, 2, "custom_similarity", output_format="csv"))
+    )))
+    assert [row["combined_identifier"] for row in csv_rows] == [row["combined_identifier"] for row in rows]
+    assert list(service.export_specification_pair_similarities(1, 3, "custom_similarity")) == []
+
+
+def test_endpoints_stream_the_exports(client):
+    response = client.post("/find_similar_requirements_batch", json={"texts": ["Daten sicher speichern"]})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert read_lines([response.get_data(as_text=True)])[0]["similar_requirements"]
+
+    assert client.post("/find_similar_requirements_batch", json={"texts": []}).status_code == 400
+    assert client.post("/find_similar_requirements_batch", json={"texts": [1]}).status_code == 400
+
+    response = client.get("/specification_pair_similarities?spec1_id=1&spec2_id=2&format=csv&limit=1")
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert len(response.get_data(as_text=True).splitlines()) == 2
+
+    assert client.get("/specification_pair_similarities?spec1_id=1&spec2_id=1").status_code == 400
+    assert client.get("/specification_pair_similarities?spec1_id=1&spec2_id=2&after=x").status_code == 400
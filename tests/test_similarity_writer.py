@@ -0,0 +1,67 @@
+import sqlite3
+import threading
+
+import pytest
+
+from SimilarityWriter import SimilarityWriter
+
+
+@pytest.fixture
+def similarity_writer(database_path, data_writer):
+    # The data_writer fixture creates the schema
+    writer = SimilarityWriter(
+        data_writer.conn,
+        connect=lambda: sqlite3.connect(database_path, check_same_thread=False),
+        batch_size=2,
+    )
+    yield writer
+    writer.close()
+
+
+def get_scores(database_path):
+    conn = sqlite3.connect(database_path)
+    try:
+        return conn.execute(
+            """
+            SELECT requirement1_id, requirement2_id, title_score, description_score
+            FROM requirement_similarity_scores
+            ORDER BY requirement1_id, requirement2_id
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_rows_are_written_in_batches_on_the_writer_thread(database_path, similarity_writer):
+    similarity_writer.add((1, 1, 3, 100, 200))
+    similarity_writer.add((1, 1, 4, 300, 400))
+    similarity_writer.add((1, 2, 3, 500, 600))
+    # The same pair replaces its scores instead of failing the batch
+    similarity_writer.add((1, 1, 3, 700, 800))
+    similarity_writer.wait()
+
+    assert get_scores(database_path) == [(1, 3, 700, 800), (1, 4, 300, 400), (2, 3, 500, 600)]
+    assert similarity_writer.written_count == 4
+    assert similarity_writer.call(lambda conn: threading.current_thread().name) == "similarity-writer"
+
+
+def test_discard_drops_the_rows_not_handed_to_the_thread(database_path, similarity_writer):
+    similarity_writer.add((1, 1, 3, 100, 200))
+    similarity_writer.discard()
+    similarity_writer.wait()
+
+    assert get_scores(database_path) == []
+
+
+def test_failed_batch_raises_on_the_next_call_and_close_stops_the_thread(similarity_writer):
+    # A row with a missing score fails its batch on the writer thread
+    similarity_writer.add((1, 1, 3, 100))
+    similarity_writer.add((1, 1, 4, 300))
+    thread = similarity_writer.thread
+
+    with pytest.raises(sqlite3.Error):
+        similarity_writer.wait()
+    similarity_writer.close()
+
+    assert similarity_writer.thread is None
+    assert not thread.is_alive()